@@ -14,27 +14,238 @@ from pathlib import Path
 import requests
 import websocket # pip install requests websocket-client
 import subprocess
+import shutil
+import tempfile
+from urllib.request import pathname2url
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+from itertools import chain, groupby, islice
+from collections import deque
+from operator import attrgetter, itemgetter
+from functools import partial
+import re
+import configparser
+import fnmatch
+import hashlib
+import io
+import struct
+import gzip
+import bz2
+import lzma
+import mmap
+import heapq
+import bisect
+import base64
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+
+# ----- Logging and Statistics -----
+
+logger = logging.getLogger("cookiewrangler")
+
+def _no_clock():
+    return 0.0
+
+class Stats:
+    """
+    Collects wall time per phase and counters for the --stats report.
+    Safe to use from worker threads (phase times of concurrent workers add up).
+    Nothing is recorded until enable() is called, so instrumented loops cost
+    next to nothing by default.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counters = {}
+
+    def enable(self):
+        self.enabled = True
+        self.reset()
+
+    def clock(self):
+        """Returns the clock to time hot loops with: perf_counter, or a no-op when disabled."""
+        return time.perf_counter if self.enabled else _no_clock
+
+    def add_time(self, phase, seconds):
+        if self.enabled:
+            with self.lock:
+                self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def count(self, counter, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def report(self, command):
+        with self.lock:
+            return {
+                "command": command,
+                "wall_seconds": round(time.perf_counter() - self.started, 6),
+                "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+                "counters": dict(self.counters),
+            }
+
+# Phases: discovery, db_open, query, decode, serialize, write (plus chrome_* startup phases
+# and chrome_time_to_first_cookie, the time from launch until the first cookies were read).
+# Counters: rows_read, rows_written, origins, bytes_read, bytes_written, skipped, errors.
+STATS = Stats()
+
+def write_stats_report(destination, command):
+    """Writes the --stats report as JSON to a file, or to stderr for "-"."""
+    report = json.dumps(STATS.report(command), indent=2)
+    if destination == "-":
+        print(report, file=sys.stderr)
+    else:
+        with open(destination, 'w', encoding='utf-8') as f:
+            f.write(report + "\n")
 
 # ----- Chrome Cookies Functionality -----
-def get_chrome_cookies():
-    """Retrieve Chrome cookies via DevTools Protocol (Verified Working Version)"""
+
+# Overall budget for closing Chrome, relaunching it and reading the cookies.
+CHROME_STARTUP_TIMEOUT = 30.0
+# How long an empty cookie list is retried while Chrome may still be loading its cookie store.
+CHROME_EMPTY_RESULT_GRACE = 3.0
+
+def _poll_until(check, deadline, what, proc=None, initial_delay=0.05, max_delay=0.25):
+    """
+    Calls check() with exponential backoff until it returns a truthy value, which is
+    returned. Raises TimeoutError once `deadline` (time.monotonic()) has passed, or
+    RuntimeError as soon as `proc` exits, instead of waiting for a fixed time.
+    """
+    delay = initial_delay
+    while True:
+        result = check()
+        if result:
+            return result
+        if proc is not None and proc.poll() is not None:
+            output = proc.communicate()[1]
+            raise RuntimeError(f"Chrome exited with code {proc.returncode} while waiting for {what}:\n{output}")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Timed out waiting for {what}")
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+def _chrome_running():
+    """Returns True while any chrome.exe process is still alive."""
+    result = subprocess.run('tasklist /FI "IMAGENAME eq chrome.exe" /NH',
+                            check=False, shell=True, capture_output=True, text=True)
+    return 'chrome.exe' in result.stdout.lower()
+
+def _devtools_targets(port):
+    """Returns the DevTools targets that accept WebSocket connections, or None if not ready yet."""
+    try:
+        targets = requests.get(f'http://localhost:{port}/json', timeout=1).json()
+    except (requests.RequestException, ValueError):
+        return None
+    return [t for t in targets if t.get('webSocketDebuggerUrl')] or None
+
+class DevToolsSession:
+    """
+    A Chrome DevTools Protocol connection over a WebSocket. Requests carry increasing
+    message ids, so several can be in flight at once; recv() returns the next
+    response and skips the event notifications Chrome sends in between.
+    """
+
+    def __init__(self, ws, proc=None, deadline=None, timings=None):
+        self.ws = ws
+        self.proc = proc
+        self.deadline = deadline
+        self.timings = {} if timings is None else timings
+        self.started = self.phase_start = time.monotonic()
+        self.last_id = 0
+
+    def end_phase(self, name):
+        """Records the time since the previous phase ended as `name`."""
+        now = time.monotonic()
+        self.timings[name] = now - self.phase_start
+        STATS.add_time("chrome_" + name, self.timings[name])
+        self.phase_start = now
+
+    def send(self, method, params=None):
+        """Sends a request without waiting for its response and returns its message id."""
+        self.last_id += 1
+        message = {'id': self.last_id, 'method': method}
+        if params is not None:
+            message['params'] = params
+        self.ws.send(json.dumps(message))
+        return self.last_id
+
+    def recv(self):
+        """Returns the next response (a message with an id)."""
+        while True:
+            message = json.loads(self.ws.recv())
+            if 'id' in message:
+                return message
+
+    def call(self, method, params=None):
+        """Sends a request and returns the response matching its id."""
+        message_id = self.send(method, params)
+        while True:
+            response = self.recv()
+            if response['id'] == message_id:
+                return response
+
+@contextmanager
+def open_chrome_devtools(timeout=CHROME_STARTUP_TIMEOUT, timings=None, ws_url=None, on_shutdown=None):
+    """
+    Yields a DevToolsSession connected to Chrome (Verified Working Version)
+
+    Chrome is closed, relaunched headless with remote debugging on the user's profile
+    and closed again on exit. Instead of sleeping for fixed periods, each startup phase
+    polls for readiness with backoff, bounded by an overall `timeout` in seconds.
+    `on_shutdown()` is called while no Chrome is running, before the relaunch, e.g.
+    to open profile files that Chrome's startup would rewrite.
+    With `ws_url`, that DevTools WebSocket (an already running browser, or a stand-in
+    server in tests) is connected to directly and no process is started.
+    """
     DEBUG_PORT = 9222
+    start = time.monotonic()
+    deadline = start + timeout
+    log = logger.debug
+
+    if ws_url:
+        ws = websocket.create_connection(ws_url, timeout=timeout)
+        session = DevToolsSession(ws, deadline=deadline, timings=timings)
+        session.end_phase('connect')
+        try:
+            yield session
+        finally:
+            ws.close()
+        return
+
     config = {
         'bin': Path(os.getenv('PROGRAMFILES')) / 'Google/Chrome/Application/chrome.exe',
         'user_data': Path(os.getenv('LOCALAPPDATA')) / 'Google/Chrome/User Data'
     }
+    session = DevToolsSession(None, deadline=deadline, timings=timings)
 
-    def log(message):
-        """Debugging helper (remove when working)"""
-        print(f"[DEBUG] {message}")
-
-    # 1. Kill Chrome using original script's method
+    # 1. Kill Chrome using original script's method, then wait until it is gone
     log("Closing existing Chrome instances...")
     subprocess.run(f'taskkill /F /IM chrome.exe',
                   check=False, shell=True,
                   stdout=subprocess.DEVNULL,
                   stderr=subprocess.DEVNULL)
-    time.sleep(2)  # Increased sleep for process cleanup
+    _poll_until(lambda: not _chrome_running(), deadline, "existing Chrome processes to exit")
+    session.end_phase('shutdown')
+    if on_shutdown:
+        on_shutdown()
+        session.end_phase('on_shutdown')
 
     # 2. Launch with original script's EXACT parameters
     log("Starting Chrome...")
@@ -53,689 +264,3503 @@ def get_chrome_cookies():
         stderr=subprocess.PIPE,
         text=True
     )
+    session.proc = browser_proc
+    session.end_phase('launch')
+
+    try:
+        # 3. Poll the debug port until Chrome answers (or exits, or the budget runs out)
+        log("Waiting for DevTools endpoint...")
+        debug_info = _poll_until(lambda: _devtools_targets(DEBUG_PORT), deadline,
+                                 "the DevTools endpoint", proc=browser_proc)
+        log(f"Found {len(debug_info)} debug targets")
+        session.end_phase('devtools_ready')
+
+        # 4. Original WebSocket interaction pattern
+        log("Connecting via WebSocket...")
+        ws_url = debug_info[0]['webSocketDebuggerUrl'].strip()
+        session.ws = websocket.create_connection(ws_url, timeout=max(deadline - time.monotonic(), 1))
+        session.end_phase('connect')
+
+        try:  # PROPERLY STRUCTURED try/finally
+            yield session
+        finally:
+            session.ws.close()
+
+    finally:  # Outer cleanup
+        # 5. Clean termination
+        log("Cleaning up...")
+        browser_proc.terminate()
+        try:
+            browser_proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            browser_proc.kill()
+        subprocess.run(f'taskkill /F /IM chrome.exe',
+                      check=False, shell=True,
+                      stdout=subprocess.DEVNULL,
+                      stderr=subprocess.DEVNULL)
+
+def get_chrome_cookies(timeout=CHROME_STARTUP_TIMEOUT, timings=None, ws_url=None, on_shutdown=None):
+    """
+    Retrieve Chrome cookies via DevTools Protocol (Verified Working Version)
+
+    Chrome is restarted as described in open_chrome_devtools(), which also calls
+    `on_shutdown`. Phase durations are logged and, if a `timings` dict is passed,
+    stored in it.
+    """
+    with open_chrome_devtools(timeout, timings, ws_url, on_shutdown) as session:
+        # Headless Chrome may still be loading its cookie store, so an empty
+        # result is retried for a short grace period.
+        grace_deadline = min(time.monotonic() + CHROME_EMPTY_RESULT_GRACE, session.deadline)
+
+        def fetch_cookies():
+            response = session.call('Network.getAllCookies')
+            return response.get('result', {}).get('cookies', [])
+
+        try:
+            cookies = _poll_until(fetch_cookies, grace_deadline, "cookies to load", proc=session.proc)
+        except TimeoutError:
+            cookies = []
+        session.end_phase('fetch')
+        if cookies:
+            session.timings['time_to_first_cookie'] = time.monotonic() - session.started
+            STATS.add_time("chrome_time_to_first_cookie", session.timings['time_to_first_cookie'])
+        STATS.count("rows_read", len(cookies))
+        logger.debug(f"Retrieved {len(cookies)} cookies")
+        logger.info("Phase timings: " + ", ".join(f"{name} {seconds:.2f}s"
+                                                  for name, seconds in session.timings.items()))
+        return cookies
+
+# ----- Import Cookies into Chrome -----
+
+# Cookies sent per Network.setCookies request, and how many requests may be in flight at once.
+CDP_COOKIE_CHUNK_SIZE = 500
+CDP_MAX_IN_FLIGHT = 4
+
+# Firefox sameSite values (nsICookie) to CDP CookieSameSite.
+_CDP_SAME_SITE = {0: "None", 1: "Lax", 2: "Strict"}
+# CDP CookieParam fields copied as is from cookies exported from Chrome.
+_CDP_COOKIE_FIELDS = ("name", "value", "url", "domain", "path", "secure", "httpOnly", "sameSite",
+                      "expires", "priority", "sameParty", "sourceScheme", "sourcePort", "partitionKey")
+
+def cdp_cookie_param(cookie, default_host=None):
+    """
+    Converts an exported cookie to a CDP Network.CookieParam. Firefox cookies
+    (host/expiry/isSecure/...) are mapped; Chrome cookies (domain/expires/...) are
+    passed through. Returns None if the cookie has no host and no default was given.
+    """
+    if "host" not in cookie and "domain" in cookie:
+        param = {field: cookie[field] for field in _CDP_COOKIE_FIELDS if field in cookie}
+        if cookie.get("session") or param.get("expires", -1) <= 0:
+            param.pop("expires", None)
+        return param
+    host = cookie.get("host") or default_host
+    if not host:
+        return None
+    secure = bool(cookie.get("isSecure"))
+    param = {"name": cookie.get("name", ""), "value": cookie.get("value", ""),
+             "path": cookie.get("path") or "/", "secure": secure,
+             "httpOnly": bool(cookie.get("isHttpOnly"))}
+    if host.startswith("."):
+        param["domain"] = host
+    else:
+        # A domain would make Chrome create a domain cookie; a URL keeps it host-only.
+        param["url"] = f"{'https' if secure else 'http'}://{host}{param['path']}"
+    same_site = _CDP_SAME_SITE.get(cookie.get("sameSite"))
+    # Chrome rejects SameSite=None without Secure, so such cookies keep Chrome's default.
+    if same_site and (same_site != "None" or secure):
+        param["sameSite"] = same_site
+    expiry = cookie.get("expiry")
+    if isinstance(expiry, (int, float)) and expiry > 0:
+        param["expires"] = expiry / 1000 if expiry > MS_EXPIRY_THRESHOLD else expiry
+    return param
+
+def _cdp_cookie_label(param):
+    return f"{param.get('name')} ({param.get('domain') or param.get('url')})"
+
+def set_chrome_cookies(session, cookies, default_host=None, chunk_size=CDP_COOKIE_CHUNK_SIZE,
+                       in_flight=CDP_MAX_IN_FLIGHT):
+    """
+    Sets an iterable of cookie dicts in the browser of a DevToolsSession.
+
+    Cookies are sent in chunks of `chunk_size` with Network.setCookies, keeping up to
+    `in_flight` requests outstanding and matching responses by message id. A chunk
+    that Chrome rejects is retried one Network.setCookie per cookie, within the same
+    `in_flight` limit, so a failure is recorded for each cookie that is refused.
+    Returns a summary dict in the shape of bulk_import_cookies(), plus a "failed"
+    list of (cookie, message) for every failure.
+    """
+    summary = {"imported": 0, "skipped": 0, "error_count": 0, "errors": [], "errors_by_type": {},
+               "failed": [], "elapsed": 0.0, "rows_per_sec": 0.0}
+    start = time.perf_counter()
+    # message id -> (method, list of CookieParams) for every request awaiting a response.
+    pending = {}
+    # CookieParams of rejected chunks, waiting to be retried with Network.setCookie.
+    retries = deque()
+
+    def fail(param, message):
+        summary["failed"].append((param, message))
+        _record_error(summary, _cdp_cookie_label(param), message)
+        logger.debug(f"Chrome rejected cookie {_cdp_cookie_label(param)}: {message}")
+
+    def handle(response):
+        method, params = pending.pop(response['id'])
+        error = response.get('error')
+        if method == 'Network.setCookies':
+            if error is None:
+                summary["imported"] += len(params)
+                return
+            logger.debug(f"Network.setCookies failed ({error.get('message')}); retrying {len(params)} cookie(s) one by one")
+            retries.extend(params)
+        elif error is not None:
+            fail(params[0], error.get('message', 'error'))
+        elif response.get('result', {}).get('success') is False:
+            fail(params[0], "cookie was not accepted")
+        else:
+            summary["imported"] += 1
+
+    def wait_for_response():
+        response = session.recv()
+        if response['id'] in pending:
+            handle(response)
+
+    def convert(cookie):
+        param = cdp_cookie_param(cookie, default_host)
+        if param is None:
+            summary["skipped"] += 1
+        return param
+
+    params = (param for param in map(convert, cookies) if param is not None)
+    chunks = _chunked(params, chunk_size)
+    # Retries go out before the next chunk; responses are only read here, never from handle().
+    while True:
+        while len(pending) >= in_flight:
+            wait_for_response()
+        if retries:
+            param = retries.popleft()
+            pending[session.send('Network.setCookie', param)] = ('Network.setCookie', [param])
+            continue
+        chunk = next(chunks, None)
+        if chunk is not None:
+            pending[session.send('Network.setCookies', {'cookies': chunk})] = ('Network.setCookies', chunk)
+        elif pending:
+            wait_for_response()
+        else:
+            break
+
+    summary["elapsed"] = time.perf_counter() - start
+    if summary["elapsed"] > 0:
+        summary["rows_per_sec"] = summary["imported"] / summary["elapsed"]
+    STATS.count("rows_written", summary["imported"])
+    STATS.count("skipped", summary["skipped"])
+    STATS.count("errors", summary["error_count"])
+    return summary
+
+def import_cookies_to_chrome(cookies, default_host=None, timeout=CHROME_STARTUP_TIMEOUT, ws_url=None):
+    """
+    Imports an iterable of cookie dicts (Firefox or Chrome exports) into Chrome over
+    a single DevTools connection; see open_chrome_devtools() and set_chrome_cookies().
+    """
+    with open_chrome_devtools(timeout, ws_url=ws_url) as session:
+        summary = set_chrome_cookies(session, cookies, default_host=default_host)
+        session.end_phase('import')
+    print("Imported", summary["imported"], "cookies into Chrome",
+          f"({summary['elapsed']:.2f}s, {summary['rows_per_sec']:.0f} rows/s)")
+    if summary["skipped"]:
+        print(f"Skipped {summary['skipped']} cookie(s) without a host (no --default-host given).")
+    if summary["error_count"]:
+        print(f"Chrome rejected {summary['error_count']} cookie(s):")
+        for message, count in summary["errors_by_type"].items():
+            print(f"  {count} x {message}")
+        for item, message in summary["errors"]:
+            print(f"  e.g. {item}: {message}")
+    return summary
+
+# Control characters stripped from strings that do not carry Chrome's encoding prefix.
+_CONTROL_CHARS = re.compile('[\x00-\x08\x0B\x0C\x0E-\x1F]')
+
+def _decode_chrome_string(raw):
+    """
+    Decodes a localStorage key or value as Chrome stores it: a leading 0x01 means
+    Latin-1, 0x00 means UTF-16LE. Returns None if there is no such prefix.
+    Decodes straight from a memoryview, without copying the payload first.
+    """
+    marker = raw[:1]
+    if marker == b'\x01':
+        return str(memoryview(raw)[1:], 'latin-1')
+    if marker == b'\x00' and len(raw) % 2 == 1:
+        try:
+            return str(memoryview(raw)[1:], 'utf-16-le')
+        except UnicodeDecodeError:
+            return None
+    return None
+
+def _decode_chrome_fallback(raw):
+    """Best-effort decoding for entries without an encoding prefix (e.g. META values)."""
+    try:
+        # Try UTF-8 first, removing null bytes and control chars except newlines and tabs
+        return _CONTROL_CHARS.sub('', raw.decode('utf-8'))
+    except UnicodeDecodeError:
+        try:
+            return raw.decode('utf-16')
+        except UnicodeDecodeError:
+            # If all else fails, return base64
+            return base64.b64encode(raw).decode('ascii')
+
+def _parse_chrome_key(raw_key):
+    """
+    Splits a Chrome localStorage LevelDB key ("_<origin>\\x00<encoded key>") into
+    (origin, key). META:, METAACCESS:, VERSION and other keys go to "unknown".
+    """
+    if raw_key[:1] == b'_':
+        separator = raw_key.find(b'\x00')
+        if separator > 0:
+            encoded_key = raw_key[separator + 1:]
+            key = _decode_chrome_string(encoded_key)
+            if key is None:
+                key = _decode_chrome_fallback(encoded_key)
+            return raw_key[1:separator].decode('utf-8', 'replace'), key
+    try:
+        return 'unknown', raw_key.decode('utf-8')
+    except UnicodeDecodeError:
+        return None, None
+
+def _chrome_origin_prefix(origin):
+    """The LevelDB key prefix shared by every localStorage entry of an origin."""
+    return b'_' + origin.encode('utf-8') + b'\x00'
+
+def _chrome_local_storage_path():
+    user_data_dir = os.path.expandvars(r'%LOCALAPPDATA%\Google\Chrome\User Data')
+    return os.path.join(user_data_dir, 'Default', 'Local Storage', 'leveldb')
+
+def open_chrome_local_storage(leveldb_path=None):
+    """
+    Opens Chrome's local storage LevelDB and reads its write-ahead log right away, so
+    that the reader keeps seeing this state even if Chrome rewrites the log and
+    MANIFEST afterwards (the SSTables it holds open are never modified).
+    Returns None if the directory does not exist.
+    """
+    if leveldb_path is None:
+        leveldb_path = _chrome_local_storage_path()
+    if not os.path.exists(leveldb_path):
+        logger.warning(f"LevelDB path not found: {leveldb_path}")
+        return None
+    with STATS.phase("db_open"):
+        return LevelDBReader(leveldb_path).snapshot()
+
+def get_chrome_local_storage(leveldb_path=None, origins=None, domain_filter=None, db=None, strict=False):
+    """
+    Access Chrome's local storage using proper key parsing.
+    With `origins`, only the key ranges of those origins are read, using prefix seeks.
+    Entries of origins rejected by `domain_filter` are skipped before their values are decoded.
+    `db` is a reader from open_chrome_local_storage() to scan (and close) instead of
+    opening `leveldb_path`. Errors reading the database are logged and give an empty
+    result, or with `strict`, are raised.
+    """
+    # Chrome paths
+    if leveldb_path is None:
+        leveldb_path = _chrome_local_storage_path()
+
+    if db is None and not os.path.exists(leveldb_path):
+        logger.warning(f"LevelDB path not found: {leveldb_path}")
+        return {}
+
+    all_storage = {}
+    selected = {}
+    clock = STATS.clock()
+    decode_time = 0.0
+    rows = 0
+
+    try:
+        # Open the LevelDB database (read-only, pure Python)
+        if db is None:
+            with STATS.phase("db_open"):
+                db = LevelDBReader(leveldb_path)
+        with db:
+            if origins:
+                entries = chain.from_iterable(db.iterator(prefix=_chrome_origin_prefix(origin))
+                                              for origin in sorted(set(origins)))
+            else:
+                entries = db.iterator()
+            query_start = clock()
+            for key, value in entries:
+                decode_start = clock()
+                rows += 1
+                try:
+                    domain, storage_key = _parse_chrome_key(key)
+                    if not domain or not storage_key:
+                        continue
+                    if domain_filter:
+                        if domain not in selected:
+                            selected[domain] = domain_filter.matches_origin(domain)
+                        if not selected[domain]:
+                            continue
+
+                    decoded_value = _decode_chrome_string(value) if domain != 'unknown' else None
+                    if decoded_value is None:
+                        decoded_value = _decode_chrome_fallback(value)
+                    if not decoded_value:
+                        continue
+
+                    # Store in our result dictionary
+                    site_storage = all_storage.get(domain)
+                    if site_storage is None:
+                        site_storage = all_storage[domain] = {}
+                    site_storage[storage_key] = decoded_value
+
+                except Exception as e:
+                    STATS.count("errors")
+                    logger.debug(f"Error processing entry: {e}")
+                finally:
+                    decode_time += clock() - decode_start
+            STATS.add_time("query", clock() - query_start - decode_time)
+            STATS.add_time("decode", decode_time)
+            STATS.count("rows_read", rows)
+
+    except Exception as e:
+        STATS.count("errors")
+        if strict:
+            raise
+        logger.error(f"Error accessing LevelDB: {e}")
+        return {}
+
+    STATS.count("origins", len(all_storage))
+    logger.info(f"Found data for {len(all_storage)} domains")
+    return all_storage
+
+# ----- Snappy and Local Storage Value Codec -----
+# Firefox stores each local storage value with a conversion_type (0: raw UTF-16LE,
+# 1: converted to UTF-8) and a compression_type (0: none, 1: raw Snappy block).
+# The pure-Python Snappy implementation below is also used for Chrome's LevelDB blocks.
+
+LS_CONVERSION_NONE, LS_CONVERSION_UTF16_UTF8 = 0, 1
+LS_COMPRESSION_NONE, LS_COMPRESSION_SNAPPY = 0, 1
+# Values shorter than this (in UTF-8 bytes) are never worth compressing.
+LS_COMPRESSION_THRESHOLD = 64
+
+def _read_varint(data, pos):
+    """Decodes a little-endian base-128 varint. Returns (value, new position)."""
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def _varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def snappy_decompress(data):
+    """Decompresses a raw (unframed) Snappy block. Corrupt or truncated input raises ValueError."""
+    try:
+        length, pos = _read_varint(data, 0)
+        out = bytearray()
+        end = len(data)
+        while pos < end:
+            tag = data[pos]
+            pos += 1
+            kind = tag & 3
+            if kind == 0:  # literal
+                size = tag >> 2
+                if size >= 60:
+                    extra = size - 59
+                    size = int.from_bytes(data[pos:pos + extra], 'little')
+                    pos += extra
+                size += 1
+                out += data[pos:pos + size]
+                pos += size
+                if pos > end:
+                    raise ValueError("Corrupt Snappy data: truncated literal")
+                continue
+            if kind == 1:  # copy with 1-byte offset
+                size = ((tag >> 2) & 7) + 4
+                offset = ((tag >> 5) << 8) | data[pos]
+                pos += 1
+            elif kind == 2:  # copy with 2-byte offset
+                size = (tag >> 2) + 1
+                offset = data[pos] | (data[pos + 1] << 8)
+                pos += 2
+            else:  # copy with 4-byte offset
+                size = (tag >> 2) + 1
+                offset = int.from_bytes(data[pos:pos + 4], 'little')
+                pos += 4
+                if pos > end:
+                    raise ValueError("Corrupt Snappy data: truncated copy")
+            if offset == 0 or offset > len(out):
+                raise ValueError("Corrupt Snappy data: bad copy offset")
+            start = len(out) - offset
+            if offset >= size:
+                out += out[start:start + size]
+            else:  # overlapping copy repeats the last `offset` bytes
+                pattern = out[start:]
+                out += (pattern * (size // offset + 1))[:size]
+    except IndexError:
+        raise ValueError("Corrupt Snappy data: truncated input") from None
+    if len(out) != length:
+        raise ValueError("Corrupt Snappy data: length mismatch")
+    return bytes(out)
+
+def _snappy_literal(out, data, start, end):
+    size = end - start - 1
+    if size < 60:
+        out.append(size << 2)
+    else:
+        extra = (size.bit_length() + 7) // 8
+        out.append((59 + extra) << 2)
+        out += size.to_bytes(extra, 'little')
+    out += data[start:end]
+
+def _snappy_copy(out, offset, size):
+    while size > 0:
+        # Split long matches so that every piece is 4..64 bytes long.
+        piece = 64 if size >= 68 else (60 if size > 64 else size)
+        if piece < 12 and offset < 2048:
+            out.append(1 | ((piece - 4) << 2) | ((offset >> 8) << 5))
+            out.append(offset & 0xFF)
+        else:
+            out.append(2 | ((piece - 1) << 2))
+            out += offset.to_bytes(2, 'little')
+        size -= piece
+
+def snappy_compress(data):
+    """
+    Compresses bytes into a raw Snappy block with a greedy hash-chain matcher.
+    Not as fast as the C library, but any conforming decoder (Firefox included) reads it.
+    """
+    data = bytes(data)
+    out = bytearray(_varint(len(data)))
+    end = len(data)
+    table = {}
+    literal_start = 0
+    pos = 0
+    misses = 0
+    while pos + 4 <= end:
+        key = data[pos:pos + 4]
+        candidate = table.get(key)
+        table[key] = pos
+        if candidate is None or pos - candidate > 0xFFFF:
+            # Like Snappy, step faster through data that does not compress.
+            misses += 1
+            pos += 1 + (misses >> 5)
+            continue
+        misses = 0
+        size = 4
+        while pos + size < end and data[candidate + size:candidate + size + 8] == data[pos + size:pos + size + 8]:
+            size += 8
+        while pos + size < end and data[candidate + size] == data[pos + size]:
+            size += 1
+        size = min(size, end - pos)
+        if literal_start < pos:
+            _snappy_literal(out, data, literal_start, pos)
+        _snappy_copy(out, pos - candidate, size)
+        pos += size
+        literal_start = pos
+    if literal_start < end:
+        _snappy_literal(out, data, literal_start, end)
+    return bytes(out)
+
+def decode_ls_value(value, conversion_type, compression_type):
+    """Decodes a Firefox local storage value to str. Undecodable BLOBs are returned as hex."""
+    if not isinstance(value, bytes):
+        return value
+    try:
+        if compression_type == LS_COMPRESSION_SNAPPY:
+            value = snappy_decompress(value)
+        if conversion_type == LS_CONVERSION_NONE:
+            return value.decode("utf-16-le")
+        return value.decode("utf-8")
+    except Exception:
+        return value.hex()
+
+def encode_ls_value(value, compress=False):
+    """
+    Encodes a str for the local storage "data" table.
+    Returns (blob, conversion_type, compression_type); the value is Snappy-compressed
+    only if `compress` is set and that actually makes it smaller.
+    """
+    blob = value.encode("utf-8")
+    if compress and len(blob) >= LS_COMPRESSION_THRESHOLD:
+        compressed = snappy_compress(blob)
+        if len(compressed) < len(blob):
+            return compressed, LS_CONVERSION_UTF16_UTF8, LS_COMPRESSION_SNAPPY
+    return blob, LS_CONVERSION_UTF16_UTF8, LS_COMPRESSION_NONE
+
+# ----- Read-only LevelDB Reader -----
+# Enough of the LevelDB on-disk format to read Chrome's "Local Storage/leveldb"
+# without plyvel: the MANIFEST (to find live files), write-ahead log files and
+# SSTables (index block, data blocks, Snappy compression). Files are memory-mapped
+# and blocks are only decoded when iteration reaches them. Checksums are not verified.
+
+LEVELDB_TABLE_MAGIC = 0xdb4775248b80fb57
+LEVELDB_FOOTER_SIZE = 48
+LEVELDB_LOG_BLOCK_SIZE = 32768
+LEVELDB_LOG_HEADER = struct.Struct("<IHB")
+LEVELDB_FULL, LEVELDB_FIRST, LEVELDB_MIDDLE, LEVELDB_LAST = 1, 2, 3, 4
+LEVELDB_DELETION, LEVELDB_VALUE = 0, 1
+
+def _map_file(path):
+    """Memory-maps a file read-only. Returns None for empty files, which cannot be mapped."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _leveldb_block_entries(block):
+    """Yields the (key, value) entries of a decoded SSTable block."""
+    num_restarts = int.from_bytes(block[-4:], 'little')
+    limit = len(block) - 4 - 4 * num_restarts
+    pos = 0
+    key = b""
+    while pos < limit:
+        # Three varints per entry; nearly always single bytes, so decode those inline.
+        shared = block[pos]
+        if shared < 0x80:
+            pos += 1
+        else:
+            shared, pos = _read_varint(block, pos)
+        non_shared = block[pos]
+        if non_shared < 0x80:
+            pos += 1
+        else:
+            non_shared, pos = _read_varint(block, pos)
+        value_length = block[pos]
+        if value_length < 0x80:
+            pos += 1
+        else:
+            value_length, pos = _read_varint(block, pos)
+        key = key[:shared] + block[pos:pos + non_shared]
+        pos += non_shared
+        yield key, block[pos:pos + value_length]
+        pos += value_length
+
+def _leveldb_log_records(data):
+    """Yields the reassembled records of a LevelDB log file (write-ahead log or MANIFEST)."""
+    pos = 0
+    end = len(data)
+    fragments = []
+    while pos + LEVELDB_LOG_HEADER.size <= end:
+        block_left = LEVELDB_LOG_BLOCK_SIZE - pos % LEVELDB_LOG_BLOCK_SIZE
+        if block_left < LEVELDB_LOG_HEADER.size:
+            pos += block_left  # block trailer padding
+            continue
+        _, length, kind = LEVELDB_LOG_HEADER.unpack_from(data, pos)
+        pos += LEVELDB_LOG_HEADER.size
+        if kind == 0:
+            pos += block_left - LEVELDB_LOG_HEADER.size  # preallocated, zero-filled space
+            continue
+        if pos + length > end:
+            return  # record still being written
+        fragment = data[pos:pos + length]
+        pos += length
+        if kind == LEVELDB_FULL:
+            fragments = []
+            yield fragment
+        elif kind == LEVELDB_FIRST:
+            fragments = [fragment]
+        elif kind == LEVELDB_MIDDLE:
+            fragments.append(fragment)
+        elif kind == LEVELDB_LAST and fragments:
+            fragments.append(fragment)
+            yield b"".join(fragments)
+            fragments = []
+
+def _leveldb_batch_entries(record):
+    """Yields (user_key, -sequence, kind, value) for each operation of a WriteBatch record."""
+    sequence = int.from_bytes(record[0:8], 'little')
+    count = int.from_bytes(record[8:12], 'little')
+    pos = 12
+    for i in range(count):
+        kind = record[pos]
+        key_length, pos = _read_varint(record, pos + 1)
+        key = record[pos:pos + key_length]
+        pos += key_length
+        value = b""
+        if kind == LEVELDB_VALUE:
+            value_length, pos = _read_varint(record, pos)
+            value = record[pos:pos + value_length]
+            pos += value_length
+        yield (key, -(sequence + i), kind, value)
+
+def _leveldb_live_files(path):
+    """
+    Replays the MANIFEST named by CURRENT. Returns (live table numbers, oldest live
+    log number), or None if there is no readable manifest.
+    """
+    try:
+        with open(os.path.join(path, "CURRENT"), 'r') as f:
+            manifest = os.path.join(path, f.read().strip())
+        with open(manifest, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    tables = set()
+    log_number = 0
+    for edit in _leveldb_log_records(data):
+        pos = 0
+        while pos < len(edit):
+            tag, pos = _read_varint(edit, pos)
+            if tag == 1:  # comparator name
+                length, pos = _read_varint(edit, pos)
+                pos += length
+            elif tag in (2, 3, 4, 9):  # log number, next file, last sequence, prev log number
+                value, pos = _read_varint(edit, pos)
+                if tag == 2:
+                    log_number = value
+            elif tag == 5:  # compact pointer: level, internal key
+                _, pos = _read_varint(edit, pos)
+                length, pos = _read_varint(edit, pos)
+                pos += length
+            elif tag == 6:  # deleted file: level, number
+                _, pos = _read_varint(edit, pos)
+                number, pos = _read_varint(edit, pos)
+                tables.discard(number)
+            elif tag == 7:  # new file: level, number, size, smallest key, largest key
+                _, pos = _read_varint(edit, pos)
+                number, pos = _read_varint(edit, pos)
+                _, pos = _read_varint(edit, pos)
+                for _ in range(2):
+                    length, pos = _read_varint(edit, pos)
+                    pos += length
+                tables.add(number)
+            else:
+                return None  # unknown tag; fall back to reading every file
+    return tables, log_number
+
+class _LevelDBTable:
+    """A memory-mapped SSTable whose data blocks are decoded lazily."""
+
+    def __init__(self, path):
+        self.data = _map_file(path)
+        if self.data is None or len(self.data) < LEVELDB_FOOTER_SIZE:
+            raise ValueError(f"Not an SSTable: {path}")
+        footer = self.data[-LEVELDB_FOOTER_SIZE:]
+        if int.from_bytes(footer[-8:], 'little') != LEVELDB_TABLE_MAGIC:
+            raise ValueError(f"Bad SSTable magic number: {path}")
+        _, pos = _read_varint(footer, 0)  # metaindex offset
+        _, pos = _read_varint(footer, pos)  # metaindex size
+        index_offset, pos = _read_varint(footer, pos)
+        index_size, pos = _read_varint(footer, pos)
+        self.index = list(_leveldb_block_entries(self._read_block(index_offset, index_size)))
+
+    def _read_block(self, offset, size):
+        block = self.data[offset:offset + size]
+        compression = self.data[offset + size]
+        if compression == 1:
+            return snappy_decompress(block)
+        if compression != 0:
+            raise ValueError(f"Unsupported LevelDB block compression {compression}")
+        return block
+
+    def entries(self, start=None):
+        """
+        Yields (user_key, -sequence, kind, value) in internal key order, beginning
+        with the first entry whose user key is >= `start`. Index entries are separators
+        that are >= every key of their block, so earlier blocks are never decoded.
+        """
+        for index_key, handle in self.index:
+            if start is not None and index_key[:-8] < start:
+                continue
+            offset, pos = _read_varint(handle, 0)
+            size, _ = _read_varint(handle, pos)
+            for key, value in _leveldb_block_entries(self._read_block(offset, size)):
+                user_key = key[:-8]
+                if start is not None and user_key < start:
+                    continue
+                tag = int.from_bytes(key[-8:], 'little')
+                yield (user_key, -(tag >> 8), tag & 0xFF, value)
+            start = None
+
+    def close(self):
+        self.data.close()
+
+class LevelDBReader:
+    """
+    Read-only LevelDB access without native dependencies. iterator() yields the live
+    (key, value) pairs in key order, like plyvel.DB.iterator(), merging the SSTables
+    and the write-ahead log lazily so the first keys arrive before the rest is read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        live = _leveldb_live_files(path)
+        self.tables = []
+        self.log_paths = []
+        try:
+            for name in sorted(os.listdir(path)):
+                stem, ext = os.path.splitext(name)
+                if not stem.isdigit():
+                    continue
+                if ext in (".ldb", ".sst") and (live is None or int(stem) in live[0]):
+                    self.tables.append(_LevelDBTable(os.path.join(path, name)))
+                elif ext == ".log" and (live is None or int(stem) >= live[1]):
+                    self.log_paths.append(os.path.join(path, name))
+        except Exception:
+            self.close()
+            raise
+        self._log_entries = None
+
+    def snapshot(self):
+        """
+        Reads the write-ahead log now rather than on the first iterator() call, so that
+        later changes to the directory no longer matter. Returns the reader.
+        """
+        try:
+            self._memtable()
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def _memtable(self):
+        """Entries still only in the write-ahead log, sorted like an SSTable."""
+        if self._log_entries is None:
+            entries = []
+            for log_path in self.log_paths:
+                data = _map_file(log_path)
+                if data is None:
+                    continue
+                try:
+                    for record in _leveldb_log_records(data):
+                        entries.extend(_leveldb_batch_entries(record))
+                finally:
+                    data.close()
+            entries.sort()
+            self._log_entries = entries
+        return self._log_entries
+
+    def iterator(self, start=None, prefix=None):
+        """
+        Yields live (key, value) pairs in key order, beginning at `start` (or at the
+        start of the database). With `prefix`, only that key range is read.
+        """
+        if prefix is not None:
+            start = max(start or prefix, prefix)
+        memtable = self._memtable()
+        if start is not None:
+            memtable = memtable[bisect.bisect_left(memtable, (start,)):]
+        sources = [table.entries(start) for table in self.tables]
+        sources.append(iter(memtable))
+        last_key = None
+        # Entries sort by key, then newest first; only the newest version of a key counts.
+        for user_key, _, kind, value in heapq.merge(*sources):
+            if user_key == last_key:
+                continue
+            if prefix is not None and not user_key.startswith(prefix):
+                return
+            last_key = user_key
+            if kind == LEVELDB_VALUE:
+                yield user_key, value
+
+    def close(self):
+        for table in self.tables:
+            table.close()
+        self.tables = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ----- Domain Filter -----
+
+# Host part of an origin or site folder name: "https://a.com:8443", "https+++a.com+8443^userContextId=1".
+_ORIGIN_HOST = re.compile(r'(?:[^:/+]*(?:://|\+\+\+))?(\[[^\]]*\]|[^:/+^]*)')
+
+def _origin_host(origin):
+    return _ORIGIN_HOST.match(origin).group(1)
+
+class DomainFilter:
+    """
+    Selects hosts by --include-domain / --exclude-domain patterns. A pattern with
+    glob characters (*, ? or [) must match the whole host; any other pattern matches
+    that domain and all of its subdomains. A host is selected if it matches an
+    include pattern (or none were given) and no exclude pattern.
+    Hosts are compared case-insensitively and without a leading dot.
+    """
+    GLOB_CHARS = re.compile(r'[*?\[]')
+
+    def __init__(self, include=(), exclude=()):
+        self.include = [self._normalize(pattern) for pattern in include or ()]
+        self.exclude = [self._normalize(pattern) for pattern in exclude or ()]
+        self._include_re = self._compile(self.include)
+        self._exclude_re = self._compile(self.exclude)
+
+    def __bool__(self):
+        return bool(self.include or self.exclude)
+
+    @staticmethod
+    def _normalize(pattern):
+        return pattern.strip().lstrip('.').lower()
+
+    def _compile(self, patterns):
+        if not patterns:
+            return None
+        return re.compile('|'.join(fnmatch.translate(pattern) if self.GLOB_CHARS.search(pattern)
+                                   else r'(?:.*\.)?' + re.escape(pattern) + r'\Z'
+                                   for pattern in patterns))
+
+    def matches(self, host):
+        host = (host or "").lstrip('.').lower()
+        if self._include_re and not self._include_re.match(host):
+            return False
+        return not (self._exclude_re and self._exclude_re.match(host))
+
+    def matches_origin(self, origin):
+        return self.matches(_origin_host(origin))
+
+    def _sql_any(self, patterns, expr):
+        clauses = []
+        params = []
+        for pattern in patterns:
+            if self.GLOB_CHARS.search(pattern):
+                # SQLite's GLOB negates character classes with ^ where fnmatch uses !.
+                clauses.append(f"{expr} GLOB ?")
+                params.append(pattern.replace('[!', '[^'))
+            else:
+                clauses.append(f"{expr} = ? OR {expr} GLOB ?")
+                params.extend((pattern, '*.' + pattern))
+        return "(" + " OR ".join(clauses) + ")", params
+
+    def sql(self, column="host"):
+        """Returns (where, params): an SQL condition on `column` equivalent to matches()."""
+        expr = f"lower(ltrim(coalesce({column}, ''), '.'))"
+        clauses = []
+        params = []
+        if self.include:
+            clause, clause_params = self._sql_any(self.include, expr)
+            clauses.append(clause)
+            params.extend(clause_params)
+        if self.exclude:
+            clause, clause_params = self._sql_any(self.exclude, expr)
+            clauses.append("NOT " + clause)
+            params.extend(clause_params)
+        return " AND ".join(clauses) or "1", params
+
+    def spec(self):
+        return {"include": self.include, "exclude": self.exclude}
+
+# ----- Snapshot Reads -----
+# Firefox keeps its databases open (often in WAL mode with an exclusive lock), so
+# connecting to the live files can block or miss rows still in the write-ahead log.
+#   "ro":   open read-only through a URI and fail fast instead of waiting on locks
+#   "copy": copy the database with the SQLite backup API (or, if it is locked, the
+#           file plus its -wal) to a temp directory and read that copy
+# Both read with memory-mapped I/O. Set with --snapshot.
+
+SNAPSHOT_MODES = ("none", "ro", "copy")
+SNAPSHOT_MODE = "none"
+SNAPSHOT_MMAP_SIZE = 256 * 1024 * 1024
+
+def _readonly_uri(path):
+    return "file:" + pathname2url(os.path.abspath(path)) + "?mode=ro"
+
+def _snapshot_copy(path, tmp_dir):
+    """
+    Copies a database into `tmp_dir` and returns the copy's path. The backup API
+    copies a consistent point-in-time image, including committed WAL content; if the
+    browser holds a lock, the files are copied directly instead. The -shm index is
+    not copied: SQLite rebuilds it from the -wal, which is safer than a stale copy.
+    """
+    copy = os.path.join(tmp_dir, os.path.basename(path))
+    try:
+        source = sqlite3.connect(_readonly_uri(path), uri=True, timeout=0, isolation_level=None)
+        try:
+            # backup() retries forever while the source is locked, so take the read
+            # lock first: this fails immediately instead, and pins the snapshot.
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchall()
+            target = sqlite3.connect(copy)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+    except sqlite3.Error as e:
+        logger.debug(f"Backup of {path} failed ({e}); copying the files instead")
+        for suffix in ("", "-wal"):
+            if os.path.exists(copy + suffix):
+                os.remove(copy + suffix)
+            if os.path.exists(path + suffix):
+                shutil.copyfile(path + suffix, copy + suffix)
+    return copy
+
+@contextmanager
+def open_profile_db(path, mode=None):
+    """
+    Opens a profile database for reading according to `mode` (default: SNAPSHOT_MODE)
+    and yields the connection. Temporary snapshot copies are removed afterwards.
+    """
+    mode = mode or SNAPSHOT_MODE
+    tmp_dir = None
+    try:
+        with STATS.phase("db_open"):
+            if mode == "none":
+                conn = sqlite3.connect(path)
+            else:
+                if mode == "copy":
+                    tmp_dir = tempfile.mkdtemp(prefix="cookiewrangler-")
+                    conn = sqlite3.connect(_snapshot_copy(path, tmp_dir))
+                else:
+                    conn = sqlite3.connect(_readonly_uri(path), uri=True, timeout=0)
+                conn.execute(f"PRAGMA mmap_size={SNAPSHOT_MMAP_SIZE}").fetchall()
+                conn.execute("PRAGMA query_only=ON").fetchall()
+        try:
+            yield conn
+        finally:
+            conn.close()
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# ----- Cookie Records -----
+# Firefox cookies travel through the tool as CookieRecord objects instead of
+# 13-key dicts: one __slots__ object per cookie, with host, path, baseDomain and
+# originAttributes interned with sys.intern, so cookies of the same site share
+# those strings. Interned strings are freed with the last record that uses them,
+# so nothing outlives the export, import, diff or merge that read the cookies.
+# Records read like dicts (get(), [], in, keys()), so code handling Chrome cookie
+# dicts accepts them too; they become dicts only when written as JSON.
+
+def _shared(value):
+    """
+    sys.intern() for str. None and other hashable values are kept as they are;
+    unhashable ones raise TypeError, which from_dict() relies on.
+    """
+    if type(value) is str:
+        return sys.intern(value)
+    hash(value)
+    return value
+
+class CookieRecord:
+    """A Firefox cookie: the moz_cookies columns of an export, plus baseDomain."""
+
+    FIELDS = ("originAttributes", "name", "value", "host", "path", "expiry", "isSecure", "isHttpOnly",
+              "inBrowserElement", "sameSite", "rawSameSite", "schemeMap", "baseDomain")
+    KEYS = frozenset(FIELDS)
+    __slots__ = FIELDS
+
+    def __init__(self, originAttributes, name, value, host, path, expiry, isSecure, isHttpOnly,
+                 inBrowserElement, sameSite, rawSameSite, schemeMap, baseDomain=None):
+        self.originAttributes = _shared(originAttributes)
+        self.name = name
+        self.value = value
+        self.host = _shared(host)
+        self.path = _shared(path)
+        self.expiry = expiry
+        self.isSecure = isSecure
+        self.isHttpOnly = isHttpOnly
+        self.inBrowserElement = inBrowserElement
+        self.sameSite = sameSite
+        self.rawSameSite = rawSameSite
+        self.schemeMap = schemeMap
+        if baseDomain is None:
+            baseDomain = host.lstrip('.') if host else ""
+        self.baseDomain = _shared(baseDomain)
+
+    _fields_of = itemgetter(*FIELDS)
+    _values = attrgetter(*FIELDS)
+
+    @classmethod
+    def from_dict(cls, cookie):
+        """
+        Returns a record for a Firefox cookie dict. Records, Chrome cookies and any
+        other shape are returned as they are.
+        """
+        if type(cookie) is not dict or len(cookie) != len(cls.FIELDS):
+            return cookie
+        try:
+            return cls(*cls._fields_of(cookie))
+        except (KeyError, TypeError):  # Other keys, or unhashable values in interned fields.
+            return cookie
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def row(self, now):
+        """The COOKIE_INSERT_SQL parameters, with `now` as lastAccessed and creationTime."""
+        return (self.originAttributes, self.name, self.value, self.host, self.path, self.expiry, now, now,
+                self.isSecure, self.isHttpOnly, self.inBrowserElement, self.sameSite, self.rawSameSite,
+                self.schemeMap)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.KEYS else default
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def keys(self):
+        return self.KEYS
+
+    def __eq__(self, other):
+        if isinstance(other, CookieRecord):
+            return self._values(self) == other._values(other)
+        if isinstance(other, dict):
+            if len(other) != len(self.FIELDS):
+                return False
+            try:
+                return self._values(self) == self._fields_of(other)
+            except KeyError:
+                return False
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"CookieRecord({self.to_dict()!r})"
+
+def _json_default(obj):
+    """json.dumps() fallback: CookieRecords become cookie dicts, anything else a string."""
+    if isinstance(obj, CookieRecord):
+        return obj.to_dict()
+    return str(obj)
+
+# ----- Firefox Cookies and Local Storage Functions -----
+
+def _origin_from_folder(site_folder):
+    """Converts a site folder name to an origin, e.g. "https+++example.com" -> "https://example.com"."""
+    return os.path.basename(site_folder).replace("+++", "://")
+
+def _read_site_storage(ls_db):
+    """Reads the key/value pairs from one site's ls/data.sqlite "data" table."""
+    site_storage = {}
+    with open_profile_db(ls_db) as conn:
+        with STATS.phase("query"):
+            rows = conn.execute("SELECT key, value, conversion_type, compression_type FROM data").fetchall()
+    with STATS.phase("decode"):
+        for key, value, conversion_type, compression_type in rows:
+            site_storage[key] = decode_ls_value(value, conversion_type, compression_type)
+    STATS.count("rows_read", len(site_storage))
+    STATS.count("origins")
+    return site_storage
+
+def _read_site_folder(site_folder):
+    """
+    Worker for the local storage scan. Returns (origin, storage) for a site folder,
+    with storage set to None if the folder has no readable ls/data.sqlite.
+    """
+    origin = _origin_from_folder(site_folder)
+    ls_db = os.path.join(site_folder, "ls", "data.sqlite")
+    if not os.path.exists(ls_db):
+        return origin, None
+    try:
+        return origin, _read_site_storage(ls_db)
+    except Exception as e:
+        STATS.count("errors")
+        logger.warning(f"Error reading local storage from {ls_db}: {e}")
+        return origin, None
+
+def ordered_pool_map(func, items, workers):
+    """
+    Like ThreadPoolExecutor.map(), yielding (item, result) in input order, but only
+    keeps a bounded window of tasks in flight so that results are never buffered
+    much faster than the consumer handles them.
+    """
+    window = deque()
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for item in islice(items, workers * 2):
+            window.append((item, executor.submit(func, item)))
+        while window:
+            item, future = window.popleft()
+            result = future.result()
+            for next_item in islice(items, 1):
+                window.append((next_item, executor.submit(func, next_item)))
+            yield item, result
+
+def scan_site_folders(site_folders, workers=1):
+    """
+    Yields (site_folder, origin, storage) for every site folder, in the order given.
+    With workers > 1 the per-origin databases are read on a thread pool, which hides
+    the per-file open/seek latency; sqlite3 releases the GIL while it reads.
+    """
+    if workers is None or workers <= 1:
+        for site_folder in site_folders:
+            yield (site_folder,) + _read_site_folder(site_folder)
+        return
+    for site_folder, result in ordered_pool_map(_read_site_folder, site_folders, workers):
+        yield (site_folder,) + result
+
+def select_site_folders(site_folders, origins=None, domain_filter=None):
+    """
+    Drops site folders of origins not in `origins` or rejected by `domain_filter`,
+    going by the folder name alone so that no database is opened for them.
+    """
+    if origins:
+        wanted = set(origins)
+        site_folders = [folder for folder in site_folders if _origin_from_folder(folder) in wanted]
+    if domain_filter:
+        site_folders = [folder for folder in site_folders
+                        if domain_filter.matches_origin(os.path.basename(folder))]
+    return site_folders
+
+def iter_firefox_local_storage(profile_dir, workers=1, origins=None, domain_filter=None):
+    """
+    Yields (origin, storage) pairs for every site folder with local storage,
+    one origin at a time, in sorted folder order.
+    Folders not selected by `origins` / `domain_filter` are skipped before their databases are opened.
+    """
+    storage_dir = os.path.join(profile_dir, "storage", "default")
+    with STATS.phase("discovery"):
+        site_folders = select_site_folders(sorted(glob(os.path.join(storage_dir, "*"))), origins, domain_filter)
+    for _, origin, site_storage in scan_site_folders(site_folders, workers):
+        if site_storage is not None:
+            yield origin, site_storage
+
+def get_firefox_local_storage(profile_dir=None, workers=1, domain_filter=None):
+    """
+    Returns local storage data from Firefox's per-site storage databases.
+    For each site folder in <profile_dir>/storage/default, this function looks for the
+    ls/data.sqlite file and reads the key/value pairs from its "data" table.
+    It returns a dictionary mapping origins (e.g. "https://example.com") to another
+    dictionary of local storage key/value pairs.
+    Site folders are read on `workers` threads; the result order is the same either way.
+    """
+    # Auto-detect the profile directory if not provided.
+    if profile_dir is None:
+        if os.name == 'posix':
+            base = os.path.expanduser('~/.mozilla/firefox')
+        else:
+            base = os.path.expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles')
+        profiles = glob(os.path.join(base, '*default-release*'))
+        if not profiles:
+            profiles = glob(os.path.join(base, '*default*'))
+        if not profiles:
+            raise FileNotFoundError("Firefox profile not found")
+        profile_dir = profiles[0]
+
+    return dict(iter_firefox_local_storage(profile_dir, workers, domain_filter=domain_filter))
+
+def export_firefox_local_storage(output_file, profile_dir=None, workers=1):
+    """
+    Exports local storage using the get_firefox_local_storage() function.
+    """
+    data = get_firefox_local_storage(profile_dir, workers=workers)
+    with open(output_file, 'w') as f:
+        json.dump(data, f, indent=2)
+    print(f"Exported LocalStorage to {output_file}")
+
+def import_local_storage_to_firefox(import_file, firefox_db=None, profile_dir=None, workers=1, compress=False):
+    try:
+        with open(import_file, 'r', encoding='utf-8') as f:
+            storage_data = json.load(f)
+    except Exception as e:
+        print("Error reading local storage import file:", e)
+        return
+
+    if not storage_data:
+        print("No local storage entries found in import file")
+        return
+
+    import_local_storage_data(storage_data, profile_dir, workers=workers, compress=compress)
+
+def find_firefox_cookies_db():
+    """Returns the cookies.sqlite of the default Firefox profile."""
+    with STATS.phase("discovery"):
+        return _find_firefox_cookies_db()
+
+def _find_firefox_cookies_db():
+    if globals().get('LINUX', False):
+        profiles = glob(os.path.expanduser('~/.mozilla/firefox/*default-release*/cookies.sqlite'))
+        if not profiles:
+            profiles = glob(os.path.expanduser('~/.mozilla/firefox/*default*/cookies.sqlite'))
+    else:
+        profiles = glob(expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles\*default-release*\cookies.sqlite'))
+        if not profiles:
+            profiles = glob(expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles\*default*\cookies.sqlite'))
+    if not profiles:
+        raise FileNotFoundError("Firefox cookies database not found!")
+    return profiles[0]
+
+def iter_firefox_cookies(db=None, where=None, params=(), domain_filter=None, skip_expired=False):
+    """
+    Yields Firefox cookies one at a time, straight from the moz_cookies cursor,
+    in the same dictionary format as export_firefox_cookies().
+    An optional SQL `where` clause (with `params`) and `domain_filter` restrict the rows read;
+    with `skip_expired`, expired cookies are left out by the query as well.
+    """
+    if db is None:
+        db = find_firefox_cookies_db()
+    with open_profile_db(db) as conn:
+        yield from query_cookies(conn, where, params, domain_filter, skip_expired)
+
+def cookie_conditions(domain_filter=None, skip_expired=False, now=None):
+    """Returns (where, params) selecting the moz_cookies rows to export ("1" for all)."""
+    clauses = []
+    params = []
+    if domain_filter:
+        filter_where, filter_params = domain_filter.sql("host")
+        clauses.append(filter_where)
+        params.extend(filter_params)
+    if skip_expired:
+        expired_where, expired_params = expired_sql(now)
+        clauses.append(f"NOT {expired_where}")
+        params.extend(expired_params)
+    return " AND ".join(clauses) or "1", params
+
+def query_cookies(conn, where=None, params=(), domain_filter=None, skip_expired=False):
+    """Yields the cookie dicts of an open cookies database; see iter_firefox_cookies()."""
+    if domain_filter or skip_expired:
+        filter_where, filter_params = cookie_conditions(domain_filter, skip_expired)
+        where = f"({where}) AND {filter_where}" if where else filter_where
+        params = tuple(params) + tuple(filter_params)
+    cur = conn.cursor()
+    query = """
+      SELECT originAttributes, name, value, host, path, expiry, isSecure, isHttpOnly,
+             inBrowserElement, sameSite, rawSameSite, schemeMap
+      FROM moz_cookies
+    """
+    if where:
+        query += f" WHERE {where}"
+    with STATS.phase("query"):
+        cur.execute(query, params)
+    while True:
+        with STATS.phase("query"):
+            rows = cur.fetchmany(BULK_CHUNK_SIZE)
+        if not rows:
+            break
+        STATS.count("rows_read", len(rows))
+        yield from _cookie_records(rows)
+
+def _cookie_records(rows):
+    """Converts a batch of moz_cookies rows to CookieRecords; timed as the "decode" phase."""
+    clock = STATS.clock()
+    start = clock()
+    cookies = [CookieRecord(*row) for row in rows]
+    STATS.add_time("decode", clock() - start)
+    return cookies
+
+def export_firefox_cookies(db=None, domain_filter=None, skip_expired=False):
+    """
+    Exports Firefox cookies in a format suitable for import.
+    Returns a list of CookieRecords, one per cookie (to_dict() gives the export dict).
+    """
+    return list(iter_firefox_cookies(db, domain_filter=domain_filter, skip_expired=skip_expired))
+
+# ----- Expired Cookies -----
+# Firefox stores expiry in seconds (recent versions in milliseconds); session
+# cookies have no expiry (0 or less) and never count as expired.
+
+# Expiry values above this are milliseconds: 1e11 seconds would be the year 5138.
+MS_EXPIRY_THRESHOLD = 100_000_000_000
+
+def expired_sql(now=None, column="expiry"):
+    """Returns (condition, params): an SQL condition true for expired cookies."""
+    now = int(time.time()) if now is None else int(now)
+    return (f"({column} > 0 AND {column} < CASE WHEN {column} > {MS_EXPIRY_THRESHOLD} THEN ? ELSE ? END)",
+            [now * 1000, now])
+
+def cookie_expired(cookie, now):
+    """Python counterpart of expired_sql() for a cookie dict (Firefox "expiry" or Chrome "expires")."""
+    expiry = cookie.get("expiry", cookie.get("expires"))
+    if not isinstance(expiry, (int, float)) or expiry <= 0:
+        return False
+    if expiry > MS_EXPIRY_THRESHOLD:
+        expiry /= 1000
+    return expiry < now
+
+def drop_expired_events(events, now=None):
+    """Drops the cookie events of expired cookies from an import event stream."""
+    now = time.time() if now is None else now
+    skipped = 0
+    for event in events:
+        if event[0] == "cookie" and cookie_expired(event[1], now):
+            skipped += 1
+            continue
+        yield event
+    STATS.count("skipped", skipped)
+    if skipped:
+        print(f"Skipped {skipped} expired cookie(s).")
+
+def purge_expired_cookies(conn, now=None):
+    """
+    Deletes expired cookies from moz_cookies and, if the database uses incremental
+    auto_vacuum, returns the freed pages to the file system with incremental_vacuum.
+    Returns (deleted_rows, freed_pages).
+    """
+    where, params = expired_sql(now)
+    with conn:
+        deleted = conn.execute(f"DELETE FROM moz_cookies WHERE {where}", params).rowcount
+    freed = 0
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+        freed = before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    else:
+        logger.info("auto_vacuum is not incremental; freed pages stay in the file for reuse")
+    return deleted, freed
+
+# ----- Bulk Cookie Import Engine -----
+
+MOZ_COOKIES_SCHEMA = """
+    CREATE TABLE moz_cookies (
+        id INTEGER PRIMARY KEY,
+        originAttributes TEXT NOT NULL DEFAULT '',
+        name TEXT,
+        value TEXT,
+        host TEXT,
+        path TEXT,
+        expiry INTEGER,
+        lastAccessed INTEGER,
+        creationTime INTEGER,
+        isSecure INTEGER,
+        isHttpOnly INTEGER,
+        inBrowserElement INTEGER DEFAULT 0,
+        sameSite INTEGER DEFAULT 0,
+        rawSameSite INTEGER DEFAULT 0,
+        schemeMap INTEGER DEFAULT 0,
+        isPartitionedAttributeSet INTEGER DEFAULT 0,
+        CONSTRAINT moz_uniqueid UNIQUE (name, host, path, originAttributes)
+    )
+"""
+
+COOKIE_COLUMNS = """originAttributes, name, value, host, path, expiry, lastAccessed, creationTime,
+     isSecure, isHttpOnly, inBrowserElement, sameSite, rawSameSite, schemeMap"""
+
+COOKIE_INSERT_SQL = f"""
+    INSERT INTO moz_cookies
+    ({COOKIE_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# How an imported cookie that already exists (same name, host, path and originAttributes)
+# is handled. "error" is a plain INSERT that reports every such cookie as a failure; the
+# others stage the import in a temp table and apply it with one INSERT ... ON CONFLICT.
+CONFLICT_POLICIES = ("error", "overwrite", "newer-expiry", "keep-existing")
+
+COOKIE_STAGING_SCHEMA = f"""
+    CREATE TEMP TABLE IF NOT EXISTS cookie_staging ({COOKIE_COLUMNS})
+"""
+
+COOKIE_STAGING_INSERT_SQL = f"""
+    INSERT INTO cookie_staging ({COOKIE_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# The existing row's creationTime is kept when a cookie is updated.
+_COOKIE_UPDATE_SET = ", ".join(f"{column} = excluded.{column}" for column in (
+    "value", "expiry", "lastAccessed", "isSecure", "isHttpOnly", "inBrowserElement",
+    "sameSite", "rawSameSite", "schemeMap"))
+
+_CONFLICT_ACTIONS = {
+    "overwrite": f"DO UPDATE SET {_COOKIE_UPDATE_SET}",
+    "newer-expiry": f"DO UPDATE SET {_COOKIE_UPDATE_SET} WHERE excluded.expiry > moz_cookies.expiry",
+    "keep-existing": "DO NOTHING",
+}
+
+def _cookie_upsert_sql(policy, source):
+    """INSERT ... ON CONFLICT for `policy`, taking rows from `source` (a SELECT or VALUES)."""
+    return (f"INSERT INTO moz_cookies ({COOKIE_COLUMNS}) {source}\n"
+            f"    ON CONFLICT (name, host, path, originAttributes) {_CONFLICT_ACTIONS[policy]}")
+
+# Number of cookies handed to a single executemany() call.
+BULK_CHUNK_SIZE = 5000
+# Only this many failed rows are kept verbatim in the import summary.
+MAX_REPORTED_ERRORS = 10
+
+def _chunked(iterable, size):
+    """Yields lists of up to `size` items from any iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _ensure_moz_cookies_table(cur):
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='moz_cookies'")
+    if not cur.fetchone():
+        cur.execute(MOZ_COOKIES_SCHEMA)
+        print("Created new table 'moz_cookies' in the database.")
+
+def _cookie_to_row(cookie, default_host, now):
+    """
+    Converts a cookie dict to a COOKIE_INSERT_SQL parameter tuple.
+    Returns None if the cookie has no host and no default was provided.
+    """
+    if type(cookie) is CookieRecord and cookie.host:
+        return cookie.row(now)
+    get = cookie.get
+    host = get("host", default_host)
+    if not host:
+        return None
+    return (get("originAttributes", ""), get("name", ""), get("value", ""), host,
+            get("path", "/"), get("expiry", 0), now, now,
+            get("isSecure", 0), get("isHttpOnly", 0), get("inBrowserElement", 0),
+            get("sameSite", 0), get("rawSameSite", 0), get("schemeMap", 0))
+
+@contextmanager
+def _bulk_load_pragmas(conn):
+    """
+    Tunes a connection for a bulk load (no fsync, in-memory rollback journal,
+    larger page cache) and restores the previous settings afterwards.
+    WAL databases keep their journal mode, since leaving WAL needs exclusive access.
+    """
+    cur = conn.cursor()
+    saved = {}
+    for pragma in ("synchronous", "journal_mode", "cache_size"):
+        saved[pragma] = cur.execute(f"PRAGMA {pragma}").fetchone()[0]
+    # fetchall() so that no pragma statement is left in progress.
+    cur.execute("PRAGMA synchronous=OFF").fetchall()
+    cur.execute("PRAGMA cache_size=-65536").fetchall()
+    if str(saved["journal_mode"]).lower() != "wal":
+        cur.execute("PRAGMA journal_mode=MEMORY").fetchall()
+    try:
+        yield
+    finally:
+        for pragma, value in saved.items():
+            cur.execute(f"PRAGMA {pragma}={value}").fetchall()
+
+def _insert_cookie_chunk(cur, rows, summary):
+    """
+    Inserts one chunk with executemany. If any row fails, the chunk is rolled back
+    to its savepoint and replayed row by row so the failures can be recorded.
+    """
+    cur.execute("SAVEPOINT cookie_chunk")
+    try:
+        cur.executemany(COOKIE_INSERT_SQL, rows)
+        summary["imported"] += len(rows)
+    except sqlite3.Error:
+        cur.execute("ROLLBACK TO cookie_chunk")
+        for row in rows:
+            try:
+                cur.execute(COOKIE_INSERT_SQL, row)
+                summary["imported"] += 1
+            except sqlite3.Error as e:
+                _record_error(summary, f"{row[1]} ({row[3]})", e)
+    cur.execute("RELEASE cookie_chunk")
+
+def _apply_staged_cookies(cur, policy, summary):
+    """
+    Applies the cookie_staging table to moz_cookies with a single set-based
+    INSERT ... SELECT ... ON CONFLICT statement. If that statement fails, it is rolled
+    back and the staged rows are applied one at a time so the failures can be recorded.
+    Adds the inserted, updated and unchanged counts to `summary`.
+    """
+    conn = cur.connection
+    staged = cur.execute("SELECT count(*) FROM cookie_staging").fetchone()[0]
+    before = cur.execute("SELECT count(*) FROM moz_cookies").fetchone()[0]
+    errors = summary["error_count"]
+    cur.execute("SAVEPOINT cookie_upsert")
+    changes = conn.total_changes
+    try:
+        # "WHERE true" keeps SQLite from parsing ON CONFLICT as part of the SELECT's join.
+        cur.execute(_cookie_upsert_sql(policy, f"SELECT {COOKIE_COLUMNS} FROM cookie_staging WHERE true"))
+    except sqlite3.Error:
+        cur.execute("ROLLBACK TO cookie_upsert")
+        changes = conn.total_changes
+        row_sql = _cookie_upsert_sql(policy, "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+        for row in conn.execute(f"SELECT {COOKIE_COLUMNS} FROM cookie_staging ORDER BY rowid"):
+            try:
+                cur.execute(row_sql, row)
+            except sqlite3.Error as e:
+                _record_error(summary, f"{row[1]} ({row[3]})", e)
+    written = conn.total_changes - changes
+    cur.execute("RELEASE cookie_upsert")
+    inserted = cur.execute("SELECT count(*) FROM moz_cookies").fetchone()[0] - before
+    summary["imported"] += inserted
+    summary["updated"] += written - inserted
+    summary["unchanged"] += staged - written - (summary["error_count"] - errors)
+    cur.execute("DROP TABLE temp.cookie_staging")
+
+def _record_error(summary, item, error):
+    message = str(error)
+    summary["error_count"] += 1
+    summary["errors_by_type"][message] = summary["errors_by_type"].get(message, 0) + 1
+    if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+        summary["errors"].append((item, message))
+
+def bulk_import_cookies(conn, cookies, default_host=None, chunk_size=BULK_CHUNK_SIZE, on_conflict="error"):
+    """
+    Bulk-inserts an iterable of cookie dicts into moz_cookies.
+
+    Cookies are converted to rows in chunks and written with executemany() inside
+    a single explicit transaction, with the connection tuned for bulk loading.
+    With an `on_conflict` policy other than "error" (see CONFLICT_POLICIES) the chunks
+    go to a temp staging table instead, which is then upserted in one statement.
+    Returns a summary dict with imported/updated/unchanged/skipped counts, collected
+    errors, elapsed seconds and rows per second.
+    """
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy: {on_conflict}")
+    summary = {"imported": 0, "updated": 0, "unchanged": 0, "skipped": 0, "error_count": 0,
+               "errors": [], "errors_by_type": {}, "elapsed": 0.0, "rows_per_sec": 0.0}
+    staged = on_conflict != "error"
+    now = int(time.time() * 1_000_000)
+    start = time.perf_counter()
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # We manage the transaction ourselves.
+    cur = conn.cursor()
+    try:
+        with _bulk_load_pragmas(conn):
+            _ensure_moz_cookies_table(cur)
+            cur.execute("BEGIN")
+            try:
+                if staged:
+                    cur.execute(COOKIE_STAGING_SCHEMA)
+                # Pulling a chunk from `cookies` includes parsing the import file.
+                clock = STATS.clock()
+                mark = clock()
+                for chunk in _chunked(cookies, chunk_size):
+                    rows = []
+                    for cookie in chunk:
+                        row = _cookie_to_row(cookie, default_host, now)
+                        if row is None:
+                            summary["skipped"] += 1
+                        else:
+                            rows.append(row)
+                    decoded = clock()
+                    STATS.add_time("decode", decoded - mark)
+                    if rows and staged:
+                        cur.executemany(COOKIE_STAGING_INSERT_SQL, rows)
+                    elif rows:
+                        _insert_cookie_chunk(cur, rows, summary)
+                    mark = clock()
+                    STATS.add_time("write", mark - decoded)
+                with STATS.phase("write"):
+                    if staged:
+                        _apply_staged_cookies(cur, on_conflict, summary)
+                    cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+    finally:
+        conn.isolation_level = isolation_level
+    STATS.count("rows_written", summary["imported"] + summary["updated"])
+    STATS.count("skipped", summary["skipped"])
+    STATS.count("errors", summary["error_count"])
+    summary["elapsed"] = time.perf_counter() - start
+    if summary["elapsed"] > 0:
+        summary["rows_per_sec"] = (summary["imported"] + summary["updated"] + summary["unchanged"]) / summary["elapsed"]
+    return summary
+
+def print_import_summary(summary, firefox_db):
+    """Prints the result of bulk_import_cookies() as a short report."""
+    print("Imported", summary["imported"], "cookies into Firefox cookies DB at:", firefox_db,
+          f"({summary['elapsed']:.2f}s, {summary['rows_per_sec']:.0f} rows/s)")
+    if summary.get("updated") or summary.get("unchanged"):
+        print(f"Updated {summary['updated']} existing cookie(s); left {summary['unchanged']} unchanged.")
+    if summary["skipped"]:
+        print(f"Skipped {summary['skipped']} cookie(s) without a host (no --default-host given).")
+    if summary["error_count"]:
+        print(f"Failed to insert {summary['error_count']} cookie(s):")
+        for message, count in summary["errors_by_type"].items():
+            print(f"  {count} x {message}")
+        for item, message in summary["errors"]:
+            print(f"  e.g. {item}: {message}")
+
+# ----- Import Cookies into a Firefox Cookies Database -----
+def import_cookies_to_firefox(import_file, firefox_db=None, default_host=None, on_conflict="error"):
+    """
+    Imports cookies from a JSON file into a Firefox cookies database.
+    """
+    try:
+        with open(import_file, 'r', encoding='utf-8') as f:
+            cookies = json.load(f)
+    except Exception as e:
+        print("Error reading the import file:", e)
+        return
+
+    import_cookies_data(cookies, firefox_db, default_host=default_host, on_conflict=on_conflict)
+
+# ----- New Function: Export All Sites' Local Storage -----
+def export_all_sites_local_storage(profile_dir, output_file, workers=1, domain_filter=None):
+    """
+    Scans the Firefox profile's storage/default directory for all sites,
+    opens each ls/data.sqlite file, extracts key/value pairs from the "data" table,
+    and writes them to a JSON file.
+    """
+    storage_default = os.path.join(profile_dir, "storage", "default")
+    all_storage = {}
+
+    if not os.path.exists(storage_default):
+        print(f"Storage folder not found at {storage_default}")
+        return
+
+    with STATS.phase("discovery"):
+        site_folders = select_site_folders(sorted(glob(os.path.join(storage_default, "*"))),
+                                           domain_filter=domain_filter)
+    logger.info(f"Found {len(site_folders)} site folder(s) in {storage_default}")
+
+    for site_path, origin, site_storage in scan_site_folders(site_folders, workers):
+        logger.debug(f"Checking site folder: {site_path}")
+        if site_storage is not None:
+            logger.debug(f"  Found ls db: {os.path.join(site_path, 'ls', 'data.sqlite')}")
+            all_storage[origin] = site_storage
+        else:
+            logger.debug(f"  No ls db found in {site_path}")
+
+    try:
+        with open(output_file, "w", encoding="utf-8") as f, STATS.phase("serialize"):
+            json.dump(all_storage, f, indent=2)
+        print(f"Exported local storage for {len(all_storage)} site(s) to {output_file}")
+    except Exception as e:
+        print("Error writing to output file:", e)
+
+def import_cookies_data(cookies, firefox_db=None, default_host=None, on_conflict="error", purge_expired=False):
+    """
+    Imports cookie objects (a list) into the Firefox cookies database.
+    `on_conflict` selects how cookies that already exist are handled (see CONFLICT_POLICIES);
+    with `purge_expired`, expired cookies are deleted from the database afterwards.
+    """
+    if firefox_db is None:
+        firefox_db = import_target_db()
+    with STATS.phase("db_open"):
+        conn = sqlite3.connect(firefox_db)
+    try:
+        summary = bulk_import_cookies(conn, cookies, default_host=default_host, on_conflict=on_conflict)
+    finally:
+        conn.close()
+    print_import_summary(summary, firefox_db)
+    if purge_expired:
+        purge_expired_db(firefox_db)
+
+def import_target_db():
+    """
+    Auto-detects the Firefox cookies DB to import into: the default profile's, or a
+    new imported_cookies.sqlite in the current directory if there is none.
+    """
+    try:
+        firefox_db = _find_firefox_cookies_db()
+        print("Using existing Firefox cookies DB at:", firefox_db)
+    except FileNotFoundError:
+        firefox_db = 'imported_cookies.sqlite'
+        print("No existing Firefox cookies DB found; creating new DB at:", firefox_db)
+    return firefox_db
+
+def purge_expired_db(firefox_db):
+    """Runs purge_expired_cookies() on the database file `firefox_db` and reports the result."""
+    with STATS.phase("db_open"):
+        conn = sqlite3.connect(firefox_db)
+    try:
+        with STATS.phase("write"):
+            deleted, freed = purge_expired_cookies(conn)
+    finally:
+        conn.close()
+    print(f"Purged {deleted} expired cookie(s) from {firefox_db} ({freed} page(s) freed).")
+
+
+# Matches characters outside the Basic Multilingual Plane (two UTF-16 code units each).
+_ASTRAL_CHARS = re.compile('[\U00010000-\U0010FFFF]')
+
+def _utf16_length(value):
+    """Length of a string in UTF-16 code units, computed without encoding it."""
+    if value.isascii() or max(value) <= '\uffff':
+        return len(value)
+    return len(value) + len(_ASTRAL_CHARS.findall(value))
+
+def _storage_rows(items, errors, compress=False):
+    """Converts (key, value) pairs to rows for the local storage "data" table."""
+    for key, value in items:
+        if not isinstance(key, str) or not isinstance(value, str):
+            errors.append(key)
+            continue
+        blob, conversion_type, compression_type = encode_ls_value(value, compress)
+        yield (key, _utf16_length(value), conversion_type, compression_type, 0, blob)
+
+def _import_origin_storage(profile_dir, origin, items, compress=False):
+    """
+    Writes an iterable of (key, value) pairs into the ls/data.sqlite of one origin
+    with a single executemany() in one transaction, then recomputes the origin's
+    usage (key plus value length in UTF-16 code units, as Firefox accounts it).
+    With `compress`, large values are stored Snappy-compressed like Firefox does.
+    Returns (entries_seen, entries_imported).
+    """
+    folder_name = origin.replace("://", "+++")
+    ls_dir = os.path.join(profile_dir, "storage", "default", folder_name, "ls")
+    os.makedirs(ls_dir, exist_ok=True)
+    db_path = os.path.join(ls_dir, "data.sqlite")
+    errors = []
+    with STATS.phase("db_open"):
+        conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.create_function("utf16_length", 1, _utf16_length, deterministic=True)
+        cur = conn.cursor()
+        with _bulk_load_pragmas(conn):
+            cur.execute("PRAGMA foreign_keys=OFF;")
+            cur.execute("BEGIN TRANSACTION;")
+            try:
+                with STATS.phase("db_open"):
+                    cur.execute("""
+                       CREATE TABLE IF NOT EXISTS database(
+                           origin TEXT NOT NULL,
+                           usage INTEGER NOT NULL DEFAULT 0,
+                           last_vacuum_time INTEGER NOT NULL DEFAULT 0,
+                           last_analyze_time INTEGER NOT NULL DEFAULT 0,
+                           last_vacuum_size INTEGER NOT NULL DEFAULT 0
+                       );
+                    """)
+                    cur.execute("""
+                       CREATE TABLE IF NOT EXISTS data(
+                           key TEXT PRIMARY KEY,
+                           utf16_length INTEGER NOT NULL,
+                           conversion_type INTEGER NOT NULL,
+                           compression_type INTEGER NOT NULL,
+                           last_access_time INTEGER NOT NULL DEFAULT 0,
+                           value BLOB NOT NULL
+                       );
+                    """)
+                # Materializing the rows includes parsing this origin's part of the import file.
+                with STATS.phase("decode"):
+                    rows = list(_storage_rows(items, errors, compress))
+                with STATS.phase("write"):
+                    cur.executemany("""
+                       INSERT OR REPLACE INTO data
+                       (key, utf16_length, conversion_type, compression_type, last_access_time, value)
+                       VALUES (?, ?, ?, ?, ?, ?);
+                    """, rows)
+                    imported = cur.rowcount
+                    # The database table holds a single row; keep an existing one's vacuum stats.
+                    if cur.execute("SELECT count(*) FROM database").fetchone()[0] == 0:
+                        cur.execute("INSERT INTO database (origin) VALUES (?);", (origin,))
+                    cur.execute("""
+                       UPDATE database SET origin = ?,
+                           usage = (SELECT COALESCE(SUM(utf16_length(key) + utf16_length), 0) FROM data);
+                    """, (origin,))
+                    cur.execute("COMMIT;")
+            except BaseException:
+                cur.execute("ROLLBACK;")
+                raise
+    finally:
+        conn.close()
+    for key in errors:
+        logger.warning(f"Error importing key {key!r} for origin {origin}: key and value must be strings")
+    STATS.count("rows_written", imported)
+    STATS.count("errors", len(errors))
+    STATS.count("origins")
+    return imported + len(errors), imported
+
+def _import_origin_task(profile_dir, compress=False):
+    """Returns a pool worker importing one (origin, items) pair; errors are returned, not raised."""
+    def task(entry):
+        origin, items = entry
+        try:
+            return _import_origin_storage(profile_dir, origin, items, compress)
+        except ImportFileError:
+            raise  # the import file is unreadable from here on, not just this origin
+        except Exception as e:
+            return e
+    return task
+
+def _import_origins(origin_items, profile_dir, workers=1, compress=False):
+    """
+    Imports (origin, items) pairs, spreading the origins over `workers` threads
+    (every origin has its own database, so they never contend for a lock).
+    Reports per origin in input order and prints the totals.
+    Returns the number of origins that could not be imported.
+    """
+    origins_imported = 0
+    keys_imported = 0
+    failed = 0
+    if workers is None or workers <= 1:
+        results = ((entry, _import_origin_task(profile_dir, compress)(entry)) for entry in origin_items)
+    else:
+        # Pool workers need materialized items; only a bounded window of origins is held.
+        origin_items = ((origin, list(items)) for origin, items in origin_items)
+        results = ordered_pool_map(_import_origin_task(profile_dir, compress), origin_items, workers)
+    for (origin, _), result in results:
+        if isinstance(result, Exception):
+            STATS.count("errors")
+            logger.error(f"Error processing origin {origin}: {result}")
+            failed += 1
+            continue
+        seen, imported = result
+        origins_imported += 1
+        keys_imported += imported
+        logger.debug(f"Imported local storage for origin {origin} with {seen} entr{'y' if seen==1 else 'ies'}.")
+    print(f"Imported local storage for {origins_imported} origin(s) with a total of {keys_imported} entr{'y' if keys_imported==1 else 'ies'}.")
+    if failed:
+        print(f"Failed to import local storage for {failed} origin(s).")
+    return failed
+
+def import_local_storage_data(storage_data, profile_dir, workers=1, compress=False):
+    """
+    Imports local storage data (a dict mapping origin to key/value dict) into Firefox’s per-site storage.
+    """
+    if profile_dir is None:
+         if os.name == 'posix':
+             base = os.path.expanduser('~/.mozilla/firefox')
+         else:
+             base = os.path.expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles')
+         profiles = glob(os.path.join(base, '*default-release*'))
+         if not profiles:
+             profiles = glob(os.path.join(base, '*default*'))
+         if not profiles:
+             print("Firefox profile not found!")
+             sys.exit(1)
+         profile_dir = profiles[0]
+    _import_origins(((origin, data.items()) for origin, data in storage_data.items()),
+                    profile_dir, workers, compress)
+
+def import_local_storage_stream(entries, profile_dir, workers=1, compress=False):
+    """
+    Imports local storage from an iterable of (origin, key, value) triples, such as
+    the events produced by iter_export_events(). Consecutive entries for the same
+    origin are grouped and written to that origin's database as they arrive.
+    Returns the number of origins that could not be imported.
+    """
+    def origin_items():
+        for origin, group in groupby(entries, key=itemgetter(0)):
+            items = ((key, value) for _, key, value in group)
+            yield origin, items
+            # Drain whatever is left of the group if the origin failed part-way.
+            for _ in items:
+                pass
+    return _import_origins(origin_items(), profile_dir, workers, compress)
+
+# ----- Incremental JSON Import Reader -----
+
+class JsonStreamReader:
+    """
+    Incremental reader for large JSON documents, built on json.JSONDecoder.raw_decode.
+    The file is read in chunks and containers can be walked element by element,
+    so only one element at a time needs to be held in memory.
+    """
+
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+    # What may still follow a number that was cut off at the end of the buffer.
+    NUMBER_TAIL = re.compile(r'[0-9.eE+\-]*')
+
+    def __init__(self, f, chunk_size=1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Appends more input, dropping what has been consumed. Returns False at EOF."""
+        # Read at least as much as is still pending, so that a single large value is
+        # re-scanned a logarithmic number of times rather than once per chunk.
+        chunk = self.f.read(max(self.chunk_size, len(self.buf) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skips whitespace and returns the next character ('' at end of input)."""
+        while True:
+            self.pos = self.WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found or 'end of input'!r} in JSON input")
+        self.pos += 1
+
+    def value(self):
+        """Decodes and returns the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self._fill():
+                    raise
+                continue
+            # A number running up to the end of the buffer may have been cut off.
+            if not self.eof and self.NUMBER_TAIL.fullmatch(self.buf, end) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def _next_separator(self, closer):
+        found = self.peek()
+        self.pos += 1
+        if found == closer:
+            return False
+        if found != ',':
+            raise ValueError(f"Expected ',' or {closer!r} but found {found or 'end of input'!r} in JSON input")
+        return True
+
+    def iter_array(self):
+        """Yields the elements of the array that starts at the current position."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if not self._next_separator(']'):
+                return
+
+    def iter_object(self):
+        """
+        Yields the keys of the object that starts at the current position. The caller
+        must consume each member's value (value(), iter_array(), ...) before resuming.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if not self._next_separator('}'):
+                return
+
+def iter_export_events(f):
+    """
+    Walks a combined export file incrementally and yields
+    ("cookie", cookie) and ("local_storage", origin, key, value) events in file order.
+    Local storage values that refer to the "values" table of a --dedup-values export
+    are expanded. Unknown top-level members are skipped, but a combined --all-profiles
+    export (a top-level "profiles" object) raises ValueError.
+    """
+    reader = JsonStreamReader(f)
+    values = {}
+    for section in reader.iter_object():
+        if section == "profiles" and reader.peek() == '{':
+            raise ValueError("This is a combined --all-profiles export, which cannot be imported; "
+                             "export with --split-profiles to get one importable file per profile")
+        if section == "cookies" and reader.peek() == '[':
+            for cookie in reader.iter_array():
+                yield ("cookie", cookie)
+        elif section == "values" and reader.peek() == '{':
+            for digest in reader.iter_object():
+                values[digest] = reader.value()
+        elif section == "local_storage" and reader.peek() == '{':
+            for origin in reader.iter_object():
+                if reader.peek() != '{':
+                    reader.value()
+                    continue
+                for key in reader.iter_object():
+                    yield ("local_storage", origin, key, _expand_value(values, reader.value()))
+        else:
+            reader.value()
+    if reader.peek():
+        raise ValueError("Unexpected data after the end of the JSON document")
+
+def filter_events(events, domain_filter, default_host=None):
+    """Drops cookie and local storage events whose host is rejected by `domain_filter`."""
+    selected = {}
+    for event in events:
+        if event[0] == "cookie":
+            cookie = event[1]
+            if domain_filter.matches(cookie.get("host", cookie.get("domain", default_host))):
+                yield event
+        else:
+            origin = event[1]
+            if origin not in selected:
+                selected[origin] = domain_filter.matches_origin(origin)
+            if selected[origin]:
+                yield event
+
+class ImportFileError(Exception):
+    """The import file could not be read or decoded."""
+
+def _read_events(events):
+    """
+    Passes the events through, turning errors raised while reading or decoding the
+    import file into ImportFileError, so that they are told apart from errors writing
+    the target profile, which happen in the consumer.
+    """
+    while True:
+        try:
+            event = next(events)
+        except StopIteration:
+            return
+        except Exception as e:
+            raise ImportFileError(e) from e
+        yield event
+
+def import_all_from_json(import_file, firefox_db=None, default_host=None, profile_dir=None, workers=1,
+                         compress_local_storage=False, domain_filter=None, on_conflict="error",
+                         skip_expired=False, purge_expired=False, origins=None):
+    """
+    Imports both cookies and local storage from a single JSON file.
+
+    The JSON file should have the structure:
+
+    {
+       "cookies": [ <list of cookie objects> ],
+       "local_storage": { "<origin>": { "<key>": "<value>", ... }, ... }
+    }
+
+    Binary exports (see BinaryExportWriter) and sharded export directories (see
+    open_sharded_export()) are detected automatically.
+    The file is parsed incrementally: cookies are fed to the bulk insert engine in
+    bounded batches and local storage is written origin by origin while parsing
+    continues, so memory use does not grow with the size of the file.
+    Records rejected by `domain_filter` (and with `skip_expired`, expired cookies) are
+    skipped as they are read; `on_conflict` selects how cookies that already exist are
+    handled (see CONFLICT_POLICIES) and `purge_expired` deletes expired cookies from
+    the target database once after the import, even if the file held no cookies.
+    `origins` limits local storage to those origins; of a sharded export only the
+    shards needed are read.
+    Returns True if the file was imported. Errors reading the file and errors writing
+    the cookies database or profile are reported and give False.
+    """
+    found_cookies = False
+    found_local_storage = False
+    read_error = None
+    ok = True
+    try:
+         with ExitStack() as stack:
+             try:
+                 events = stack.enter_context(open_import_events(import_file, domain_filter, origins, workers))
+             except (OSError, ValueError) as e:
+                 raise ImportFileError(e) from e
+             events = _read_events(events)
+             if domain_filter:
+                 events = filter_events(events, domain_filter, default_host)
+             if origins:
+                 events = (event for event in events if event[0] == "cookie" or event[1] in origins)
+             if skip_expired:
+                 events = drop_expired_events(events)
+             for kind, group in groupby(events, key=itemgetter(0)):
+                 if kind == "cookie":
+                     found_cookies = True
+                     if firefox_db is None:
+                         firefox_db = import_target_db()
+                     import_cookies_data((event[1] for event in group), firefox_db=firefox_db,
+                                         default_host=default_host, on_conflict=on_conflict)
+                 else:
+                     found_local_storage = True
+                     if import_local_storage_stream((event[1:] for event in group), profile_dir=profile_dir,
+                                                    workers=workers, compress=compress_local_storage):
+                         ok = False
+    except ImportFileError as e:
+         read_error = e
+    except (sqlite3.Error, OSError) as e:
+         print("Error writing imported data:", e)
+         return False
+    if read_error is not None:
+         print("Error reading import file:", read_error)
+         ok = False
+    else:
+         if not found_cookies:
+             print("No cookies found in import file.")
+         if not found_local_storage:
+             print("No local storage found in import file.")
+    # Once, after every cookie group has been imported (there may be none), and also
+    # after a read error, since the groups before it stay imported.
+    if purge_expired:
+         if firefox_db is None:
+             firefox_db = import_target_db()
+         if os.path.exists(firefox_db):
+             try:
+                 purge_expired_db(firefox_db)
+             except sqlite3.Error as e:
+                 print(f"Error purging expired cookies from {firefox_db}:", e)
+                 return False
+         else:
+             print(f"No cookies database at {firefox_db}; nothing to purge.")
+    return ok
+
+def import_all_to_chrome(import_file, default_host=None, domain_filter=None, skip_expired=False,
+                         timeout=CHROME_STARTUP_TIMEOUT, ws_url=None):
+    """
+    Imports the cookies of an export file (either format) into Chrome; see
+    import_cookies_to_chrome(). Local storage in the file is skipped, since Chrome's
+    LevelDB store is only read, never written. Returns the import summary, or None
+    if the import failed.
+    """
+    origins = set()
+
+    def cookies(events):
+        for event in events:
+            if event[0] == "cookie":
+                yield event[1]
+            else:
+                origins.add(event[1])
+
+    try:
+        with open_import_events(import_file, domain_filter) as events:
+            if domain_filter:
+                events = filter_events(events, domain_filter, default_host)
+            if skip_expired:
+                events = drop_expired_events(events)
+            summary = import_cookies_to_chrome(cookies(events), default_host=default_host,
+                                               timeout=timeout, ws_url=ws_url)
+    except Exception as e:
+        print("Error importing into Chrome:", e)
+        return None
+    if not summary["imported"] and not summary["error_count"]:
+        print("No cookies found in import file.")
+    if origins:
+        print(f"Skipped local storage of {len(origins)} origin(s): importing local storage into Chrome is not supported.")
+    return summary
+
+# ----- Value Deduplication -----
+# Many origins store the same large local storage values (SDK configuration,
+# feature flag payloads, analytics state). With --dedup-values each distinct large
+# value is written once, keyed by its SHA-256 digest, and local storage entries
+# refer to it by digest; the importers expand the references while reading.
+# SHA-256 rather than a faster hash because the values are chosen by websites.
+
+DEDUP_MIN_SIZE = 256
+
+class ValueTable:
+    """Remembers the digests of the large values an export has already written."""
+
+    def __init__(self, min_size=DEDUP_MIN_SIZE):
+        self.min_size = min_size
+        self.digests = set()
+        self.refs = 0
+
+    def lookup(self, value):
+        """
+        Returns None for values that are written inline, otherwise (digest, data):
+        the raw SHA-256 digest and, the first time the value is seen, its UTF-8
+        bytes (None when the value has already been written).
+        """
+        if type(value) is not str or len(value) < self.min_size:
+            return None
+        data = value.encode("utf-8")
+        digest = hashlib.sha256(data).digest()
+        self.refs += 1
+        if digest in self.digests:
+            return digest, None
+        self.digests.add(digest)
+        return digest, data
+
+    def report(self):
+        if self.refs:
+            STATS.count("values_deduplicated", self.refs - len(self.digests))
+            logger.info(f"Wrote {len(self.digests)} unique value(s) for {self.refs} large local storage value(s)")
+
+def _expand_value(values, value):
+    """Replaces a {"$ref": digest} local storage value with the value from the export's value table."""
+    if values and type(value) is dict and len(value) == 1 and "$ref" in value:
+        try:
+            return values[value["$ref"]]
+        except (KeyError, TypeError):
+            raise ValueError(f"Reference to an unknown value: {value['$ref']!r}") from None
+    return value
+
+# ----- Streaming Export Writer -----
+
+class JsonExportWriter:
+    """
+    Writes the {"cookies": [...], "local_storage": {...}} export shape to a file
+    incrementally, one cookie or one origin at a time, so the full export never has
+    to be held in memory. The output is identical to json.dump(result, f, indent=2).
+
+    With `dedup_values`, large local storage values are replaced by {"$ref": digest}
+    and written once to a "values" object (see ValueTable), which precedes
+    "local_storage" so that the importer can expand the references as it reads.
+    """
+
+    def __init__(self, f, indent=2, level=0, dedup_values=False):
+        # `level` is the nesting depth of this object when it is written inside another one.
+        self.f = f
+        self.indent = indent
+        self.level = level
+        self.sections = 0
+        self.values = ValueTable() if dedup_values else None
+        self.spools = None
+        f.write("{")
+
+    def _dump(self, obj, depth):
+        text = json.dumps(obj, indent=self.indent, default=_json_default)
+        return text.replace("\n", "\n" + " " * (self.indent * (self.level + depth)))
+
+    def _member(self, name):
+        """Starts the next top-level member and returns the padding of its contents."""
+        pad = " " * (self.indent * (self.level + 1))
+        self.f.write(("," if self.sections else "") + "\n" + pad + json.dumps(name) + ": ")
+        self.sections += 1
+        return pad
+
+    def _write_section(self, name, items, opener, closer, format_item):
+        pad = " " * self.indent
+        outer = self._member(name)
+        self.f.write(opener)
+        clock = STATS.clock()
+        serialize_time = write_time = 0.0
+        count = 0
+        for item in items:
+            start = clock()
+            text = ("," if count else "") + "\n" + outer + pad + format_item(item)
+            serialized = clock()
+            self.f.write(text)
+            write_time += clock() - serialized
+            serialize_time += serialized - start
+            count += 1
+        self.f.write(("\n" + outer + closer) if count else closer)
+        STATS.add_time("serialize", serialize_time)
+        STATS.add_time("write", write_time)
+        return count
+
+    def write_cookies(self, cookies):
+        """Writes the "cookies" array from any iterable of cookie dicts. Returns the count."""
+        return self._write_section("cookies", cookies, "[", "]",
+                                   lambda cookie: self._dump(cookie, 2))
+
+    def write_local_storage(self, origins):
+        """Writes the "local_storage" object from an iterable of (origin, storage) pairs."""
+        if self.values is None:
+            return self._write_section("local_storage", origins, "{", "}",
+                                       lambda item: json.dumps(item[0]) + ": " + self._dump(item[1], 2))
+        # The unique values are only known once every origin has been seen, so both the
+        # value table and the section are spooled to temporary files; close() writes the
+        # table first. The spooled section starts with the separator after "values".
+        value_spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+        section_spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self.spools = (value_spool, section_spool)
+        value_pad = "\n" + " " * (self.indent * (self.level + 2))
+
+        def format_item(item):
+            origin, storage = item
+            entries = {}
+            for key, value in storage.items():
+                found = self.values.lookup(value)
+                if found is None:
+                    entries[key] = value
+                    continue
+                digest, data = found
+                digest = digest.hex()
+                if data is not None:
+                    value_spool.write(("," if len(self.values.digests) > 1 else "") + value_pad
+                                      + json.dumps(digest) + ": " + json.dumps(value))
+                entries[key] = {"$ref": digest}
+            return json.dumps(origin) + ": " + self._dump(entries, 2)
+
+        f, sections = self.f, self.sections
+        self.f, self.sections = section_spool, 1
+        try:
+            return self._write_section("local_storage", origins, "{", "}", format_item)
+        finally:
+            self.f, self.sections = f, sections
+
+    def _write_spooled(self):
+        """Writes the spooled "values" table and "local_storage" section of a deduplicating export."""
+        value_spool, section_spool = self.spools
+        self.spools = None
+        start = time.perf_counter()
+        outer = self._member("values")
+        self.f.write("{")
+        value_spool.seek(0)
+        shutil.copyfileobj(value_spool, self.f)
+        self.f.write(("\n" + outer + "}") if self.values.digests else "}")
+        section_spool.seek(0)
+        shutil.copyfileobj(section_spool, self.f)
+        self.sections += 1
+        value_spool.close()
+        section_spool.close()
+        STATS.add_time("write", time.perf_counter() - start)
+        self.values.report()
+
+    def write_value(self, name, value):
+        """Writes any other top-level member in one piece."""
+        self._member(name)
+        self.f.write(self._dump(value, 1))
+
+    def write_objects(self, name, members):
+        """
+        Writes a member holding one nested export object per (key, fill) pair;
+        fill(writer) writes that object's sections through a nested JsonExportWriter.
+        Returns the number of objects.
+        """
+        outer = self._member(name)
+        self.f.write("{")
+        count = 0
+        for key, fill in members:
+            self.f.write(("," if count else "") + "\n" + outer + " " * self.indent + json.dumps(key) + ": ")
+            nested = JsonExportWriter(self.f, self.indent, self.level + 2)
+            fill(nested)
+            nested.close()
+            count += 1
+        self.f.write(("\n" + outer + "}") if count else "}")
+        return count
+
+    def close(self):
+        if self.spools:
+            self._write_spooled()
+        self.f.write(("\n" + " " * (self.indent * self.level) + "}") if self.sections else "}")
+
+# ----- Binary Export Format -----
+# A compact alternative to the JSON export: a 6-byte header (magic, version,
+# compression) followed by a stream of length-prefixed records, optionally
+# compressed with any codec the stdlib provides.
+#
+#   record    := type:u8 length:u32 payload
+#   COOKIE    := expiry:i64 six u8 flags, string lengths, then the UTF-8 strings
+#   LOCAL_STORAGE := origin/key/value lengths (u32 each), then the UTF-8 strings
+#   COOKIE_JSON / VALUE := JSON fallback for records that do not fit the fixed layout
+#   BLOB      := SHA-256 digest, then a UTF-8 value stored once (--dedup-values)
+#   LOCAL_STORAGE_REF := origin/key lengths (u32 each), the strings, then a BLOB digest
+#
+# Exports with BLOB records are written as version 2, so that older readers, which
+# would skip the unknown records, reject them instead of importing partial data.
+
+BINARY_MAGIC = b"CWBX"
+BINARY_VERSION = 1
+BINARY_DEDUP_VERSION = 2
+BINARY_HEADER = struct.Struct("<4sBB")
+RECORD_HEADER = struct.Struct("<BI")
+COOKIE_RECORD = struct.Struct("<qBBBBBBHHIHHH")
+LOCAL_STORAGE_RECORD = struct.Struct("<III")
+LOCAL_STORAGE_REF_RECORD = struct.Struct("<II")
+DIGEST_SIZE = hashlib.sha256().digest_size
+REC_COOKIE, REC_COOKIE_JSON, REC_LOCAL_STORAGE, REC_VALUE = 1, 2, 3, 4
+REC_BLOB, REC_LOCAL_STORAGE_REF = 5, 6
+
+COOKIE_STRING_FIELDS = ("originAttributes", "name", "value", "host", "path", "baseDomain")
+COOKIE_INT_FIELDS = ("expiry", "isSecure", "isHttpOnly", "inBrowserElement", "sameSite", "rawSameSite", "schemeMap")
+FIREFOX_COOKIE_KEYS = frozenset(COOKIE_STRING_FIELDS + COOKIE_INT_FIELDS)
+
+def _zstd_module():
+    try:
+        from compression import zstd  # Python 3.14+
+    except ImportError:
+        return None
+    return zstd
+
+def available_compressions():
+    """Names of the compression codecs usable with the binary format on this Python."""
+    names = ["none", "gzip", "bz2", "lzma"]
+    if _zstd_module():
+        names.append("zstd")
+    return names
+
+BINARY_COMPRESSION_IDS = {"none": 0, "gzip": 1, "bz2": 2, "lzma": 3, "zstd": 4}
+
+def _open_compressed(raw, compression, mode):
+    """Wraps a binary file object in the named codec (closing the wrapper leaves `raw` open)."""
+    if compression == "none":
+        return raw
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode=mode, compresslevel=6)
+    if compression == "bz2":
+        return bz2.BZ2File(raw, mode)
+    if compression == "lzma":
+        return lzma.LZMAFile(raw, mode, preset=2 if "w" in mode else None)
+    if compression == "zstd" and _zstd_module():
+        return _zstd_module().ZstdFile(raw, mode)
+    raise ValueError(f"Compression '{compression}' is not available on this Python")
+
+def _encode_cookie(cookie):
+    """Returns (record type, payload) for a cookie dict."""
+    if cookie.keys() == FIREFOX_COOKIE_KEYS:
+        try:
+            strings = [cookie[field].encode("utf-8") for field in COOKIE_STRING_FIELDS]
+            ints = [cookie[field] for field in COOKIE_INT_FIELDS]
+            if all(type(value) is int for value in ints):
+                head = COOKIE_RECORD.pack(*ints, *map(len, strings))
+                return REC_COOKIE, head + b"".join(strings)
+        except (AttributeError, struct.error):
+            pass
+    # Chrome cookies, None values or out-of-range fields.
+    return REC_COOKIE_JSON, json.dumps(cookie, default=_json_default).encode("utf-8")
+
+def _decode_cookie(payload):
+    fields = COOKIE_RECORD.unpack_from(payload)
+    pos = COOKIE_RECORD.size
+    strings = []
+    for length in fields[7:]:
+        strings.append(payload[pos:pos + length].decode("utf-8"))
+        pos += length
+    origin_attributes, name, value, host, path, base_domain = strings
+    return CookieRecord(origin_attributes, name, value, host, path, *fields[:7], base_domain)
+
+class BinaryExportWriter:
+    """
+    Writes an export in the binary record format. Has the same interface as
+    JsonExportWriter, so either can be used wherever an export is streamed.
+    """
+
+    FLUSH_SIZE = 1 << 16
+
+    def __init__(self, f, compression="none", dedup_values=False):
+        version = BINARY_DEDUP_VERSION if dedup_values else BINARY_VERSION
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, version, BINARY_COMPRESSION_IDS[compression]))
+        self.out = _open_compressed(f, compression, "wb")
+        self.raw = f
+        self.buf = bytearray()
+        self.flush_time = 0.0
+        self.values = ValueTable() if dedup_values else None
+
+    def _flush(self):
+        start = time.perf_counter()
+        self.out.write(self.buf)
+        self.buf.clear()
+        elapsed = time.perf_counter() - start
+        self.flush_time += elapsed
+        STATS.add_time("write", elapsed)
+
+    def _serialized(self, seconds):
+        """Reports encoding time, minus the flushes that happened during it."""
+        STATS.add_time("serialize", seconds - self.flush_time)
+        self.flush_time = 0.0
+
+    def _record(self, kind, payload):
+        self.buf += RECORD_HEADER.pack(kind, len(payload))
+        self.buf += payload
+        if len(self.buf) >= self.FLUSH_SIZE:
+            self._flush()
+
+    def write_cookies(self, cookies):
+        clock = STATS.clock()
+        encode_time = 0.0
+        count = 0
+        for cookie in cookies:
+            start = clock()
+            self._record(*_encode_cookie(cookie))
+            encode_time += clock() - start
+            count += 1
+        self._serialized(encode_time)
+        return count
+
+    def write_local_storage(self, origins):
+        clock = STATS.clock()
+        encode_time = 0.0
+        count = 0
+        values = self.values
+        for origin, storage in origins:
+            start = clock()
+            origin_bytes = origin.encode("utf-8")
+            for key, value in storage.items():
+                if not isinstance(value, str):
+                    value = json.dumps(value, default=_json_default)
+                key_bytes = key.encode("utf-8")
+                found = values.lookup(value) if values else None
+                if found is not None:
+                    # The value is stored once, in a BLOB record ahead of its first reference.
+                    digest, data = found
+                    if data is not None:
+                        self._record(REC_BLOB, digest + data)
+                    self._record(REC_LOCAL_STORAGE_REF,
+                                 LOCAL_STORAGE_REF_RECORD.pack(len(origin_bytes), len(key_bytes))
+                                 + origin_bytes + key_bytes + digest)
+                    continue
+                value_bytes = value.encode("utf-8")
+                self._record(REC_LOCAL_STORAGE,
+                             LOCAL_STORAGE_RECORD.pack(len(origin_bytes), len(key_bytes), len(value_bytes))
+                             + origin_bytes + key_bytes + value_bytes)
+            encode_time += clock() - start
+            count += 1
+        self._serialized(encode_time)
+        return count
+
+    def write_value(self, name, value):
+        self._record(REC_VALUE, json.dumps([name, value], default=_json_default).encode("utf-8"))
+
+    def close(self):
+        self._flush()
+        if self.out is not self.raw:
+            self.out.close()
+        if self.values:
+            self.values.report()
+
+def iter_binary_events(f):
+    """
+    Reads a binary export from a file object positioned after the header and yields
+    the same events as iter_export_events().
+    """
+    read = f.read
+    header_size = RECORD_HEADER.size
+    values = {}
+    while True:
+        header = read(header_size)
+        if not header:
+            return
+        if len(header) < header_size:
+            raise ValueError("Truncated record header in binary export")
+        kind, length = RECORD_HEADER.unpack(header)
+        payload = read(length)
+        if len(payload) < length:
+            raise ValueError("Truncated record in binary export")
+        if kind == REC_COOKIE:
+            yield ("cookie", _decode_cookie(payload))
+        elif kind == REC_COOKIE_JSON:
+            yield ("cookie", json.loads(payload))
+        elif kind == REC_LOCAL_STORAGE:
+            origin_len, key_len, value_len = LOCAL_STORAGE_RECORD.unpack_from(payload)
+            pos = LOCAL_STORAGE_RECORD.size
+            origin = payload[pos:pos + origin_len].decode("utf-8")
+            pos += origin_len
+            key = payload[pos:pos + key_len].decode("utf-8")
+            pos += key_len
+            yield ("local_storage", origin, key, payload[pos:pos + value_len].decode("utf-8"))
+        elif kind == REC_BLOB:
+            values[payload[:DIGEST_SIZE]] = payload[DIGEST_SIZE:].decode("utf-8")
+        elif kind == REC_LOCAL_STORAGE_REF:
+            origin_len, key_len = LOCAL_STORAGE_REF_RECORD.unpack_from(payload)
+            pos = LOCAL_STORAGE_REF_RECORD.size
+            origin = payload[pos:pos + origin_len].decode("utf-8")
+            pos += origin_len
+            key = payload[pos:pos + key_len].decode("utf-8")
+            pos += key_len
+            value = values.get(payload[pos:pos + DIGEST_SIZE])
+            if value is None:
+                raise ValueError("Reference to an unknown value in binary export")
+            yield ("local_storage", origin, key, value)
+        # Other record types (REC_VALUE, future additions) are skipped like unknown JSON members.
+
+@contextmanager
+def open_import_events(import_file, domain_filter=None, origins=None, workers=1):
+    """
+    Opens an export file of either format and yields its event iterator.
+    The format (and the binary format's compression) is detected from the header.
+    A sharded export directory yields the events of the shards that `domain_filter`
+    and `origins` select (see iter_sharded_events()), read by `workers` threads.
+    """
+    if os.path.isdir(import_file):
+        yield iter_sharded_events(import_file, domain_filter, origins, workers)
+        return
+    STATS.count("bytes_read", os.path.getsize(import_file))
+    with open(import_file, 'rb') as raw, _open_event_stream(raw) as events:
+        yield events
+
+@contextmanager
+def _open_event_stream(raw):
+    """Yields the event iterator of an export read from the binary file object `raw`."""
+    header = raw.read(BINARY_HEADER.size)
+    if len(header) == BINARY_HEADER.size and header.startswith(BINARY_MAGIC):
+        _, version, compression_id = BINARY_HEADER.unpack(header)
+        if version not in (BINARY_VERSION, BINARY_DEDUP_VERSION):
+            raise ValueError(f"Unsupported binary export version {version}")
+        names = {value: key for key, value in BINARY_COMPRESSION_IDS.items()}
+        stream = _open_compressed(raw, names.get(compression_id, "unknown"), "rb")
+        try:
+            yield iter_binary_events(stream)
+        finally:
+            if stream is not raw:
+                stream.close()
+        return
+    raw.seek(0)
+    with io.TextIOWrapper(raw, encoding='utf-8') as text:
+        yield iter_export_events(text)
+
+# ----- Exporter Registry -----
+# Export formats selectable with --format. A writer receives the records one at a
+# time, straight from the moz_cookies cursor or the DevTools result, and writes its
+# format directly; it provides write_cookies(cookies), write_local_storage(origins)
+# and close(), like JsonExportWriter.
+
+EXPORTERS = {}
+
+def register_exporter(name, writer_class, binary=False, local_storage=True, importable=False):
+    """
+    Makes an export format available to open_export() and --format. The writer is
+    created as writer_class(f, compression) on a binary file if `binary` is set,
+    otherwise as writer_class(f) on a UTF-8 text file. Formats without
+    `local_storage` only hold cookies. `importable` formats can be read back by
+    --import-all, --diff and --merge, and also provide write_value() for the delta
+    export and a `dedup_values` writer option (see ValueTable). Only the JSON
+    writer has write_objects(), so a combined --all-profiles export is always JSON.
+    """
+    EXPORTERS[name] = {"writer": writer_class, "binary": binary, "local_storage": local_storage,
+                       "importable": importable}
+
+def _portable_cookie(cookie):
+    """
+    Reduces a Firefox or Chrome cookie dict to the fields other tools understand:
+    (name, value, domain, path, expires, secure, httpOnly, sameSite). `expires` is in
+    seconds, or None for session cookies; `sameSite` is "Strict", "Lax", "None" or None.
+    """
+    if "host" not in cookie and "domain" in cookie:
+        expires = cookie.get("expires")
+        if cookie.get("session") or not isinstance(expires, (int, float)) or expires <= 0:
+            expires = None
+        return (cookie.get("name", ""), cookie.get("value", ""), cookie["domain"], cookie.get("path") or "/",
+                expires, bool(cookie.get("secure")), bool(cookie.get("httpOnly")), cookie.get("sameSite"))
+    expiry = cookie.get("expiry")
+    if not isinstance(expiry, (int, float)) or expiry <= 0:
+        expiry = None
+    elif expiry > MS_EXPIRY_THRESHOLD:
+        expiry //= 1000
+    return (cookie.get("name", ""), cookie.get("value", ""), cookie.get("host") or "", cookie.get("path") or "/",
+            expiry, bool(cookie.get("isSecure")), bool(cookie.get("isHttpOnly")),
+            _CDP_SAME_SITE.get(cookie.get("sameSite")))
+
+class NetscapeCookieWriter:
+    """
+    Writes cookies in the Netscape cookies.txt format read by curl, wget and yt-dlp.
+    HttpOnly cookies carry curl's "#HttpOnly_" domain prefix; cookies whose fields
+    contain tabs or line breaks cannot be represented and are skipped.
+    """
+
+    HEADER = "# Netscape HTTP Cookie File\n# Exported by CookieWrangler\n\n"
+
+    def __init__(self, f):
+        self.f = f
+        f.write(self.HEADER)
+
+    def write_cookies(self, cookies):
+        clock = STATS.clock()
+        serialize_time = 0.0
+        count = skipped = 0
+        lines = []
+        for cookie in cookies:
+            start = clock()
+            name, value, domain, path, expires, secure, http_only, _ = _portable_cookie(cookie)
+            fields = (domain, "TRUE" if domain.startswith(".") else "FALSE", path,
+                      "TRUE" if secure else "FALSE", str(int(expires or 0)), name, value)
+            line = "\t".join(fields)
+            serialize_time += clock() - start
+            if "\n" in line or "\r" in line or line.count("\t") != 6 or not domain:
+                skipped += 1
+                continue
+            lines.append(("#HttpOnly_" if http_only else "") + line + "\n")
+            count += 1
+            if len(lines) >= BULK_CHUNK_SIZE:
+                self.f.writelines(lines)
+                lines = []
+        self.f.writelines(lines)
+        STATS.add_time("serialize", serialize_time)
+        if skipped:
+            STATS.count("skipped", skipped)
+            logger.warning(f"Skipped {skipped} cookie(s) that cannot be written to cookies.txt")
+        return count
+
+    def write_local_storage(self, origins):
+        """cookies.txt holds no local storage; the origins are not read."""
+        return 0
+
+    def close(self):
+        pass
+
+class StorageStateWriter(JsonExportWriter):
+    """
+    Writes a Playwright/Puppeteer storageState document:
+    {"cookies": [...], "origins": [{"origin": ..., "localStorage": [{"name", "value"}]}]}.
+    """
+
+    def __init__(self, f, indent=2, level=0):
+        super().__init__(f, indent, level)
+        self.names = set()
+
+    def _member(self, name):
+        self.names.add(name)
+        return super()._member(name)
+
+    def write_cookies(self, cookies):
+        return self._write_section("cookies", map(self.state_cookie, cookies), "[", "]",
+                                   lambda cookie: self._dump(cookie, 2))
+
+    @staticmethod
+    def state_cookie(cookie):
+        name, value, domain, path, expires, secure, http_only, same_site = _portable_cookie(cookie)
+        # Playwright needs a sameSite value, reports unspecified ones as Lax and,
+        # like Chrome, rejects SameSite=None without Secure.
+        if not same_site or (same_site == "None" and not secure):
+            same_site = "Lax"
+        return {"name": name, "value": value, "domain": domain, "path": path,
+                "expires": -1 if expires is None else expires, "httpOnly": http_only,
+                "secure": secure, "sameSite": same_site}
+
+    def write_local_storage(self, origins):
+        return self._write_section("origins", origins, "[", "]", lambda item: self._dump(
+            {"origin": item[0], "localStorage": [{"name": key, "value": value} for key, value in item[1].items()]},
+            2))
+
+    def close(self):
+        # Playwright rejects a storageState without either array.
+        for name in ("cookies", "origins"):
+            if name not in self.names:
+                self.write_value(name, [])
+        super().close()
+
+class HarCookieWriter(JsonExportWriter):
+    """Writes the cookies as a HAR 1.2 cookie array: {"cookies": [{"name", "value", "path", ...}]}."""
+
+    def write_cookies(self, cookies):
+        return self._write_section("cookies", map(self.har_cookie, cookies), "[", "]",
+                                   lambda cookie: self._dump(cookie, 2))
+
+    @staticmethod
+    def har_cookie(cookie):
+        name, value, domain, path, expires, secure, http_only, same_site = _portable_cookie(cookie)
+        har = {"name": name, "value": value, "path": path, "domain": domain}
+        if expires is not None:
+            har["expires"] = datetime.datetime.fromtimestamp(expires, datetime.timezone.utc).isoformat()
+        har["httpOnly"] = http_only
+        har["secure"] = secure
+        if same_site:
+            har["sameSite"] = same_site
+        return har
+
+    def write_local_storage(self, origins):
+        """A HAR cookie array holds no local storage; the origins are not read."""
+        return 0
+
+register_exporter("json", JsonExportWriter, importable=True)
+register_exporter("binary", BinaryExportWriter, binary=True, importable=True)
+register_exporter("netscape", NetscapeCookieWriter, local_storage=False)
+register_exporter("storagestate", StorageStateWriter)
+register_exporter("har", HarCookieWriter, local_storage=False)
+
+@contextmanager
+def open_export(output_file, format="json", compression="none", dedup_values=False):
+    """
+    Opens the writer of a registered export format (see register_exporter()) on a
+    temporary file next to `output_file` and moves it into place only once the export
+    has completed, so a failed streaming export never leaves a truncated file behind.
+    With `dedup_values`, large local storage values are written once per distinct value.
+    """
+    exporter = EXPORTERS.get(format)
+    if exporter is None:
+        raise ValueError(f"Unknown export format: {format}")
+    if dedup_values and not exporter["importable"]:
+        raise ValueError(f"Export format {format} does not support value deduplication")
+    options = {"dedup_values": True} if dedup_values else {}
+    tmp_file = output_file + ".tmp"
+    try:
+        if exporter["binary"]:
+            with open(tmp_file, 'wb') as f:
+                writer = exporter["writer"](f, compression, **options)
+                yield writer
+                writer.close()
+        else:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                writer = exporter["writer"](f, **options)
+                yield writer
+                writer.close()
+        STATS.count("bytes_written", os.path.getsize(tmp_file))
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+# ----- Export Pipeline -----
+# The sections of an export are read concurrently: blocking readers (SQLite,
+# LevelDB, the Chrome DevTools startup) run in a thread pool, and each section is
+# written as soon as it is ready instead of after the slowest reader. Sections can
+# therefore appear in either order in the file; imports accept both.
+
+class ExportSection:
+    """
+    One section of an export: `name` is "cookies" or "local_storage" and `produce`
+    returns its records (cookie dicts, or (origin, storage) pairs). A `streaming`
+    section is written while it is being read rather than collected first; at most
+    one section can stream, and it is written first.
+    """
 
-    try:
-        # 3. Extended initialization wait
-        log("Waiting for Chrome init...")
-        time.sleep(5)  # Headless needs longer to load cookies
+    def __init__(self, name, produce, streaming=False):
+        self.name = name
+        self.produce = produce
+        self.streaming = streaming
 
-        # 4. Verify debug port accessibility
-        log("Checking debug port...")
-        try:
-            debug_info = requests.get(f'http://localhost:{DEBUG_PORT}/json', timeout=5).json()
-            log(f"Found {len(debug_info)} debug targets")
-            if not debug_info:
-                raise RuntimeError("No debug targets detected")
-        except Exception as e:
-            # Capture Chrome's output if connection failed
-            log(f"Debug connection failed. Chrome output:\n{browser_proc.communicate()[0]}")
-            raise
+def _write_section(writer, section, records=None):
+    """Writes a section's records; a streaming section is read here, while it is written."""
+    if records is None:
+        records = section.produce()
+    write = writer.write_cookies if section.name == "cookies" else writer.write_local_storage
+    return write(records)
 
-        # 5. Original WebSocket interaction pattern
-        log("Connecting via WebSocket...")
-        ws_url = debug_info[0]['webSocketDebuggerUrl'].strip()
-        ws = websocket.create_connection(ws_url)  # Single connection
+async def _write_export_sections(writer, sections, pool):
+    loop = asyncio.get_running_loop()
+    pending = {}
+    for section in sections:
+        if not section.streaming:
+            pending[loop.run_in_executor(pool, section.produce)] = section
+    counts = {}
+    try:
+        for section in sections:
+            if section.streaming:
+                counts[section.name] = await loop.run_in_executor(pool, _write_section, writer, section)
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                section = pending.pop(future)
+                records = future.result()
+                logger.debug(f"Section {section.name} is ready; writing it")
+                counts[section.name] = await loop.run_in_executor(pool, _write_section, writer, section, records)
+    finally:
+        for future in pending:
+            future.cancel()
+    return counts
 
-        try:  # PROPERLY STRUCTURED try/finally
-            ws.send(json.dumps({'id': 1, 'method': 'Network.getAllCookies'}))
-            response = json.loads(ws.recv())
+def export_sections(output_file, sections, format="json", compression="none", dedup_values=False,
+                    sharded=False):
+    """
+    Reads the ExportSections concurrently and writes each one to `output_file` as soon
+    as it is ready (see open_export(), or with `sharded`, open_sharded_export()). The
+    total time is close to the slowest section rather than the sum of all of them.
+    Returns {section name: record count}.
+    """
+    if sum(section.streaming for section in sections) > 1:
+        raise ValueError("Only one export section can be streamed")
+    opener = open_sharded_export if sharded else open_export
+    with opener(output_file, format, compression, dedup_values) as writer:
+        # One thread per reader, plus one for writing while the others are still reading.
+        with ThreadPoolExecutor(max_workers=len(sections) + 1) as pool:
+            return asyncio.run(_write_export_sections(writer, sections, pool))
 
-            cookies = response.get('result', {}).get('cookies', [])
-            log(f"Retrieved {len(cookies)} cookies")
-            return cookies
-        finally:
-            ws.close()
+# ----- Sharded Export -----
+# With --sharded, an export is a directory rather than a single file:
+#
+#   manifest.json                   every shard with its record count, size and SHA-256
+#   cookies/<base domain>.json      the cookies of one base domain
+#   local_storage/<origin>.json     the local storage of one origin
+#
+# Each shard is an ordinary json or binary export file. An import reads the
+# manifest and only opens the shards its domain filter and origins select,
+# verifying each one against its checksum, on a pool of worker threads.
 
-    finally:  # Outer cleanup
-        # 7. Clean termination
-        log("Cleaning up...")
-        browser_proc.terminate()
-        try:
-            browser_proc.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            browser_proc.kill()
-        subprocess.run(f'taskkill /F /IM chrome.exe',
-                      check=False, shell=True,
-                      stdout=subprocess.DEVNULL,
-                      stderr=subprocess.DEVNULL)
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+MANIFEST_TOOL = "CookieWrangler"
+# The entries of a sharded export directory; replacing an export removes only these.
+SHARD_ENTRIES = ("cookies", "local_storage", MANIFEST_NAME)
 
-def get_chrome_local_storage():
-    """Access Chrome's local storage using proper key parsing"""
-    import os
-    import json
-    import subprocess
-    from pathlib import Path
-    import base64
-    import re
+def _file_digest(path):
+    """Returns (size, SHA-256 hex digest) of a file."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(partial(f.read, 1 << 20), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
 
-    def log(msg):
-        print(f"[Storage Debug] {msg}")
+def _cookie_base_domain(cookie):
+    base_domain = cookie.get("baseDomain")
+    if base_domain is None:
+        base_domain = (cookie.get("host", cookie.get("domain")) or "").lstrip(".")
+    return base_domain
 
-    try:
-        import plyvel
-    except ImportError:
-        try:
-            log("Installing plyvel library...")
-            subprocess.check_call(['pip', 'install', 'plyvel'])
-            import plyvel
-        except:
-            print("You need to install plyvel manually, its a pain! Here's some scratch notes to do it:")
-            notes = """git clone https://github.com/microsoft/vcpkg.git
-cd vcpkg
-bootstrap-vcpkg.bat
+class ShardedExportWriter:
+    """
+    Writes an export as a directory of shards plus a manifest (see
+    open_sharded_export()). Has the write_cookies()/write_local_storage()
+    interface of the single-file writers.
+    """
 
-$env:VCPKG_ROOT = "C:\\path\\to\\vcpkg"
-$env:PATH = "$env:VCPKG_ROOT;$env:PATH"
+    def __init__(self, directory, format="json", compression="none"):
+        self.directory = directory
+        self.format = format
+        self.compression = compression
+        self.suffix = ".bin" if EXPORTERS[format]["binary"] else "." + format
+        self.names = set()
+        self.manifest = {"tool": MANIFEST_TOOL, "version": MANIFEST_VERSION, "format": format,
+                         "cookies": [], "local_storage": []}
+        os.makedirs(os.path.join(directory, "cookies"))
+        os.makedirs(os.path.join(directory, "local_storage"))
 
+    def _shard(self, kind, name, write, **fields):
+        """Writes one shard with write(writer), which returns its record count, and lists it in the manifest."""
+        stem = re.sub(r'[^\w.-]+', '_', name).strip('.') or "_"
+        file_name = stem + self.suffix
+        number = 1
+        # Names are compared case-insensitively for the benefit of Windows and macOS file systems.
+        while (kind, file_name.lower()) in self.names:
+            number += 1
+            file_name = f"{stem}-{number}{self.suffix}"
+        self.names.add((kind, file_name.lower()))
+        path = os.path.join(self.directory, kind, file_name)
+        with open_export(path, self.format, self.compression) as writer:
+            count = write(writer)
+        size, digest = _file_digest(path)
+        self.manifest[kind].append({"file": f"{kind}/{file_name}", **fields,
+                                    "count": count, "bytes": size, "sha256": digest})
 
-vcpkg install leveldb
+    def write_cookies(self, cookies):
+        shards = {}
+        for cookie in cookies:
+            shards.setdefault(_cookie_base_domain(cookie), []).append(cookie)
+        for base_domain in sorted(shards):
+            group = shards[base_domain]
+            hosts = sorted({cookie.get("host", cookie.get("domain")) or "" for cookie in group})
+            self._shard("cookies", base_domain, lambda writer: writer.write_cookies(group),
+                        base_domain=base_domain, hosts=hosts)
+        return sum(map(len, shards.values()))
 
-$env:INCLUDE = "C:\\Users\\[USER]\\Documents\\vcpkg\\installed\\x64-windows\\include"
-$env:LIB = "C:\\Users\\[USER]\\Documents\\vcpkg\\installed\\x64-windows\\lib"
+    def write_local_storage(self, origins):
+        count = 0
+        for origin, storage in origins:
+            def write(writer):
+                writer.write_local_storage([(origin, storage)])
+                return len(storage)
+            self._shard("local_storage", origin, write, origin=origin)
+            count += 1
+        return count
 
-python -m pip install plyvel"""
-            print(notes)
-            sys.exit()
+    def close(self):
+        with open(os.path.join(self.directory, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        logger.info(f"Wrote {len(self.manifest['cookies'])} cookie shard(s) and "
+                    f"{len(self.manifest['local_storage'])} local storage shard(s)")
 
-    # Chrome paths
-    user_data_dir = os.path.expandvars(r'%LOCALAPPDATA%\Google\Chrome\User Data')
-    leveldb_path = os.path.join(user_data_dir, 'Default', 'Local Storage', 'leveldb')
+@contextmanager
+def open_sharded_export(output_dir, format="json", compression="none", dedup_values=False):
+    """
+    The open_export() of a sharded export: yields a ShardedExportWriter on a
+    temporary directory next to `output_dir`, whose entries replace those of
+    `output_dir` once the export has completed. An existing `output_dir` must be
+    empty or hold an earlier sharded export (see read_shard_manifest()); of the
+    latter only the SHARD_ENTRIES are replaced, anything else in it is kept.
+    `dedup_values` is not supported: a value table per origin shard would never be
+    shared between origins.
+    """
+    exporter = EXPORTERS.get(format)
+    if exporter is None or not exporter["importable"]:
+        raise ValueError(f"Sharded exports are written as json or binary files, not {format}")
+    if dedup_values:
+        raise ValueError("Sharded exports do not support value deduplication")
+    output_dir = os.path.normpath(output_dir)
+    replace = False
+    if os.path.exists(output_dir):
+        if not os.path.isdir(output_dir):
+            raise ValueError(f"{output_dir} exists and is not a directory")
+        if os.listdir(output_dir):
+            try:
+                read_shard_manifest(output_dir)
+            except (OSError, ValueError) as e:
+                raise ValueError(f"{output_dir} exists and is not a sharded export ({e})") from None
+            replace = True
+    parent, name = os.path.split(output_dir)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{name}.", suffix=".tmp", dir=parent or ".")
+    try:
+        writer = ShardedExportWriter(tmp_dir, format, compression)
+        yield writer
+        writer.close()
+        if not os.path.exists(output_dir):
+            os.replace(tmp_dir, output_dir)
+            return
+        # The manifest goes first and comes back last, so an interrupted replacement
+        # never leaves a manifest describing shards that are not there.
+        for entry in reversed(SHARD_ENTRIES) if replace else ():
+            path = os.path.join(output_dir, entry)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        for entry in SHARD_ENTRIES:
+            os.replace(os.path.join(tmp_dir, entry), os.path.join(output_dir, entry))
+    finally:
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
-    if not os.path.exists(leveldb_path):
-        log(f"LevelDB path not found: {leveldb_path}")
-        return {}
+def read_shard_manifest(export_dir):
+    """
+    Reads the manifest of a sharded export. Raises ValueError unless it is a
+    manifest written by this tool, in a supported version.
+    """
+    with open(os.path.join(export_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or manifest.get("tool") != MANIFEST_TOOL \
+            or not isinstance(manifest.get("cookies"), list) or not isinstance(manifest.get("local_storage"), list):
+        raise ValueError(f"{MANIFEST_NAME} is not the manifest of a sharded export")
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported sharded export version {manifest.get('version')}")
+    return manifest
 
-    all_storage = {}
+def select_shards(manifest, domain_filter=None, origins=None):
+    """
+    Returns the manifest entries of the shards that can hold records selected by
+    `domain_filter` and `origins` (local storage origins): cookie shards with a
+    matching host, then local storage shards of matching origins.
+    """
+    selected = []
+    for shard in manifest["cookies"]:
+        # Hostless cookies get the --default-host later, so their shard is always read.
+        if domain_filter is None or any(not host or domain_filter.matches(host) for host in shard["hosts"]):
+            selected.append(shard)
+    for shard in manifest["local_storage"]:
+        if origins and shard["origin"] not in origins:
+            continue
+        if domain_filter is None or domain_filter.matches_origin(shard["origin"]):
+            selected.append(shard)
+    return selected
 
-    try:
-        # Open the LevelDB database
-        db = plyvel.DB(leveldb_path, create_if_missing=False)
+def _read_shard(export_dir, shard):
+    """
+    Checks a shard against its manifest entry and returns its events as a list.
+    Shards are small, so each is read into memory once and parsed from there.
+    """
+    parts = shard["file"].split("/")
+    if ".." in parts or os.path.isabs(shard["file"]):
+        raise ValueError(f"Invalid shard path in manifest: {shard['file']!r}")
+    with open(os.path.join(export_dir, *parts), 'rb') as f:
+        data = f.read()
+    if len(data) != shard["bytes"] or hashlib.sha256(data).hexdigest() != shard["sha256"]:
+        raise ValueError(f"Shard {shard['file']} does not match the checksum in the manifest")
+    STATS.count("bytes_read", len(data))
+    with _open_event_stream(io.BytesIO(data)) as events:
+        return list(events)
 
-        # Helper function to decode and parse keys
-        def parse_key(raw_key):
-            try:
-                # Remove common prefixes
-                if raw_key.startswith(b'\x00\x01'):
-                    key_str = raw_key[2:].decode('utf-8')
-                elif raw_key.startswith(b'\x01'):
-                    key_str = raw_key[1:].decode('utf-8')
-                else:
-                    key_str = raw_key.decode('utf-8')
-
-                # For META and METAACCESS keys
-                if key_str.startswith(('META:', 'METAACCESS:', 'VERSION')):
-                    return 'unknown', key_str
-
-                # Split on null byte to separate domain and key
-                parts = key_str.split('\x00')
-                if len(parts) >= 2:
-                    domain = parts[0].lstrip('_')  # Remove leading underscore if present
-                    # Join remaining parts with null byte to preserve original key structure
-                    key = '\x00'.join(parts[1:])
-                    # Remove control characters from key while preserving structure
-                    key = re.sub('[\x00-\x08\x0B\x0C\x0E-\x1F]', '', key)
-                    return domain, key
-                else:
-                    return 'unknown', key_str
-            except:
-                return None, None
+def iter_sharded_events(export_dir, domain_filter=None, origins=None, workers=1):
+    """
+    Yields the events of the shards select_shards() picks from a sharded export, in
+    manifest order. With workers > 1 the shards are checked and read on a thread
+    pool; hashing and file reads release the GIL. Records are not filtered here.
+    """
+    manifest = read_shard_manifest(export_dir)
+    shards = select_shards(manifest, domain_filter, origins)
+    total = len(manifest["cookies"]) + len(manifest["local_storage"])
+    logger.info(f"Reading {len(shards)} of {total} shard(s) from {export_dir}")
+    STATS.count("shards", len(shards))
+    read = partial(_read_shard, export_dir)
+    if workers is None or workers <= 1:
+        results = ((shard, read(shard)) for shard in shards)
+    else:
+        results = ordered_pool_map(read, shards, workers)
+    for _, events in results:
+        yield from events
 
-        # Helper function to decode values
-        def decode_value(raw_value):
-            try:
-                # Try UTF-8 first
-                value = raw_value.decode('utf-8')
-                # Remove null bytes and control chars except newlines and spaces
-                value = re.sub('[\x00-\x08\x0B\x0C\x0E-\x1F]', '', value)
-                return value
-            except:
-                try:
-                    # Try UTF-16
-                    return raw_value.decode('utf-16')
-                except:
-                    # If all else fails, return base64
-                    return base64.b64encode(raw_value).decode('utf-8')
-
-        # Process all key-value pairs
-        for key, value in db.iterator():
-            try:
-                domain, storage_key = parse_key(key)
-                if not domain or not storage_key:
-                    continue
+# ----- Diff and Merge -----
+# Cookies are indexed by their moz_uniqueid key and local storage by (origin, key),
+# so comparing or merging exports is a single pass over each file.
 
-                decoded_value = decode_value(value)
-                if not decoded_value:
-                    continue
+MERGE_POLICIES = ("last-wins", "newest-expiry")
 
-                # Store in our result dictionary
-                if domain not in all_storage:
-                    all_storage[domain] = {}
-                all_storage[domain][storage_key] = decoded_value
+def cookie_identity(cookie):
+    """The moz_uniqueid key (name, host, path, originAttributes) of a cookie dict."""
+    if type(cookie) is CookieRecord:
+        return (cookie.name, cookie.host, cookie.path, cookie.originAttributes)
+    get = cookie.get
+    return (get("name", ""), get("host", get("domain", "")), get("path", "/"), get("originAttributes", ""))
 
-                log(f"Found key: {storage_key} for domain: {domain}")
+def _identity_dict(identity):
+    name, host, path, origin_attributes = identity
+    return {"name": name, "host": host, "path": path, "originAttributes": origin_attributes}
 
-            except Exception as e:
-                log(f"Error processing entry: {e}")
-                continue
+def _cookie_expiry(cookie):
+    return cookie.get("expiry", cookie.get("expires")) or 0
 
-        db.close()
+@contextmanager
+def open_export_events(import_file, domain_filter=None):
+    """open_import_events(), optionally dropping the records rejected by `domain_filter`."""
+    with open_import_events(import_file) as events:
+        yield filter_events(events, domain_filter) if domain_filter else events
 
-    except Exception as e:
-        log(f"Error accessing LevelDB: {e}")
-        return {}
+def index_export(import_file, domain_filter=None):
+    """Reads an export file into ({cookie identity: cookie}, {origin: {key: value}})."""
+    cookies = {}
+    local_storage = {}
+    with open_export_events(import_file, domain_filter) as events:
+        for event in events:
+            if event[0] == "cookie":
+                cookie = CookieRecord.from_dict(event[1])
+                cookies[cookie_identity(cookie)] = cookie
+            else:
+                _, origin, key, value = event
+                local_storage.setdefault(origin, {})[key] = value
+    return cookies, local_storage
 
-    # Clean up the domains by removing any remaining underscores
-    cleaned_storage = {}
-    for domain, values in all_storage.items():
-        clean_domain = domain.lstrip('_')
-        cleaned_storage[clean_domain] = values
+def diff_exports(old_file, new_file, domain_filter=None):
+    """
+    Compares two export files (of either format). Only `old_file` is indexed;
+    `new_file` is streamed against the index. Returns
+    {"cookies": {...}, "local_storage": {...}}, each with "added", "changed" and
+    "removed" lists. Cookie entries are cookie dicts ({"old", "new"} pairs for
+    changes); local storage entries are {"origin", "key", "value"} dicts
+    ({"origin", "key", "old", "new"} for changes).
+    """
+    old_cookies, old_storage = index_export(old_file, domain_filter)
+    cookies = {"added": [], "changed": [], "removed": []}
+    local_storage = {"added": [], "changed": [], "removed": []}
+    with open_export_events(new_file, domain_filter) as events:
+        for event in events:
+            if event[0] == "cookie":
+                # Only cookies that are kept in the result are converted to records.
+                cookie = event[1]
+                old = old_cookies.pop(cookie_identity(cookie), None)
+                if old is None:
+                    cookies["added"].append(CookieRecord.from_dict(cookie))
+                elif old != cookie:
+                    cookies["changed"].append({"old": old, "new": CookieRecord.from_dict(cookie)})
+            else:
+                _, origin, key, value = event
+                origin_storage = old_storage.get(origin, {})
+                if key not in origin_storage:
+                    local_storage["added"].append({"origin": origin, "key": key, "value": value})
+                    continue
+                old = origin_storage.pop(key)
+                if old != value:
+                    local_storage["changed"].append({"origin": origin, "key": key, "old": old, "new": value})
+    cookies["removed"] = list(old_cookies.values())
+    local_storage["removed"] = [{"origin": origin, "key": key, "value": value}
+                                for origin, storage in old_storage.items() for key, value in storage.items()]
+    return {"cookies": cookies, "local_storage": local_storage}
 
-    log(f"Found data for {len(cleaned_storage)} domains")
-    return cleaned_storage
+def print_diff(diff, details=True):
+    """Prints a diff from diff_exports(): one line per change if `details`, then the totals."""
+    if details:
+        marks = {"added": "+", "changed": "~", "removed": "-"}
+        for change, mark in marks.items():
+            for entry in diff["cookies"][change]:
+                cookie = entry.get("new", entry)
+                name, host, path, _ = cookie_identity(cookie)
+                print(f"{mark} cookie {name} ({host}{path})")
+        for change, mark in marks.items():
+            for entry in diff["local_storage"][change]:
+                print(f"{mark} local storage {entry['origin']} {entry['key']}")
+    for section in ("cookies", "local_storage"):
+        counts = diff[section]
+        print(f"{section}: {len(counts['added'])} added, {len(counts['changed'])} changed, "
+              f"{len(counts['removed'])} removed")
 
-# ----- Firefox Cookies and Local Storage Functions -----
+def write_diff(diff, output_file, format="json", compression="none"):
+    """
+    Writes a diff in the delta export shape: added and changed records in the usual
+    "cookies"/"local_storage" sections (importable as-is), deletions under "removed".
+    """
+    cookies = diff["cookies"]
+    changed_storage = {}
+    for entry in diff["local_storage"]["added"]:
+        changed_storage.setdefault(entry["origin"], {})[entry["key"]] = entry["value"]
+    for entry in diff["local_storage"]["changed"]:
+        changed_storage.setdefault(entry["origin"], {})[entry["key"]] = entry["new"]
+    removed_storage = {}
+    for entry in diff["local_storage"]["removed"]:
+        removed_storage.setdefault(entry["origin"], []).append(entry["key"])
+    with open_export(output_file, format, compression) as writer:
+        writer.write_cookies(chain(cookies["added"], (change["new"] for change in cookies["changed"])))
+        writer.write_local_storage(changed_storage.items())
+        writer.write_value("removed", {
+            "cookies": [_identity_dict(cookie_identity(cookie)) for cookie in cookies["removed"]],
+            "local_storage": removed_storage,
+        })
 
-def get_firefox_local_storage(profile_dir=None):
+def merge_exports(import_files, policy="last-wins", domain_filter=None):
     """
-    Returns local storage data from Firefox's per-site storage databases.
-    For each site folder in <profile_dir>/storage/default, this function looks for the
-    ls/data.sqlite file and reads the key/value pairs from its "data" table.
-    It returns a dictionary mapping origins (e.g. "https://example.com") to another
-    dictionary of local storage key/value pairs.
+    Merges export files in order. A cookie present in several files is taken from
+    the last one ("last-wins") or from the one with the latest expiry, the later
+    file winning ties ("newest-expiry"); local storage values are always last-wins.
+    Returns (cookies, local_storage, conflicts), where cookies maps identity to
+    cookie and conflicts counts records that differed between files.
     """
-    # Auto-detect the profile directory if not provided.
-    if profile_dir is None:
-        if os.name == 'posix':
-            base = os.path.expanduser('~/.mozilla/firefox')
-        else:
-            base = os.path.expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles')
-        profiles = glob(os.path.join(base, '*default-release*'))
-        if not profiles:
-            profiles = glob(os.path.join(base, '*default*'))
-        if not profiles:
-            raise FileNotFoundError("Firefox profile not found")
-        profile_dir = profiles[0]
+    if policy not in MERGE_POLICIES:
+        raise ValueError(f"Unknown merge policy: {policy}")
+    cookies = {}
+    local_storage = {}
+    conflicts = 0
+    for import_file in import_files:
+        with open_export_events(import_file, domain_filter) as events:
+            for event in events:
+                if event[0] == "cookie":
+                    cookie = CookieRecord.from_dict(event[1])
+                    identity = cookie_identity(cookie)
+                    existing = cookies.get(identity)
+                    if existing is not None and existing != cookie:
+                        conflicts += 1
+                        if policy == "newest-expiry" and _cookie_expiry(cookie) < _cookie_expiry(existing):
+                            continue
+                    cookies[identity] = cookie
+                else:
+                    _, origin, key, value = event
+                    storage = local_storage.setdefault(origin, {})
+                    if key in storage and storage[key] != value:
+                        conflicts += 1
+                    storage[key] = value
+    return cookies, local_storage, conflicts
 
-    storage_dir = os.path.join(profile_dir, "storage", "default")
-    ls_data = {}
+# ----- Multi-Profile Export -----
 
-    # Iterate over each site folder in the storage/default directory.
-    for site_folder in glob(os.path.join(storage_dir, "*")):
-        ls_db = os.path.join(site_folder, "ls", "data.sqlite")
-        if os.path.exists(ls_db):
-            # Convert the folder name to an origin string.
-            # E.g., "https+++example.com" becomes "https://example.com"
-            origin = os.path.basename(site_folder).replace("+++", "://")
-            site_storage = {}
-            try:
-                conn = sqlite3.connect(ls_db)
-                cur = conn.cursor()
-                cur.execute("SELECT key, value FROM data")
-                rows = cur.fetchall()
-                for key, value in rows:
-                    # Attempt to decode the value if it is stored as a BLOB.
-                    if isinstance(value, bytes):
-                        try:
-                            value = value.decode("utf-8")
-                        except Exception:
-                            value = value.hex()
-                    site_storage[key] = value
-                conn.close()
-                ls_data[origin] = site_storage
-            except Exception as e:
-                print(f"Error reading local storage from {ls_db}: {e}")
-    return ls_data
+def firefox_root_dir():
+    """The Firefox directory holding profiles.ini."""
+    if os.name == 'posix':
+        return os.path.expanduser('~/.mozilla/firefox')
+    return os.path.expandvars(r'%APPDATA%\Mozilla\Firefox')
 
-def export_firefox_local_storage(output_file, profile_dir=None):
+def list_firefox_profiles(root=None):
     """
-    Exports local storage using the get_firefox_local_storage() function.
+    Returns [(name, profile_dir)] for every profile in profiles.ini, in file order.
+    Names are made unique by appending the folder name where they clash.
     """
-    data = get_firefox_local_storage(profile_dir)
-    with open(output_file, 'w') as f:
-        json.dump(data, f, indent=2)
-    print(f"Exported LocalStorage to {output_file}")
+    root = root or firefox_root_dir()
+    profiles = []
+    with STATS.phase("discovery"):
+        config = configparser.ConfigParser(interpolation=None)
+        config.read(os.path.join(root, "profiles.ini"), encoding="utf-8")
+        names = set()
+        for section in config.sections():
+            entry = config[section]
+            if not section.startswith("Profile") or "Path" not in entry:
+                continue
+            path = entry["Path"]
+            if entry.get("IsRelative", "1") == "1":
+                path = os.path.join(root, *path.split("/"))
+            name = entry.get("Name") or os.path.basename(path)
+            if name in names:
+                name = f"{name} ({os.path.basename(path)})"
+            names.add(name)
+            profiles.append((name, path))
+    return profiles
+
+def _profile_work(profiles, local_storage=False, domain_filter=None):
+    """The flat list of read tasks for all profiles: (name, "cookies" or "site", path)."""
+    for name, profile_dir in profiles:
+        yield name, "cookies", os.path.join(profile_dir, "cookies.sqlite")
+        if local_storage:
+            storage_dir = os.path.join(profile_dir, "storage", "default")
+            with STATS.phase("discovery"):
+                site_folders = select_site_folders(sorted(glob(os.path.join(storage_dir, "*"))),
+                                                   domain_filter=domain_filter)
+            for site_folder in site_folders:
+                yield name, "site", site_folder
 
-def import_local_storage_to_firefox(import_file, firefox_db=None):
+def _read_profile_item(item, domain_filter=None, materialize=True, skip_expired=False):
+    """
+    Runs one read task. Cookie tasks return the profile's cookies (a list when
+    `materialize`, for pool workers, otherwise a lazy iterator); site tasks return
+    (origin, storage) like _read_site_folder(). A profile whose cookies cannot be
+    read is reported and exported without cookies.
+    """
+    name, kind, path = item
+    if kind == "site":
+        return _read_site_folder(path)
+    if not os.path.exists(path):
+        return []
+    cookies = _profile_cookies(name, path, domain_filter, skip_expired)
+    return list(cookies) if materialize else cookies
+
+def _profile_cookies(name, db, domain_filter=None, skip_expired=False):
     try:
-        with open(import_file, 'r', encoding='utf-8') as f:
-            storage_data = json.load(f)
+        yield from iter_firefox_cookies(db, domain_filter=domain_filter, skip_expired=skip_expired)
     except Exception as e:
-        print("Error reading local storage import file:", e)
-        return
+        STATS.count("errors")
+        logger.error(f"Error reading cookies of profile {name}: {e}")
 
-    if not storage_data:
-        print("No local storage entries found in import file")
-        return
+def export_profiles(output_file, profiles, local_storage=False, workers=1, split=False,
+                    format="json", compression="none", domain_filter=None, skip_expired=False,
+                    dedup_values=False):
+    """
+    Exports several Firefox profiles in one run. The cookie and site folder reads of
+    all profiles form one flat task list on a single pool of `workers` threads (no
+    task ever waits for another), and results are written in profile order as they
+    complete. The output is one JSON file with a "profiles" object keyed by profile
+    name, or with `split`, one export file per profile next to `output_file`;
+    `dedup_values` applies to the split files only. Returns the list of files written.
+    """
+    work = _profile_work(profiles, local_storage, domain_filter)
+    if workers is None or workers <= 1:
+        results = ((item, _read_profile_item(item, domain_filter, False, skip_expired)) for item in work)
+    else:
+        results = ordered_pool_map(partial(_read_profile_item, domain_filter=domain_filter,
+                                           skip_expired=skip_expired), work, workers)
 
-    origins_imported = 0
-    keys_imported = 0
+    def fill(group, writer):
+        _, cookies = next(group)
+        writer.write_cookies(cookies)
+        if local_storage:
+            writer.write_local_storage(result for _, result in group if result[1] is not None)
 
-    for origin, data in storage_data.items():
-        # Derive folder name: replace "://" with "+++"
-        folder_name = origin.replace("://", "+++")
-        ls_dir = os.path.join(profile_dir, "storage", "default", folder_name, "ls")
-        os.makedirs(ls_dir, exist_ok=True)
-        db_path = os.path.join(ls_dir, "data.sqlite")
+    grouped = groupby(results, key=lambda pair: pair[0][0])
+    if not split:
+        with open_export(output_file, format, compression) as writer:
+            writer.write_objects("profiles", ((name, partial(fill, group)) for name, group in grouped))
+        return [output_file]
 
-        try:
-            conn = sqlite3.connect(db_path)
-            cur = conn.cursor()
-            cur.execute("PRAGMA foreign_keys=OFF;")
-            cur.execute("BEGIN TRANSACTION;")
-            # Create tables if they do not exist
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS database(
-                    origin TEXT NOT NULL,
-                    usage INTEGER NOT NULL DEFAULT 0,
-                    last_vacuum_time INTEGER NOT NULL DEFAULT 0,
-                    last_analyze_time INTEGER NOT NULL DEFAULT 0,
-                    last_vacuum_size INTEGER NOT NULL DEFAULT 0
-                );
-            """)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS data(
-                    key TEXT PRIMARY KEY,
-                    utf16_length INTEGER NOT NULL,
-                    conversion_type INTEGER NOT NULL,
-                    compression_type INTEGER NOT NULL,
-                    last_access_time INTEGER NOT NULL DEFAULT 0,
-                    value BLOB NOT NULL
-                );
-            """)
-            # Insert (or update) the database metadata row
-            cur.execute("INSERT OR REPLACE INTO database VALUES (?, ?, ?, ?, ?);",
-                        (origin, 0, 0, 0, 0))
-
-            for key, value in data.items():
-                # Calculate the length of the value in UTF-16 code units
-                utf16_length = len(value.encode('utf-16-le')) // 2
-                conversion_type = 1
-                compression_type = 0
-                last_access_time = 0
-                value_blob = value.encode('utf-8')
-                try:
-                    cur.execute("""
-                        INSERT OR REPLACE INTO data
-                        (key, utf16_length, conversion_type, compression_type, last_access_time, value)
-                        VALUES (?, ?, ?, ?, ?, ?);
-                    """, (key, utf16_length, conversion_type, compression_type, last_access_time, value_blob))
-                    keys_imported += 1
-                except Exception as e:
-                    print(f"Error importing key '{key}' for origin {origin}: {e}")
+    stem, ext = os.path.splitext(output_file)
+    written = []
+    used = set()
+    for name, group in grouped:
+        safe_name = re.sub(r'[^\w.-]+', '_', name)
+        profile_file = f"{stem}.{safe_name}{ext}"
+        number = 1
+        # "Work Profile" and "Work_Profile" (or "work_profile") must not overwrite each other.
+        while profile_file.lower() in used:
+            number += 1
+            profile_file = f"{stem}.{safe_name}-{number}{ext}"
+        used.add(profile_file.lower())
+        with open_export(profile_file, format, compression, dedup_values) as writer:
+            fill(group, writer)
+        written.append(profile_file)
+    return written
 
-            conn.commit()
-            conn.close()
-            origins_imported += 1
-            print(f"Imported local storage for origin {origin} with {len(data)} entr{'y' if len(data)==1 else 'ies'}.")
-        except Exception as e:
-            print(f"Error processing origin {origin}: {e}")
+# ----- Delta Export -----
+# A watermark file stores what the previous export contained (the newest
+# creationTime/lastAccessed, the row count and a content hash per cookie key;
+# the data.sqlite mtime and a hash per key for every origin). The next delta export
+# only reads rows and origins that can have changed and emits just the differences.
 
-    print(f"Imported local storage for {origins_imported} origin(s) with a total of {keys_imported} entr{'y' if keys_imported==1 else 'ies'}.")
+WATERMARK_VERSION = 1
 
-def export_firefox_cookies(db=None):
-    """
-    Exports Firefox cookies in a format suitable for import.
-    Returns a list of dictionaries, one per cookie.
-    """
-    if db is None:
-        if globals().get('LINUX', False):
-            profiles = glob(os.path.expanduser('~/.mozilla/firefox/*default-release*/cookies.sqlite'))
-            if not profiles:
-                profiles = glob(os.path.expanduser('~/.mozilla/firefox/*default*/cookies.sqlite'))
-        else:
-            profiles = glob(expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles\*default-release*\cookies.sqlite'))
-            if not profiles:
-                profiles = glob(expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles\*default*\cookies.sqlite'))
-        if not profiles:
-            raise FileNotFoundError("Firefox cookies database not found!")
-        db = profiles[0]
-    conn = sqlite3.connect(db)
-    cur = conn.cursor()
-    query = """
-      SELECT originAttributes, name, value, host, path, expiry, isSecure, isHttpOnly,
-             inBrowserElement, sameSite, rawSameSite, schemeMap
-      FROM moz_cookies
-    """
-    cookies = []
-    for row in cur.execute(query):
-        cookie = {
-            "originAttributes": row[0],
-            "name": row[1],
-            "value": row[2],
-            "host": row[3],
-            "path": row[4],
-            "expiry": row[5],
-            "isSecure": row[6],
-            "isHttpOnly": row[7],
-            "inBrowserElement": row[8],
-            "sameSite": row[9],
-            "rawSameSite": row[10],
-            "schemeMap": row[11],
-            "baseDomain": row[3].lstrip('.') if row[3] else ""
-        }
-        cookies.append(cookie)
-    conn.close()
-    return cookies
+def _content_hash(obj):
+    return hashlib.blake2b(json.dumps(obj, sort_keys=True, default=_json_default).encode('utf-8'),
+                           digest_size=8).hexdigest()
 
-# ----- Import Cookies into a Firefox Cookies Database -----
-def import_cookies_to_firefox(import_file, firefox_db=None, default_host=None):
+def _cookie_key(cookie):
+    """The moz_uniqueid key of a cookie, as a string usable in JSON objects."""
+    return json.dumps([cookie["name"], cookie["host"], cookie["path"], cookie["originAttributes"]])
+
+def load_watermark(path, source):
     """
-    Imports cookies from a JSON file into a Firefox cookies database.
+    Loads the watermark written by the previous delta export. Returns None (meaning
+    "export everything") if there is none, or if it was recorded for another source.
     """
     try:
-        with open(import_file, 'r', encoding='utf-8') as f:
-            cookies = json.load(f)
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
     except Exception as e:
-        print("Error reading the import file:", e)
-        return
-
-    if firefox_db is None:
-        if globals().get('LINUX', False):
-            profiles = glob(os.path.expanduser('~/.mozilla/firefox/*default-release*/cookies.sqlite'))
-            if not profiles:
-                profiles = glob(os.path.expanduser('~/.mozilla/firefox/*default*/cookies.sqlite'))
-        else:
-            profiles = glob(expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles\*default-release*\cookies.sqlite'))
-            if not profiles:
-                profiles = glob(expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles\*default*\cookies.sqlite'))
-        if profiles:
-            firefox_db = profiles[0]
-            print("Using existing Firefox cookies DB at:", firefox_db)
-        else:
-            firefox_db = 'imported_cookies.sqlite'
-            print("No existing Firefox cookies DB found; creating new DB at:", firefox_db)
+        print(f"Ignoring unreadable watermark {path}: {e}")
+        return None
+    if state.get("version") != WATERMARK_VERSION or state.get("source") != source:
+        print(f"Watermark {path} belongs to a different profile; doing a full export.")
+        return None
+    return state
 
-    conn = sqlite3.connect(firefox_db)
-    cur = conn.cursor()
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='moz_cookies'")
-    if not cur.fetchone():
-        cur.execute("""
-            CREATE TABLE moz_cookies (
-                id INTEGER PRIMARY KEY,
-                originAttributes TEXT NOT NULL DEFAULT '',
-                name TEXT,
-                value TEXT,
-                host TEXT,
-                path TEXT,
-                expiry INTEGER,
-                lastAccessed INTEGER,
-                creationTime INTEGER,
-                isSecure INTEGER,
-                isHttpOnly INTEGER,
-                inBrowserElement INTEGER DEFAULT 0,
-                sameSite INTEGER DEFAULT 0,
-                rawSameSite INTEGER DEFAULT 0,
-                schemeMap INTEGER DEFAULT 0,
-                isPartitionedAttributeSet INTEGER DEFAULT 0,
-                CONSTRAINT moz_uniqueid UNIQUE (name, host, path, originAttributes)
-            )
-        """)
-        print("Created new table 'moz_cookies' in the database.")
-    now = int(time.time() * 1_000_000)
-    imported_count = 0
-    for cookie in cookies:
-        name = cookie.get("name", "")
-        value = cookie.get("value", "")
-        host = cookie.get("host", default_host)
-        if not host:
-            print(f"Skipping cookie '{name}' because it lacks a host and no default was provided.")
-            continue
-        path = cookie.get("path", "/")
-        expiry = cookie.get("expiry", 0)
-        isSecure = cookie.get("isSecure", 0)
-        isHttpOnly = cookie.get("isHttpOnly", 0)
-        originAttributes = cookie.get("originAttributes", "")
-        lastAccessed = now
-        creationTime = now
-        inBrowserElement = cookie.get("inBrowserElement", 0)
-        sameSite = cookie.get("sameSite", 0)
-        rawSameSite = cookie.get("rawSameSite", 0)
-        schemeMap = cookie.get("schemeMap", 0)
-        try:
-            cur.execute("""
-                INSERT INTO moz_cookies
-                (originAttributes, name, value, host, path, expiry, lastAccessed, creationTime,
-                 isSecure, isHttpOnly, inBrowserElement, sameSite, rawSameSite, schemeMap)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (originAttributes, name, value, host, path, expiry,
-                  lastAccessed, creationTime, isSecure, isHttpOnly,
-                  inBrowserElement, sameSite, rawSameSite, schemeMap))
-            imported_count += 1
-        except Exception as e:
-            print("Error inserting cookie", name, ":", e)
-    conn.commit()
-    conn.close()
-    print("Imported", imported_count, "cookies into Firefox cookies DB at:", firefox_db)
+def save_watermark(path, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
 
-# ----- New Function: Export All Sites' Local Storage -----
-def export_all_sites_local_storage(profile_dir, output_file):
+def firefox_cookie_delta(db, previous, domain_filter=None, skip_expired=False):
     """
-    Scans the Firefox profile's storage/default directory for all sites,
-    opens each ls/data.sqlite file, extracts key/value pairs from the "data" table,
-    and writes them to a JSON file.
+    Compares moz_cookies against the cookie watermark of a previous export.
+    Returns (changes, removed, state): the added or changed cookie dicts, the keys
+    of removed cookies and the watermark to store for the next run.
+
+    Only rows with a newer creationTime or lastAccessed are read; the key column
+    scan needed to find removed cookies is skipped when the row count shows that
+    nothing was deleted. All queries run in one read transaction, so they see the
+    same state of the database.
     """
-    storage_default = os.path.join(profile_dir, "storage", "default")
-    all_storage = {}
+    filter_where, filter_params = cookie_conditions(domain_filter, skip_expired)
+    hashes = dict(previous["hashes"]) if previous else {}
+    changes = []
+    added = 0
+    current = None
+    with open_profile_db(db) as conn:
+        conn.isolation_level = None
+        conn.execute("BEGIN")
+        count, max_created, max_accessed = conn.execute(
+            "SELECT count(*), max(creationTime), max(lastAccessed) FROM moz_cookies WHERE " + filter_where,
+            filter_params).fetchone()
+        if previous:
+            candidates = query_cookies(conn, "creationTime > ? OR lastAccessed > ?",
+                                       (previous["creationTime"], previous["lastAccessed"]),
+                                       domain_filter=domain_filter, skip_expired=skip_expired)
+        else:
+            candidates = query_cookies(conn, domain_filter=domain_filter, skip_expired=skip_expired)
+        for cookie in candidates:
+            key = _cookie_key(cookie)
+            digest = _content_hash(cookie)
+            old_digest = hashes.get(key)
+            if old_digest != digest:
+                if old_digest is None:
+                    added += 1
+                hashes[key] = digest
+                changes.append(cookie)
+        if previous and previous["count"] + added != count:
+            current = {json.dumps(list(row)) for row in
+                       conn.execute("SELECT name, host, path, originAttributes FROM moz_cookies WHERE "
+                                    + filter_where, filter_params)}
+        conn.execute("COMMIT")
 
-    if not os.path.exists(storage_default):
-        print(f"Storage folder not found at {storage_default}")
-        return
+    removed = []
+    if current is not None:
+        for key in [key for key in hashes if key not in current]:
+            del hashes[key]
+            name, host, path, origin_attributes = json.loads(key)
+            removed.append({"name": name, "host": host, "path": path, "originAttributes": origin_attributes})
 
-    site_folders = glob(os.path.join(storage_default, "*"))
-    print(f"Found {len(site_folders)} site folder(s) in {storage_default}")
+    state = {"count": count, "creationTime": max_created or 0, "lastAccessed": max_accessed or 0,
+             "hashes": hashes}
+    return changes, removed, state
 
-    for site_path in site_folders:
-        print(f"Checking site folder: {site_path}")
-        ls_db = os.path.join(site_path, "ls", "data.sqlite")
-        if os.path.exists(ls_db):
-            print(f"  Found ls db: {ls_db}")
-            origin = os.path.basename(site_path).replace("+++", "://")
-            site_storage = {}
-            try:
-                conn = sqlite3.connect(ls_db)
-                cur = conn.cursor()
-                cur.execute("SELECT key, value FROM data")
-                rows = cur.fetchall()
-                for key, value in rows:
-                    if isinstance(value, bytes):
-                        try:
-                            value = value.decode("utf-8")
-                        except Exception:
-                            value = value.hex()
-                    site_storage[key] = value
-                conn.close()
-                all_storage[origin] = site_storage
-            except Exception as e:
-                print(f"Error reading {ls_db}: {e}")
-        else:
-            print(f"  No ls db found in {site_path}")
+def _site_mtime(ls_db):
+    """Latest modification time of a data.sqlite, including its write-ahead log."""
+    mtime = os.path.getmtime(ls_db)
+    wal = ls_db + "-wal"
+    if os.path.exists(wal):
+        mtime = max(mtime, os.path.getmtime(wal))
+    return mtime
 
-    try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(all_storage, f, indent=2)
-        print(f"Exported local storage for {len(all_storage)} site(s) to {output_file}")
-    except Exception as e:
-        print("Error writing to output file:", e)
-def import_cookies_data(cookies, firefox_db=None, default_host=None):
+def firefox_local_storage_delta(profile_dir, previous, workers=1, domain_filter=None):
     """
-    Imports cookie objects (a list) into the Firefox cookies database.
+    Compares the profile's local storage against the watermark of a previous export.
+    Returns (changes, removed, state): {origin: {key: value}} for added or changed
+    keys, {origin: [keys]} for removed keys and the watermark for the next run.
+    Origins whose data.sqlite has not been modified since are not opened at all.
     """
-    # Auto-detect Firefox cookies DB if not provided.
-    if firefox_db is None:
-        if globals().get('LINUX', False):
-            profiles = glob(os.path.expanduser('~/.mozilla/firefox/*default-release*/cookies.sqlite'))
-            if not profiles:
-                profiles = glob(os.path.expanduser('~/.mozilla/firefox/*default*/cookies.sqlite'))
-        else:
-            profiles = glob(expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles\*default-release*\cookies.sqlite'))
-            if not profiles:
-                profiles = glob(expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles\*default*\cookies.sqlite'))
-        if profiles:
-            firefox_db = profiles[0]
-            print("Using existing Firefox cookies DB at:", firefox_db)
+    previous = previous or {}
+    storage_dir = os.path.join(profile_dir, "storage", "default")
+    state = {}
+    to_read = []
+    for site_folder in select_site_folders(sorted(glob(os.path.join(storage_dir, "*"))),
+                                           domain_filter=domain_filter):
+        ls_db = os.path.join(site_folder, "ls", "data.sqlite")
+        if not os.path.exists(ls_db):
+            continue
+        origin = _origin_from_folder(site_folder)
+        mtime = _site_mtime(ls_db)
+        if origin in previous and previous[origin]["mtime"] == mtime:
+            state[origin] = previous[origin]
         else:
-            firefox_db = 'imported_cookies.sqlite'
-            print("No existing Firefox cookies DB found; creating new DB at:", firefox_db)
-    conn = sqlite3.connect(firefox_db)
-    cur = conn.cursor()
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='moz_cookies'")
-    if not cur.fetchone():
-         cur.execute("""
-            CREATE TABLE moz_cookies (
-                id INTEGER PRIMARY KEY,
-                originAttributes TEXT NOT NULL DEFAULT '',
-                name TEXT,
-                value TEXT,
-                host TEXT,
-                path TEXT,
-                expiry INTEGER,
-                lastAccessed INTEGER,
-                creationTime INTEGER,
-                isSecure INTEGER,
-                isHttpOnly INTEGER,
-                inBrowserElement INTEGER DEFAULT 0,
-                sameSite INTEGER DEFAULT 0,
-                rawSameSite INTEGER DEFAULT 0,
-                schemeMap INTEGER DEFAULT 0,
-                isPartitionedAttributeSet INTEGER DEFAULT 0,
-                CONSTRAINT moz_uniqueid UNIQUE (name, host, path, originAttributes)
-            )
-         """)
-         print("Created new table 'moz_cookies' in the database.")
-    now = int(time.time() * 1_000_000)
-    imported_count = 0
-    for cookie in cookies:
-         name = cookie.get("name", "")
-         value = cookie.get("value", "")
-         host = cookie.get("host", default_host)
-         if not host:
-             print(f"Skipping cookie '{name}' because it lacks a host and no default was provided.")
-             continue
-         path = cookie.get("path", "/")
-         expiry = cookie.get("expiry", 0)
-         isSecure = cookie.get("isSecure", 0)
-         isHttpOnly = cookie.get("isHttpOnly", 0)
-         originAttributes = cookie.get("originAttributes", "")
-         lastAccessed = now
-         creationTime = now
-         inBrowserElement = cookie.get("inBrowserElement", 0)
-         sameSite = cookie.get("sameSite", 0)
-         rawSameSite = cookie.get("rawSameSite", 0)
-         schemeMap = cookie.get("schemeMap", 0)
-         try:
-             cur.execute("""
-                INSERT INTO moz_cookies
-                (originAttributes, name, value, host, path, expiry, lastAccessed, creationTime,
-                 isSecure, isHttpOnly, inBrowserElement, sameSite, rawSameSite, schemeMap)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-             """, (originAttributes, name, value, host, path, expiry,
-                   lastAccessed, creationTime, isSecure, isHttpOnly, inBrowserElement, sameSite, rawSameSite, schemeMap))
-             imported_count += 1
-         except Exception as e:
-             print("Error inserting cookie", name, ":", e)
-    conn.commit()
-    conn.close()
-    print("Imported", imported_count, "cookies into Firefox cookies DB at:", firefox_db)
-
-
-def import_local_storage_data(storage_data, profile_dir):
-    """
-    Imports local storage data (a dict mapping origin to key/value dict) into Firefox’s per-site storage.
-    """
-    if profile_dir is None:
-         if os.name == 'posix':
-             base = os.path.expanduser('~/.mozilla/firefox')
-         else:
-             base = os.path.expandvars(r'%APPDATA%\Mozilla\Firefox\Profiles')
-         profiles = glob(os.path.join(base, '*default-release*'))
-         if not profiles:
-             profiles = glob(os.path.join(base, '*default*'))
-         if not profiles:
-             print("Firefox profile not found!")
-             sys.exit(1)
-         profile_dir = profiles[0]
-    origins_imported = 0
-    keys_imported = 0
-    for origin, data in storage_data.items():
-         folder_name = origin.replace("://", "+++")
-         ls_dir = os.path.join(profile_dir, "storage", "default", folder_name, "ls")
-         os.makedirs(ls_dir, exist_ok=True)
-         db_path = os.path.join(ls_dir, "data.sqlite")
-         try:
-             conn = sqlite3.connect(db_path)
-             cur = conn.cursor()
-             cur.execute("PRAGMA foreign_keys=OFF;")
-             cur.execute("BEGIN TRANSACTION;")
-             cur.execute("""
-                CREATE TABLE IF NOT EXISTS database(
-                    origin TEXT NOT NULL,
-                    usage INTEGER NOT NULL DEFAULT 0,
-                    last_vacuum_time INTEGER NOT NULL DEFAULT 0,
-                    last_analyze_time INTEGER NOT NULL DEFAULT 0,
-                    last_vacuum_size INTEGER NOT NULL DEFAULT 0
-                );
-             """)
-             cur.execute("""
-                CREATE TABLE IF NOT EXISTS data(
-                    key TEXT PRIMARY KEY,
-                    utf16_length INTEGER NOT NULL,
-                    conversion_type INTEGER NOT NULL,
-                    compression_type INTEGER NOT NULL,
-                    last_access_time INTEGER NOT NULL DEFAULT 0,
-                    value BLOB NOT NULL
-                );
-             """)
-             cur.execute("INSERT OR REPLACE INTO database VALUES (?, ?, ?, ?, ?);",
-                         (origin, 0, 0, 0, 0))
-             for key, value in data.items():
-                  utf16_length = len(value.encode('utf-16-le')) // 2
-                  conversion_type = 1
-                  compression_type = 0
-                  last_access_time = 0
-                  value_blob = value.encode('utf-8')
-                  try:
-                      cur.execute("""
-                         INSERT OR REPLACE INTO data
-                         (key, utf16_length, conversion_type, compression_type, last_access_time, value)
-                         VALUES (?, ?, ?, ?, ?, ?);
-                      """, (key, utf16_length, conversion_type, compression_type, last_access_time, value_blob))
-                      keys_imported += 1
-                  except Exception as e:
-                      print(f"Error importing key '{key}' for origin {origin}: {e}")
-             conn.commit()
-             conn.close()
-             origins_imported += 1
-             print(f"Imported local storage for origin {origin} with {len(data)} entr{'y' if len(data)==1 else 'ies'}.")
-         except Exception as e:
-             print(f"Error processing origin {origin}: {e}")
-    print(f"Imported local storage for {origins_imported} origin(s) with a total of {keys_imported} entr{'y' if keys_imported==1 else 'ies'}.")
+            to_read.append((site_folder, mtime))
 
+    changes = {}
+    removed = {}
+    mtimes = dict(to_read)
+    for site_folder, origin, site_storage in scan_site_folders([folder for folder, _ in to_read], workers):
+        if site_storage is None:
+            if origin in previous:
+                state[origin] = previous[origin]
+            continue
+        old_hashes = previous.get(origin, {}).get("hashes", {})
+        hashes = {key: _content_hash(value) for key, value in site_storage.items()}
+        changed = {key: value for key, value in site_storage.items() if old_hashes.get(key) != hashes[key]}
+        gone = [key for key in old_hashes if key not in hashes]
+        if changed:
+            changes[origin] = changed
+        if gone:
+            removed[origin] = gone
+        state[origin] = {"mtime": mtimes[site_folder], "hashes": hashes}
 
-def import_all_from_json(import_file, firefox_db=None, default_host=None, profile_dir=None):
-    """
-    Imports both cookies and local storage from a single JSON file.
-
-    The JSON file should have the structure:
+    for origin, entry in previous.items():
+        if origin not in state:
+            removed[origin] = list(entry["hashes"])
+    return changes, removed, state
 
-    {
-       "cookies": [ <list of cookie objects> ],
-       "local_storage": { "<origin>": { "<key>": "<value>", ... }, ... }
-    }
+def export_delta(output_file, watermark_file, db=None, profile_dir=None, workers=1,
+                 format="json", compression="none", domain_filter=None, skip_expired=False):
     """
-    try:
-         with open(import_file, 'r', encoding='utf-8') as f:
-             data = json.load(f)
-    except Exception as e:
-         print("Error reading import file:", e)
-         return
-    if "cookies" in data:
-         import_cookies_data(data["cookies"], firefox_db=firefox_db, default_host=default_host)
-    else:
-         print("No cookies found in import file.")
-    if "local_storage" in data:
-         import_local_storage_data(data["local_storage"], profile_dir=profile_dir)
-    else:
-         print("No local storage found in import file.")
+    Writes only what changed since the export that produced `watermark_file`:
+    added/changed records go to the usual "cookies"/"local_storage" sections (so the
+    file can be imported as-is) and deletions are listed under "removed".
+    A watermark only applies to the `domain_filter` it was recorded with.
+    """
+    if db is None:
+        db = find_firefox_cookies_db()
+    source = {"db": os.path.abspath(db),
+              "profile": os.path.abspath(profile_dir) if profile_dir else None}
+    if domain_filter:
+        source["domains"] = domain_filter.spec()
+    if skip_expired:
+        source["skip_expired"] = True
+    previous = load_watermark(watermark_file, source) or {}
+    cookies, removed_cookies, cookie_state = firefox_cookie_delta(db, previous.get("cookies"), domain_filter,
+                                                                  skip_expired)
+    state = {"version": WATERMARK_VERSION, "source": source, "cookies": cookie_state}
+    removed = {"cookies": removed_cookies}
+    local_storage = {}
+    if profile_dir:
+        local_storage, removed["local_storage"], state["local_storage"] = \
+            firefox_local_storage_delta(profile_dir, previous.get("local_storage"), workers, domain_filter)
+
+    with open_export(output_file, format, compression) as writer:
+        writer.write_cookies(cookies)
+        if profile_dir:
+            writer.write_local_storage(local_storage.items())
+        writer.write_value("removed", removed)
+    save_watermark(watermark_file, state)
+    kind = "full" if not previous else "delta"
+    print(f"Exported {kind}: {len(cookies)} added/changed and {len(removed_cookies)} removed cookie(s)"
+          + (f", changes in {len(local_storage)} and removals in {len(removed.get('local_storage', {}))} local storage origin(s)"
+             if profile_dir else "")
+          + f" to {output_file} (watermark: {watermark_file})")
 
 # ----- Main Program with Argument Parsing -----
 def main():
@@ -771,24 +3796,172 @@ def main():
                         help="Also display or export Firefox local storage (if using Firefox)")
     # New unified import flag:
     parser.add_argument('--import-all', metavar='FILE',
-                        help="Import cookies and local storage from a single JSON file")
+                        help="Import cookies and local storage from a single JSON file (or binary export,\n"
+                             "or --sharded export directory)")
     parser.add_argument('--output', help="Output file to export cookies (and optionally local storage) in JSON format")
+    parser.add_argument('--diff', nargs=2, metavar=('OLD', 'NEW'),
+                        help="Compare two export files. With --output, the differences are written in the\n"
+                             "delta export format; otherwise every change is listed")
+    parser.add_argument('--merge', nargs='+', metavar='FILE',
+                        help="Merge export files, in order, into the --output file")
+    parser.add_argument('--merge-policy', choices=MERGE_POLICIES, default="last-wins",
+                        help="Which copy of a cookie found in several --merge files is kept (default: last-wins)")
+    parser.add_argument('--delta', nargs='?', const='', metavar='WATERMARK',
+                        help="With --firefox --output, only export what changed since the last delta export.\n"
+                             "The state is kept in WATERMARK (default: cookiewrangler.watermark.json next to the output)")
+    parser.add_argument('--format', choices=list(EXPORTERS), default="json",
+                        help="Export file format (default: json): the json or binary export that --import-all\n"
+                             "reads back (detecting the format automatically), Netscape cookies.txt\n"
+                             "(netscape), Playwright/Puppeteer storageState or a HAR cookie array (har)")
+    parser.add_argument('--compress', choices=list(BINARY_COMPRESSION_IDS), default="none",
+                        help="Compression for --format binary exports (default: none)")
+    parser.add_argument('--sharded', action='store_true',
+                        help="With --output, write a directory: cookies in one file per base domain, local\n"
+                             "storage in one file per origin and a manifest.json with the count, size and\n"
+                             "SHA-256 of every file. --import-all only reads the files its filters select")
+    parser.add_argument('--dedup-values', action='store_true',
+                        help="Write each distinct large local storage value once, in a table keyed by its\n"
+                             "SHA-256 digest, and refer to it by digest (json and binary exports)")
+    parser.add_argument('--on-conflict', choices=CONFLICT_POLICIES, default="error",
+                        help="How --import-all treats cookies that already exist in the database: report them\n"
+                             "as errors (default), overwrite them, keep the one expiring later (newer-expiry),\n"
+                             "or keep the existing cookie (keep-existing)")
+    parser.add_argument('--skip-expired', action='store_true',
+                        help="Leave expired cookies out of exports and --import-all")
+    parser.add_argument('--purge-expired', action='store_true',
+                        help="Delete expired cookies from the Firefox cookies database (after --import-all,\n"
+                             "or on its own for --db / the default profile), then reclaim the freed pages\n"
+                             "if the database uses incremental auto_vacuum")
+    parser.add_argument('--ls-compress', action='store_true',
+                        help="Store large imported local storage values Snappy-compressed, as Firefox does")
+    parser.add_argument('--origin', action='append', metavar='ORIGIN',
+                        help="Only read (or with --import-all, import) local storage of this origin,\n"
+                             "e.g. https://example.com (repeatable)")
+    parser.add_argument('--include-domain', action='append', metavar='PATTERN',
+                        help="Only export/import cookies and local storage of hosts matching PATTERN:\n"
+                             "a domain (also matching its subdomains) or a glob like '*.example.*' (repeatable)")
+    parser.add_argument('--exclude-domain', action='append', metavar='PATTERN',
+                        help="Skip hosts matching PATTERN, same syntax as --include-domain (repeatable)")
+    parser.add_argument('--all-profiles', action='store_true',
+                        help="With --firefox --output, export every profile listed in profiles.ini into one file\n"
+                             "with a \"profiles\" object keyed by profile name")
+    parser.add_argument('--split-profiles', action='store_true',
+                        help="With --all-profiles, write one export file per profile (OUTPUT.<profile>.json)")
     parser.add_argument('--db', help="Path to the cookie database file (Chrome or Firefox)")
     parser.add_argument('--default-host', help="Default host/domain to use for cookies missing that field")
     parser.add_argument('--profile-dir', help="Custom Firefox profile directory")
+    parser.add_argument('--chrome-timeout', type=float, default=CHROME_STARTUP_TIMEOUT,
+                        help=f"Seconds allowed for restarting Chrome and reading its cookies (default: {CHROME_STARTUP_TIMEOUT:g})")
+    parser.add_argument('--chrome-ws', metavar='URL',
+                        help="With --chrome, use this DevTools WebSocket (ws://...) of an already running\n"
+                             "browser instead of restarting Chrome")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of threads used to read or write Firefox local storage databases\n"
+                             "and to read the shards of a --sharded export (default: 1)")
+    parser.add_argument('--snapshot', choices=SNAPSHOT_MODES, default="none",
+                        help="How to read the live Firefox databases: directly (none), read-only without\n"
+                             "waiting on locks (ro), or from a point-in-time temp copy (copy). Default: none")
+    parser.add_argument('--stats', nargs='?', const='-', metavar='FILE',
+                        help="Write a JSON report of per-phase timings and row/byte/error counts\n"
+                             "to FILE (default: stderr)")
+    parser.add_argument('--log-level', choices=("debug", "info", "warning", "error"), default="warning",
+                        help="Diagnostic output level; debug also logs per-item progress (default: warning)")
     parser.set_defaults(firefox=True)
     if len(sys.argv) == 1:
         print(usage_text)
         sys.exit(1)
 
     args = parser.parse_args()
+    if args.compress != "none":
+        if args.format != "binary":
+            parser.error("--compress requires --format binary")
+        if args.compress not in available_compressions():
+            parser.error(f"--compress {args.compress} is not available on this Python")
+    if args.merge and not args.output:
+        parser.error("--merge requires --output")
+    exporter = EXPORTERS[args.format]
+    if not exporter["importable"] and (args.diff or args.delta is not None):
+        parser.error(f"--diff and --delta write json or binary files, not --format {args.format}")
+    if not exporter["local_storage"] and args.local_storage and args.output:
+        parser.error(f"--format {args.format} only holds cookies; drop --local-storage")
+    if args.purge_expired and (args.chrome or args.output or args.diff or args.merge):
+        parser.error("--purge-expired works on the Firefox cookies database, on its own or with --import-all")
+    if args.dedup_values:
+        if not args.output or not exporter["importable"]:
+            parser.error("--dedup-values requires --output with --format json or binary")
+        if args.delta is not None or args.diff or (args.all_profiles and not args.split_profiles):
+            parser.error("--dedup-values cannot be combined with --diff, --delta or a combined --all-profiles export")
+    if args.sharded:
+        if not args.output or not exporter["importable"]:
+            parser.error("--sharded requires --output with --format json or binary")
+        if args.delta is not None or args.diff or args.all_profiles:
+            parser.error("--sharded cannot be combined with --diff, --delta or --all-profiles")
+        if args.dedup_values:
+            parser.error("--sharded cannot be combined with --dedup-values: each origin has its own shard,\n"
+                         "so there are no values to share")
+    if args.split_profiles and not args.all_profiles:
+        parser.error("--split-profiles requires --all-profiles")
+    if args.all_profiles:
+        if args.chrome or args.import_all or not args.output:
+            parser.error("--all-profiles exports Firefox profiles and requires --output")
+        if args.delta is not None or args.db or args.profile_dir:
+            parser.error("--all-profiles cannot be combined with --delta, --db or --profile-dir")
+        if args.format != "json" and not args.split_profiles:
+            parser.error(f"--all-profiles with --format {args.format} requires --split-profiles")
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()), format="[%(levelname)s] %(message)s")
+    if args.stats:
+        STATS.enable()
+    try:
+        run_command(args)
+    finally:
+        if args.stats:
+            write_stats_report(args.stats, _command_name(args))
+
+def _command_name(args):
+    if args.diff or args.merge:
+        return "diff" if args.diff else "merge"
+    if args.import_all:
+        return "import-all-chrome" if args.chrome else "import-all"
+    if args.purge_expired:
+        return "purge-expired"
+    action = "show"
+    if args.output:
+        action = "delta-export" if args.delta is not None and not args.chrome else "export"
+    return f"{action}-{'chrome' if args.chrome else 'firefox'}"
+
+def run_command(args):
+    """Runs the import, export or display command selected on the command line."""
+    domain_filter = DomainFilter(args.include_domain, args.exclude_domain) or None
 #    if args.local_storage and args.chrome:
 #        print("Sorry, local storage for chrome is broken! Please omit --local-storage")
 #        sys.exit(1)
-    global LINUX
+    global LINUX, SNAPSHOT_MODE
     LINUX = args.linux
+    SNAPSHOT_MODE = args.snapshot
+
+    if args.diff:
+        diff = diff_exports(*args.diff, domain_filter=domain_filter)
+        if args.output:
+            write_diff(diff, args.output, args.format, args.compress)
+            print(f"Wrote the differences between {args.diff[0]} and {args.diff[1]} to {args.output}")
+        print_diff(diff, details=not args.output)
+        return
+
+    if args.merge:
+        cookies, local_storage, conflicts = merge_exports(args.merge, args.merge_policy, domain_filter)
+        opener = open_sharded_export if args.sharded else open_export
+        with opener(args.output, args.format, args.compress, args.dedup_values) as writer:
+            writer.write_cookies(cookies.values())
+            writer.write_local_storage(local_storage.items())
+        print(f"Merged {len(args.merge)} file(s) into {args.output}: {len(cookies)} cookie(s), "
+              f"{len(local_storage)} local storage origin(s), {conflicts} conflict(s) resolved ({args.merge_policy})")
+        return
 
     # If --import-all is specified, import both cookies and local storage and exit.
+    if args.import_all and args.chrome:
+        import_all_to_chrome(args.import_all, default_host=args.default_host, domain_filter=domain_filter,
+                             skip_expired=args.skip_expired, timeout=args.chrome_timeout, ws_url=args.chrome_ws)
+        return
     if args.import_all:
         if args.profile_dir:
             profile = args.profile_dir
@@ -804,32 +3977,85 @@ def main():
                 print("Firefox profile not found!")
                 sys.exit(1)
             profile = profiles[0]
-        import_all_from_json(args.import_all, firefox_db=args.db, default_host=args.default_host, profile_dir=profile)
+        if not import_all_from_json(args.import_all, firefox_db=args.db, default_host=args.default_host,
+                                    profile_dir=profile, workers=args.workers,
+                                    compress_local_storage=args.ls_compress, domain_filter=domain_filter,
+                                    on_conflict=args.on_conflict, skip_expired=args.skip_expired,
+                                    purge_expired=args.purge_expired, origins=args.origin):
+            sys.exit(1)
+        return
+
+    if args.purge_expired:
+        purge_expired_db(args.db or find_firefox_cookies_db())
         return
 
     # If an output file is specified, export cookies (and optionally local storage) to that file.
+    # Records are streamed into the file as they are read rather than collected first.
     if args.output:
-        result = {}
         if args.chrome:
-            # Get Chrome data
-            cookies = get_chrome_cookies()
-            local_storage = {}
-            if args.local_storage:
-                local_storage = get_chrome_local_storage()
-            result = {
-                "cookies": cookies,
-                "local_storage": local_storage
-            }
+            # Get Chrome data: the LevelDB scan runs while Chrome restarts for the DevTools connection.
+            # The database is opened while Chrome is down, before its startup recovery rewrites
+            # the log and MANIFEST; the pure-Python reader takes no LevelDB lock.
+            local_storage_db = Future()
 
-            # Write to output file
-            with open(args.output, 'w') as f:
-                json.dump(result, f, indent=4, default=str)
-            print(f"Exported Chrome data to {args.output}")
+            def open_local_storage():
+                try:
+                    local_storage_db.set_result(open_chrome_local_storage())
+                except Exception as e:
+                    local_storage_db.set_exception(e)
 
-        else:
-            result["cookies"] = export_firefox_cookies(db=args.db)
+            def chrome_cookies():
+                on_shutdown = open_local_storage if args.local_storage else None
+                try:
+                    cookies = get_chrome_cookies(timeout=args.chrome_timeout, ws_url=args.chrome_ws,
+                                                 on_shutdown=on_shutdown)
+                finally:
+                    if not local_storage_db.done():
+                        local_storage_db.set_exception(RuntimeError("Chrome local storage was not opened"))
+                if domain_filter:
+                    cookies = [cookie for cookie in cookies if domain_filter.matches(cookie.get('domain'))]
+                if args.skip_expired:
+                    now = time.time()
+                    cookies = [cookie for cookie in cookies if not cookie_expired(cookie, now)]
+                return cookies
+
+            def chrome_local_storage():
+                if not args.local_storage:
+                    return ()
+                # With --chrome-ws Chrome keeps running, so there is no moment without it to wait for.
+                db = open_chrome_local_storage() if args.chrome_ws else local_storage_db.result()
+                if db is None:
+                    return ()
+                return get_chrome_local_storage(origins=args.origin, domain_filter=domain_filter, db=db,
+                                                strict=True).items()
+
+            try:
+                export_sections(args.output, [ExportSection("cookies", chrome_cookies),
+                                              ExportSection("local_storage", chrome_local_storage)],
+                                args.format, args.compress, args.dedup_values, args.sharded)
+                print(f"Exported Chrome data to {args.output}")
+            except Exception as e:
+                print("Error exporting Chrome data:", e)
+            return
+
+        if args.all_profiles:
+            profiles = list_firefox_profiles()
+            if not profiles:
+                print("No Firefox profiles found in profiles.ini!")
+                sys.exit(1)
+            try:
+                written = export_profiles(args.output, profiles, local_storage=args.local_storage,
+                                          workers=args.workers, split=args.split_profiles, format=args.format,
+                                          compression=args.compress, domain_filter=domain_filter,
+                                          skip_expired=args.skip_expired, dedup_values=args.dedup_values)
+                print(f"Exported {len(profiles)} Firefox profile(s) to {', '.join(written)}")
+            except Exception as e:
+                print("Error writing to output file:", e)
+            return
+
+        profile = None
         # If the --local-storage flag is provided, also export local storage.
-        if args.local_storage and not args.chrome:  # Chrome local storage is already handled above
+        if args.local_storage:
             if args.profile_dir:
                 profile = args.profile_dir
             else:
@@ -844,10 +4070,26 @@ def main():
                     print("Firefox profile not found!")
                     sys.exit(1)
                 profile = profiles[0]
-            result["local_storage"] = get_firefox_local_storage(profile)
+        if args.delta is not None:
+            watermark = args.delta or os.path.join(dirname(os.path.abspath(args.output)),
+                                                   "cookiewrangler.watermark.json")
+            export_delta(args.output, watermark, db=args.db, profile_dir=profile, workers=args.workers,
+                         format=args.format, compression=args.compress, domain_filter=domain_filter,
+                         skip_expired=args.skip_expired)
+            return
+        cookies = partial(iter_firefox_cookies, db=args.db, domain_filter=domain_filter,
+                          skip_expired=args.skip_expired)
+        if profile:
+            # Local storage streams into the file while the cookies are read in the background;
+            # Firefox keeps at most a few thousand cookies, so collecting them is cheap.
+            sections = [ExportSection("cookies", lambda: list(cookies())),
+                        ExportSection("local_storage", partial(iter_firefox_local_storage, profile,
+                                                               workers=args.workers, origins=args.origin,
+                                                               domain_filter=domain_filter), streaming=True)]
+        else:
+            sections = [ExportSection("cookies", cookies, streaming=True)]
         try:
-            with open(args.output, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2)
+            export_sections(args.output, sections, args.format, args.compress, args.dedup_values, args.sharded)
             if args.local_storage:
                 print(f"Exported cookies and local storage to {args.output}")
             else:
@@ -857,10 +4099,15 @@ def main():
         return
     if args.chrome:
         # Fetch cookies and local storage (if requested)
-        cookies = get_chrome_cookies()
+        cookies = get_chrome_cookies(timeout=args.chrome_timeout, ws_url=args.chrome_ws)
+        if domain_filter:
+            cookies = [cookie for cookie in cookies if domain_filter.matches(cookie.get('domain'))]
+        if args.skip_expired:
+            now = time.time()
+            cookies = [cookie for cookie in cookies if not cookie_expired(cookie, now)]
         local_storage = {}
         if args.local_storage:
-            local_storage = get_chrome_local_storage()
+            local_storage = get_chrome_local_storage(origins=args.origin, domain_filter=domain_filter)
         # Format for JSON output
         result = {
             "cookies": cookies,
@@ -921,7 +4168,7 @@ def main():
                         print("Firefox profile not found!")
                         sys.exit(1)
                     profile = profiles[0]
-                local_storage = get_firefox_local_storage(profile)
+                local_storage = get_firefox_local_storage(profile, workers=args.workers, domain_filter=domain_filter)
                 print("################# Firefox Local Storage #############################")
                 for key, value in local_storage.items():
                     print(f"{key}: {value}")
@@ -0,0 +1,159 @@
+"""
+A stand-in for the Chrome DevTools WebSocket, so that the Chrome import can be
+tested without a browser. It speaks just enough of RFC 6455 (masked text frames
+and close) to serve one websocket-client connection, and answers the CDP methods
+CookieWrangler uses: Network.setCookies, Network.setCookie and Network.getAllCookies.
+
+Requests are answered once the client stops sending (the connection has been idle
+for `settle` seconds), in shuffled order and after an event notification, so that
+the client has to match responses by message id. The most requests that were
+waiting for an answer at once is kept in `max_in_flight`.
+"""
+
+import base64
+import hashlib
+import json
+import random
+import socket
+import struct
+import threading
+from collections import Counter
+
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+INVALID_PARAMS = -32602
+
+
+class StubDevToolsServer:
+    """
+    Serves one DevTools connection on a background thread. Cookies named in
+    `reject_names` are refused: a Network.setCookies batch holding one fails as a
+    whole, and Network.setCookie answers with an error. A Network.setCookie without
+    domain or url is answered with success: false, as Chrome does.
+    """
+
+    def __init__(self, reject_names=("bad",), settle=0.005, seed=0):
+        self.reject_names = set(reject_names)
+        self.settle = settle
+        self.random = random.Random(seed)
+        self.cookies = {}
+        self.calls = Counter()
+        self.max_in_flight = 0
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(1)
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.sock.getsockname()[1]}/devtools/browser/stub"
+
+    def close(self):
+        self.sock.close()
+        self.thread.join(5)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ----- WebSocket framing -----
+
+    @staticmethod
+    def _read_exact(conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def _read_frame(self, conn):
+        head = self._read_exact(conn, 2)
+        opcode, length = head[0] & 0x0F, head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", self._read_exact(conn, 2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self._read_exact(conn, 8))[0]
+        mask = self._read_exact(conn, 4) if head[1] & 0x80 else b"\0\0\0\0"
+        payload = self._read_exact(conn, length)
+        return opcode, bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+
+    @staticmethod
+    def _send(conn, message):
+        data = json.dumps(message).encode("utf-8")
+        if len(data) < 126:
+            head = struct.pack(">BB", 0x81, len(data))
+        elif len(data) < 1 << 16:
+            head = struct.pack(">BBH", 0x81, 126, len(data))
+        else:
+            head = struct.pack(">BBQ", 0x81, 127, len(data))
+        conn.sendall(head + data)
+
+    def _handshake(self, conn):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            request += conn.recv(4096)
+        key = next(line.split(b":", 1)[1].strip() for line in request.split(b"\r\n")
+                   if line.lower().startswith(b"sec-websocket-key:"))
+        accept = base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID).digest())
+        conn.sendall(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                     b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+
+    def _serve(self):
+        try:
+            conn, _ = self.sock.accept()
+        except OSError:
+            return
+        with conn:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._handshake(conn)
+            waiting = []
+            while True:
+                conn.settimeout(self.settle if waiting else None)
+                try:
+                    opcode, payload = self._read_frame(conn)
+                except socket.timeout:
+                    self._flush(conn, waiting)
+                    continue
+                except (EOFError, OSError):
+                    return
+                if opcode == 0x8:
+                    return
+                request = json.loads(payload)
+                self.calls[request["method"]] += 1
+                waiting.append(self._answer(request))
+                self.max_in_flight = max(self.max_in_flight, len(waiting))
+
+    def _flush(self, conn, waiting):
+        self.random.shuffle(waiting)
+        self._send(conn, {"method": "Network.loadingFinished", "params": {}})
+        for response in waiting:
+            self._send(conn, response)
+        waiting.clear()
+
+    # ----- CDP methods -----
+
+    def _store(self, param):
+        self.cookies[(param["name"], param.get("domain") or param.get("url"), param.get("path"))] = param
+
+    def _answer(self, request):
+        message_id, method, params = request["id"], request["method"], request.get("params", {})
+        if method == "Network.setCookies":
+            if any(param.get("name") in self.reject_names for param in params["cookies"]):
+                return {"id": message_id, "error": {"code": INVALID_PARAMS, "message": "Invalid cookie fields"}}
+            for param in params["cookies"]:
+                self._store(param)
+            return {"id": message_id, "result": {}}
+        if method == "Network.setCookie":
+            if params.get("name") in self.reject_names:
+                return {"id": message_id, "error": {"code": INVALID_PARAMS, "message": "Invalid cookie fields"}}
+            if "domain" not in params and "url" not in params:
+                return {"id": message_id, "result": {"success": False}}
+            self._store(params)
+            return {"id": message_id, "result": {"success": True}}
+        if method == "Network.getAllCookies":
+            return {"id": message_id, "result": {"cookies": list(self.cookies.values())}}
+        return {"id": message_id, "error": {"code": -32601, "message": f"'{method}' wasn't found"}}
@@ -0,0 +1,162 @@
+"""
+Tests for the binary export format (--format binary): round-trips with every
+--compress codec, --dedup-values records, header detection and bad headers.
+
+    python -m pytest tests
+"""
+
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import CookieWrangler as cw
+
+
+def firefox_cookie(i, **fields):
+    cookie = {"originAttributes": "^userContextId=1" if i % 2 else "", "name": f"cookie{i}",
+              "value": f"välue-{i}", "host": f".site{i % 3}.example.com", "path": "/", "expiry": 2000000000 + i,
+              "isSecure": 1, "isHttpOnly": i % 2, "inBrowserElement": 0, "sameSite": 1, "rawSameSite": 1,
+              "schemeMap": 2, "baseDomain": f"site{i % 3}.example.com"}
+    cookie.update(fields)
+    return cookie
+
+COOKIES = [firefox_cookie(i) for i in range(20)] + [
+    # JSON fallback records: a Chrome cookie, and a Firefox cookie that does not fit the fixed layout.
+    {"name": "sid", "value": "1", "domain": ".chrome.example.com", "path": "/", "expires": 1.5e9,
+     "httpOnly": True, "secure": True, "session": False, "sameSite": None},
+    firefox_cookie(99, expiry=None),
+]
+
+LARGE = "shared-" + "x" * 1000
+LOCAL_STORAGE = [
+    ("https://a.example.com", {"small": "v", "large": LARGE, "ünïcode": "値 🍪"}),
+    ("https://b.example.com", {"large": LARGE, "other": "y" * 300}),
+]
+
+
+class BinaryExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def export(self, name, format="binary", compression="none", dedup_values=False):
+        path = self.path(name)
+        with contextlib.redirect_stdout(io.StringIO()), \
+                cw.open_export(path, format, compression, dedup_values) as writer:
+            writer.write_cookies(COOKIES)
+            writer.write_local_storage(LOCAL_STORAGE)
+        return path
+
+    def read(self, path):
+        with cw.open_import_events(path) as events:
+            return [(event[0], dict(event[1])) if event[0] == "cookie" else event for event in events]
+
+    def expected_events(self):
+        events = [("cookie", cookie) for cookie in COOKIES]
+        for origin, storage in LOCAL_STORAGE:
+            events.extend(("local_storage", origin, key, value) for key, value in storage.items())
+        return events
+
+    def test_round_trip_with_every_compression(self):
+        for compression in cw.available_compressions():
+            with self.subTest(compression):
+                path = self.export(f"export.{compression}", compression=compression)
+                with open(path, 'rb') as f:
+                    header = f.read(cw.BINARY_HEADER.size)
+                self.assertEqual(cw.BINARY_HEADER.unpack(header),
+                                 (cw.BINARY_MAGIC, cw.BINARY_VERSION, cw.BINARY_COMPRESSION_IDS[compression]))
+                self.assertEqual(self.read(path), self.expected_events())
+
+    def test_matches_the_json_export(self):
+        self.assertEqual(self.read(self.export("export.bin")), self.read(self.export("export.json", "json")))
+
+    def test_fixed_layout_and_json_fallback_records(self):
+        with open(self.export("export.bin"), 'rb') as f:
+            f.read(cw.BINARY_HEADER.size)
+            kinds = []
+            while True:
+                header = f.read(cw.RECORD_HEADER.size)
+                if not header:
+                    break
+                kind, length = cw.RECORD_HEADER.unpack(header)
+                f.read(length)
+                kinds.append(kind)
+        self.assertEqual(kinds[:20], [cw.REC_COOKIE] * 20)
+        self.assertEqual(kinds[20:22], [cw.REC_COOKIE_JSON] * 2)
+        self.assertEqual(kinds[22:], [cw.REC_LOCAL_STORAGE] * 5)
+
+    def test_dedup_values_round_trip(self):
+        for compression in cw.available_compressions():
+            with self.subTest(compression):
+                path = self.export(f"dedup.{compression}", compression=compression, dedup_values=True)
+                with open(path, 'rb') as f:
+                    self.assertEqual(f.read(cw.BINARY_HEADER.size)[4], cw.BINARY_DEDUP_VERSION)
+                self.assertEqual(self.read(path), self.expected_events())
+        with open(self.export("plain.bin"), 'rb') as f:
+            self.assertEqual(f.read().count(LARGE.encode()), 2)
+        with open(self.export("dedup.bin", dedup_values=True), 'rb') as f:
+            self.assertEqual(f.read().count(LARGE.encode()), 1)
+
+    def test_dedup_reference_to_unknown_value(self):
+        payload = cw.LOCAL_STORAGE_REF_RECORD.pack(3, 1) + b"abck" + b"\x00" * cw.DIGEST_SIZE
+        data = (cw.BINARY_HEADER.pack(cw.BINARY_MAGIC, cw.BINARY_DEDUP_VERSION, 0)
+                + cw.RECORD_HEADER.pack(cw.REC_LOCAL_STORAGE_REF, len(payload)) + payload)
+        with open(self.path("bad.bin"), 'wb') as f:
+            f.write(data)
+        with self.assertRaisesRegex(ValueError, "unknown value"):
+            self.read(self.path("bad.bin"))
+
+    def write_raw(self, data):
+        path = self.path("raw.bin")
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_bad_headers(self):
+        with open(self.export("export.bin"), "rb") as f:
+            records = f.read()[cw.BINARY_HEADER.size:]
+        cases = {
+            # Without the magic the file is read as JSON, which it is not.
+            "bad magic": b"CWBY\x01\x00" + records,
+            "unsupported version": cw.BINARY_HEADER.pack(cw.BINARY_MAGIC, 3, 0) + records,
+            "unknown compression": cw.BINARY_HEADER.pack(cw.BINARY_MAGIC, cw.BINARY_VERSION, 9) + records,
+            "short header": cw.BINARY_MAGIC,
+            "truncated record": cw.BINARY_HEADER.pack(cw.BINARY_MAGIC, cw.BINARY_VERSION, 0) + records[:-3],
+            "truncated record header": cw.BINARY_HEADER.pack(cw.BINARY_MAGIC, cw.BINARY_VERSION, 0) + records[:2],
+        }
+        for name, data in cases.items():
+            with self.subTest(name), self.assertRaises(ValueError):
+                self.read(self.write_raw(data))
+
+    def test_empty_binary_export(self):
+        path = self.write_raw(cw.BINARY_HEADER.pack(cw.BINARY_MAGIC, cw.BINARY_VERSION, 0))
+        self.assertEqual(self.read(path), [])
+
+    def test_import_all_detects_binary(self):
+        db = self.path("cookies.sqlite")
+        profile = self.path("profile")
+        os.makedirs(profile)
+        path = self.export("export.lzma", compression="lzma", dedup_values=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(cw.import_all_from_json(path, firefox_db=db, profile_dir=profile))
+        conn = sqlite3.connect(db)
+        try:
+            # All but the Chrome cookie, which has no host.
+            self.assertEqual(conn.execute("SELECT count(*) FROM moz_cookies").fetchone()[0], 21)
+        finally:
+            conn.close()
+        self.assertEqual(len(os.listdir(os.path.join(profile, "storage", "default"))), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
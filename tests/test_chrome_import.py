@@ -0,0 +1,105 @@
+"""
+Tests for the Chrome cookie import (--chrome --import-all) against the stand-in
+DevTools server in cdp_stub.py.
+
+    python -m pytest tests
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import CookieWrangler as cw
+from cdp_stub import StubDevToolsServer
+
+
+def firefox_cookie(name, host, secure=True):
+    return {"name": name, "value": f"value-{name}", "host": host, "path": "/", "expiry": 2000000000,
+            "isSecure": int(secure), "isHttpOnly": 0, "sameSite": 0}
+
+
+class ChromeImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_export(self, cookies, local_storage=()):
+        path = os.path.join(self.tmp.name, "export.json")
+        with cw.open_export(path) as writer:
+            writer.write_cookies(cookies)
+            writer.write_local_storage(local_storage)
+        return path
+
+    def import_all(self, server, path, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return cw.import_all_to_chrome(path, ws_url=server.url, timeout=10, **kwargs)
+
+    def test_imports_all_cookies(self):
+        cookies = [firefox_cookie(f"c{i}", f".site{i % 40}.example.com") for i in range(1200)]
+        with StubDevToolsServer() as server:
+            summary = self.import_all(server, self.write_export(cookies))
+        self.assertEqual(summary["imported"], 1200)
+        self.assertEqual(summary["failed"], [])
+        self.assertEqual(len(server.cookies), 1200)
+        self.assertEqual(server.calls["Network.setCookies"], 3)
+        self.assertNotIn("Network.setCookie", server.calls)
+
+    def test_rejected_chunk_reports_each_failed_cookie(self):
+        cookies = [firefox_cookie(f"c{i}", f".site{i % 40}.example.com") for i in range(1200)]
+        cookies[7] = firefox_cookie("bad", ".rejected.example.com")
+        cookies[700] = firefox_cookie("bad", "host-only.example.com", secure=False)
+        with StubDevToolsServer() as server:
+            summary = self.import_all(server, self.write_export(cookies))
+        self.assertEqual(summary["imported"], 1198)
+        self.assertEqual(summary["error_count"], 2)
+        self.assertEqual([(param.get("domain") or param.get("url"), message) for param, message in summary["failed"]],
+                         [(".rejected.example.com", "Invalid cookie fields"),
+                          ("http://host-only.example.com/", "Invalid cookie fields")])
+        # Both rejected chunks were retried cookie by cookie, never more than in_flight at once.
+        self.assertEqual(server.calls["Network.setCookie"], 1000)
+        self.assertLessEqual(server.max_in_flight, cw.CDP_MAX_IN_FLIGHT)
+        self.assertEqual(len(server.cookies), 1198)
+
+    def test_filters_and_skips_local_storage(self):
+        cookies = [firefox_cookie("a", ".keep.example.com"), firefox_cookie("b", ".drop.example.com"),
+                   firefox_cookie("old", ".keep.example.com")]
+        cookies[2]["expiry"] = 1000
+        path = self.write_export(cookies, [("https://keep.example.com", {"key": "value"})])
+        with StubDevToolsServer() as server:
+            summary = self.import_all(server, path, domain_filter=cw.DomainFilter(["keep.example.com"], None),
+                                      skip_expired=True)
+        self.assertEqual(summary["imported"], 1)
+        self.assertEqual([key[0] for key in server.cookies], ["a"])
+
+    def test_get_chrome_cookies_over_ws_url(self):
+        cw.STATS.enable()
+        self.addCleanup(setattr, cw.STATS, "enabled", False)
+        timings = {}
+        with StubDevToolsServer() as server:
+            server.cookies[("a", ".example.com", "/")] = {"name": "a", "value": "1", "domain": ".example.com",
+                                                          "path": "/"}
+            cookies = cw.get_chrome_cookies(timeout=10, ws_url=server.url, timings=timings)
+        self.assertEqual([cookie["name"] for cookie in cookies], ["a"])
+        phases = cw.STATS.report("test")["phases"]
+        self.assertEqual(phases["chrome_time_to_first_cookie"], round(timings["time_to_first_cookie"], 6))
+        self.assertIn("chrome_fetch", phases)
+
+    def test_no_time_to_first_cookie_without_cookies(self):
+        cw.STATS.enable()
+        self.addCleanup(setattr, cw.STATS, "enabled", False)
+        timings = {}
+        with StubDevToolsServer() as server:
+            self.assertEqual(cw.get_chrome_cookies(timeout=0.5, ws_url=server.url, timings=timings), [])
+        self.assertIn("fetch", timings)
+        self.assertNotIn("time_to_first_cookie", timings)
+        self.assertNotIn("chrome_time_to_first_cookie", cw.STATS.report("test")["phases"])
+
+
+if __name__ == "__main__":
+    unittest.main()
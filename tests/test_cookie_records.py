@@ -0,0 +1,59 @@
+"""
+Tests for CookieRecord, the compact in-memory form of a Firefox cookie.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import CookieWrangler as cw
+
+
+def cookie_dict(i, host=".example.com", **fields):
+    cookie = {"originAttributes": "", "name": f"c{i}", "value": str(i), "host": host, "path": "/",
+              "expiry": 2000000000, "isSecure": 1, "isHttpOnly": 0, "inBrowserElement": 0, "sameSite": 0,
+              "rawSameSite": 0, "schemeMap": 2, "baseDomain": "example.com"}
+    cookie.update(fields)
+    return cookie
+
+
+class CookieRecordTest(unittest.TestCase):
+
+    def test_round_trips_dicts(self):
+        cookie = cookie_dict(1)
+        record = cw.CookieRecord.from_dict(cookie)
+        self.assertIsInstance(record, cw.CookieRecord)
+        self.assertEqual(record.to_dict(), cookie)
+        self.assertEqual(record, cookie)
+        self.assertEqual(record.get("host"), ".example.com")
+        self.assertIsNone(record.get("domain"))
+        self.assertNotEqual(record, cookie_dict(1, value="other"))
+
+    def test_shares_strings_between_records(self):
+        # Built at run time, so the two hosts start out as different objects.
+        first = cw.CookieRecord.from_dict(cookie_dict(1, host="".join([".shared", ".example.com"])))
+        second = cw.CookieRecord.from_dict(cookie_dict(2, host="".join([".shared.", "example.com"])))
+        self.assertIs(first.host, second.host)
+        self.assertIs(first.path, second.path)
+
+    def test_derives_base_domain_from_host(self):
+        row = ("", "n", "v", ".a.example.com", "/", 1, 0, 0, 0, 0, 0, 0)
+        self.assertEqual(cw.CookieRecord(*row).baseDomain, "a.example.com")
+        self.assertEqual(cw.CookieRecord(*row[:3], None, *row[4:]).baseDomain, "")
+
+    def test_other_shapes_stay_dicts(self):
+        chrome = {"name": "sid", "value": "1", "domain": ".example.com", "path": "/"}
+        self.assertIs(cw.CookieRecord.from_dict(chrome), chrome)
+        unhashable = cookie_dict(1, host=["not", "a", "host"])
+        self.assertIs(cw.CookieRecord.from_dict(unhashable), unhashable)
+        renamed = cookie_dict(1)
+        renamed["domain"] = renamed.pop("host")
+        self.assertIs(cw.CookieRecord.from_dict(renamed), renamed)
+
+
+if __name__ == '__main__':
+    unittest.main()
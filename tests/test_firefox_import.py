@@ -0,0 +1,183 @@
+"""
+Tests for the Firefox import (--import-all) into a cookies database and profile
+directory created in a temporary directory.
+
+    python -m pytest tests
+"""
+
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import CookieWrangler as cw
+
+
+def firefox_cookie(name, host, expiry=2000000000, value=None):
+    return {"name": name, "value": value or f"value-{name}", "host": host, "path": "/", "expiry": expiry,
+            "isSecure": 1, "isHttpOnly": 0, "sameSite": 0}
+
+
+class FirefoxImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db = self.path("cookies.sqlite")
+        self.profile = self.path("profile")
+        os.makedirs(self.profile)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def write_export(self, cookies, local_storage=(), name="export.json"):
+        path = self.path(name)
+        with cw.open_export(path) as writer:
+            writer.write_cookies(cookies)
+            writer.write_local_storage(local_storage)
+        return path
+
+    def import_all(self, path, **kwargs):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            ok = cw.import_all_from_json(path, firefox_db=self.db, profile_dir=self.profile, **kwargs)
+        return ok, out.getvalue()
+
+    def cookie_values(self):
+        conn = sqlite3.connect(self.db)
+        try:
+            return dict(conn.execute("SELECT name, value FROM moz_cookies"))
+        finally:
+            conn.close()
+
+    def test_imports_cookies_and_local_storage(self):
+        path = self.write_export([firefox_cookie("a", ".example.com")],
+                                 [("https://example.com", {"k": "v"})])
+        ok, out = self.import_all(path)
+        self.assertTrue(ok)
+        self.assertEqual(self.cookie_values(), {"a": "value-a"})
+        self.assertIn("Imported local storage for 1 origin(s)", out)
+
+    def test_database_error_fails_the_import(self):
+        with open(self.db, 'w') as f:
+            f.write("not a database, but long enough to have a header" * 4)
+        path = self.write_export([firefox_cookie("a", ".example.com")])
+        ok, out = self.import_all(path)
+        self.assertFalse(ok)
+        self.assertIn("Error writing imported data: file is not a database", out)
+        self.assertNotIn("Error reading import file", out)
+
+    def test_truncated_file_fails_and_still_purges(self):
+        self.import_all(self.write_export([firefox_cookie("old", ".example.com", expiry=1)], name="old.json"))
+        path = self.write_export([firefox_cookie(f"c{i}", ".example.com") for i in range(100)])
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        ok, out = self.import_all(path, purge_expired=True)
+        self.assertFalse(ok)
+        self.assertIn("Error reading import file", out)
+        self.assertIn("Purged 1 expired cookie(s)", out)
+
+    def test_missing_file_fails(self):
+        ok, out = self.import_all(self.path("missing.json"))
+        self.assertFalse(ok)
+        self.assertIn("Error reading import file", out)
+
+    def test_combined_profiles_export_is_rejected(self):
+        path = self.path("all_profiles.json")
+        with cw.open_export(path) as writer:
+            writer.write_objects("profiles", [("default", lambda w: w.write_cookies([firefox_cookie("a", ".a.com")]))])
+        ok, out = self.import_all(path)
+        self.assertFalse(ok)
+        self.assertIn("--split-profiles", out)
+        self.assertNotIn("No cookies found", out)
+        self.assertFalse(os.path.exists(self.db))
+
+
+class ConflictPolicyTest(unittest.TestCase):
+    """bulk_import_cookies() with each of CONFLICT_POLICIES, into a database that already has "a" and "b"."""
+
+    EXISTING = [firefox_cookie("a", ".example.com", expiry=2000000000, value="old-a"),
+                firefox_cookie("b", ".example.com", expiry=2000000000, value="old-b")]
+    # "a" expires later than the stored cookie, "b" earlier, and "c" is new.
+    IMPORTED = [firefox_cookie("a", ".example.com", expiry=2100000000, value="new-a"),
+                firefox_cookie("b", ".example.com", expiry=1900000000, value="new-b"),
+                firefox_cookie("c", ".example.com", value="new-c")]
+
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.addCleanup(self.conn.close)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cw.bulk_import_cookies(self.conn, self.EXISTING)
+        self.created = dict(self.conn.execute("SELECT name, creationTime FROM moz_cookies"))
+
+    def import_with(self, policy):
+        summary = cw.bulk_import_cookies(self.conn, self.IMPORTED, on_conflict=policy)
+        rows = self.conn.execute("SELECT name, value, expiry FROM moz_cookies")
+        return summary, {name: (value, expiry) for name, value, expiry in rows}
+
+    def assert_counts(self, summary, imported, updated, unchanged, errors=0):
+        self.assertEqual((summary["imported"], summary["updated"], summary["unchanged"], summary["error_count"]),
+                         (imported, updated, unchanged, errors))
+
+    def assert_creation_times_kept(self):
+        created = dict(self.conn.execute("SELECT name, creationTime FROM moz_cookies WHERE name IN ('a', 'b')"))
+        self.assertEqual(created, self.created)
+
+    def test_error_reports_existing_cookies(self):
+        summary, cookies = self.import_with("error")
+        self.assert_counts(summary, 1, 0, 0, errors=2)
+        self.assertEqual([item for item, _ in summary["errors"]], ["a (.example.com)", "b (.example.com)"])
+        self.assertEqual(cookies, {"a": ("old-a", 2000000000), "b": ("old-b", 2000000000),
+                                   "c": ("new-c", 2000000000)})
+
+    def test_overwrite(self):
+        summary, cookies = self.import_with("overwrite")
+        self.assert_counts(summary, 1, 2, 0)
+        self.assertEqual(cookies, {"a": ("new-a", 2100000000), "b": ("new-b", 1900000000),
+                                   "c": ("new-c", 2000000000)})
+        self.assert_creation_times_kept()
+
+    def test_newer_expiry(self):
+        summary, cookies = self.import_with("newer-expiry")
+        self.assert_counts(summary, 1, 1, 1)
+        self.assertEqual(cookies, {"a": ("new-a", 2100000000), "b": ("old-b", 2000000000),
+                                   "c": ("new-c", 2000000000)})
+        self.assert_creation_times_kept()
+
+    def test_keep_existing(self):
+        summary, cookies = self.import_with("keep-existing")
+        self.assert_counts(summary, 1, 0, 2)
+        self.assertEqual(cookies, {"a": ("old-a", 2000000000), "b": ("old-b", 2000000000),
+                                   "c": ("new-c", 2000000000)})
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            cw.bulk_import_cookies(self.conn, self.IMPORTED, on_conflict="merge")
+
+    def test_import_all_passes_the_policy(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "export.json")
+            with cw.open_export(path) as writer:
+                writer.write_cookies(self.IMPORTED)
+            db = os.path.join(tmp, "cookies.sqlite")
+            conn = sqlite3.connect(db)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    cw.bulk_import_cookies(conn, self.EXISTING)
+                    self.assertTrue(cw.import_all_from_json(path, firefox_db=db, profile_dir=tmp,
+                                                            on_conflict="newer-expiry"))
+                self.assertEqual(dict(conn.execute("SELECT name, value FROM moz_cookies")),
+                                 {"a": "new-a", "b": "old-b", "c": "new-c"})
+            finally:
+                conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Tests for the incremental JSON reader behind --import-all (JsonStreamReader and
+iter_export_events), fed in chunks small enough to split every token.
+
+    python -m pytest tests
+"""
+
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import CookieWrangler as cw
+
+DOCUMENT = {
+    "unknown": {"nested": [1, {"deep": [None, True, False]}], "text": "skip me"},
+    "cookies": [
+        {"name": "quote\"d", "value": "back\\slash \n tab\t", "host": ".example.com", "path": "/",
+         "expiry": 2000000000, "isSecure": 1, "extra": {"list": [1.5, -2e-3, 12345678901234567890]}},
+        {"name": "unicode", "value": "é 値 🍪  ", "host": "example.org", "path": "/a/b", "expiry": -1},
+    ],
+    "local_storage": {
+        "https://example.com": {"k\"ey": "v\\alue", "json": "{\"a\": [1, 2]}", "empty": ""},
+        "https://skipped.example.com": ["not", "an", "object"],
+        "https://example.org": {},
+        "https://example.net": {"n": "🍪" * 50},
+    },
+    "exported": 1700000000.125,
+}
+
+EXPECTED = [("cookie", cookie) for cookie in DOCUMENT["cookies"]] + [
+    ("local_storage", "https://example.com", "k\"ey", "v\\alue"),
+    ("local_storage", "https://example.com", "json", "{\"a\": [1, 2]}"),
+    ("local_storage", "https://example.com", "empty", ""),
+    ("local_storage", "https://example.net", "n", "🍪" * 50),
+]
+
+
+class ChunkedReader(io.StringIO):
+    """A text file that returns at most `limit` characters per read()."""
+
+    def __init__(self, text, limit):
+        super().__init__(text)
+        self.limit = limit
+
+    def read(self, size=-1):
+        return super().read(self.limit if size < 0 else min(size, self.limit))
+
+
+def events(text, limit=None):
+    f = ChunkedReader(text, limit) if limit else io.StringIO(text)
+    return list(cw.iter_export_events(f))
+
+
+class JsonStreamReaderTest(unittest.TestCase):
+
+    def test_reads_whole_document(self):
+        self.assertEqual(events(json.dumps(DOCUMENT)), EXPECTED)
+
+    def test_every_chunk_boundary(self):
+        # Both the compact form (tokens back to back, escapes raw) and the ASCII-escaped one.
+        for text in (json.dumps(DOCUMENT, separators=(",", ":"), ensure_ascii=False),
+                     json.dumps(DOCUMENT, indent=2)):
+            for chunk_size in (1, 2, 3, 5, 7, 13):
+                with self.subTest(chunk_size=chunk_size, ascii=text.isascii()):
+                    self.assertEqual(events(text, limit=chunk_size), EXPECTED)
+
+    def test_numbers_split_at_the_buffer_end(self):
+        for number in ("7", "12345", "-0.5", "1e10", "2.5E-3", "12345678901234567890"):
+            text = '{"cookies": [{"expiry": %s}, %s]}' % (number, number)
+            for chunk_size in range(1, len(text)):
+                with self.subTest(number=number, chunk_size=chunk_size):
+                    self.assertEqual(events(text, limit=chunk_size),
+                                     [("cookie", {"expiry": json.loads(number)}), ("cookie", json.loads(number))])
+
+    def test_truncated_input_raises(self):
+        text = json.dumps(DOCUMENT, separators=(",", ":"))
+        for end in range(len(text)):
+            with self.subTest(end=end), self.assertRaises(ValueError):
+                events(text[:end], limit=4)
+
+    def test_malformed_input_raises(self):
+        cases = ['[]', '{"cookies": [1 2]}', '{"cookies": [1,]}', '{"a" 1}', '{"a": 1,}',
+                 '{"local_storage": {"o": {"k": tru}}}', '{"a": "unterminated}', '{} {}', '{"a": 1} x']
+        for text in cases:
+            with self.subTest(text), self.assertRaises(ValueError):
+                events(text, limit=3)
+
+    def test_empty_sections(self):
+        self.assertEqual(events('{"cookies": [], "local_storage": {}}'), [])
+        self.assertEqual(events(' \n{ } \n'), [])
+
+    def test_expands_deduplicated_values(self):
+        digest = "ab" * 32
+        text = json.dumps({"values": {digest: "shared " * 100},
+                           "local_storage": {"https://a.com": {"k": {"$ref": digest}, "plain": {"x": 1}}}})
+        self.assertEqual(events(text, limit=5),
+                         [("local_storage", "https://a.com", "k", "shared " * 100),
+                          ("local_storage", "https://a.com", "plain", {"x": 1})])
+        with self.assertRaisesRegex(ValueError, "unknown value"):
+            events(text.replace(digest + '"}', "cd" * 32 + '"}'))
+
+    def test_iter_object_and_array(self):
+        reader = cw.JsonStreamReader(ChunkedReader('{"a": [1, [2, 3], {"b": "]"}], "c": {}}', 2), chunk_size=2)
+        seen = []
+        for key in reader.iter_object():
+            if key == "a":
+                seen.append((key, list(reader.iter_array())))
+            else:
+                seen.append((key, list(reader.iter_object())))
+        self.assertEqual(seen, [("a", [1, [2, 3], {"b": "]"}]), ("c", [])])
+
+
+if __name__ == '__main__':
+    unittest.main()
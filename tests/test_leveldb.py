@@ -0,0 +1,196 @@
+"""
+Tests for the pure-Python LevelDB reader (LevelDBReader) and the Chrome local
+storage read on top of it, on databases written with benchmark.py's LevelDB
+writer. If plyvel is installed, the fixtures are also checked against it.
+
+    python -m pytest tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import CookieWrangler as cw
+from benchmark import (leveldb_batch, leveldb_internal_key, make_chrome_local_storage, write_leveldb_log,
+                       write_leveldb_manifest, write_leveldb_table)
+
+try:
+    import plyvel
+except ImportError:
+    plyvel = None
+
+DELETE = cw.LEVELDB_DELETION
+
+
+def table_entries(*entries):
+    """(user key, sequence, value) triples, value None for a deletion, as sorted SSTable entries."""
+    internal = []
+    for key, sequence, value in entries:
+        kind = DELETE if value is None else cw.LEVELDB_VALUE
+        internal.append((leveldb_internal_key(key, sequence, kind), value or b""))
+    internal.sort(key=lambda entry: (entry[0][:-8], -int.from_bytes(entry[0][-8:], 'little')))
+    return internal
+
+
+class LevelDBReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = self.tmp.name
+
+    def make_db(self, tables=(), log=(), deleted=(), log_number=3, block_size=4096):
+        """
+        Writes numbered tables, each a list of (key, sequence, value) triples, and a
+        write-ahead log of (sequence, operations) batches, plus the MANIFEST.
+        """
+        live = []
+        last_sequence = 0
+        for number, entries in tables:
+            result = write_leveldb_table(os.path.join(self.path, f"{number:06d}.ldb"),
+                                         table_entries(*entries), block_size=block_size)
+            live.append((0, number, result))
+            last_sequence = max([last_sequence] + [sequence for _, sequence, _ in entries])
+        write_leveldb_log(os.path.join(self.path, f"{log_number:06d}.log"),
+                          [leveldb_batch(sequence, operations) for sequence, operations in log])
+        write_leveldb_manifest(self.path, live, log_number=log_number, last_sequence=last_sequence,
+                               deleted=deleted)
+
+    def read(self, **kwargs):
+        with cw.LevelDBReader(self.path) as db:
+            return list(db.iterator(**kwargs))
+
+    def assert_plyvel_agrees(self, entries):
+        if plyvel is None:
+            return
+        copy = os.path.join(self.path, "plyvel")
+        shutil.copytree(self.path, copy, ignore=shutil.ignore_patterns("plyvel"))
+        db = plyvel.DB(copy, create_if_missing=False)
+        try:
+            self.assertEqual(entries, list(db.iterator()))
+        finally:
+            db.close()
+
+    def test_merges_tables_and_log_in_key_order(self):
+        self.make_db(tables=[(5, [(b"a", 1, b"1"), (b"d", 2, b"4")]),
+                             (6, [(b"b", 3, b"2"), (b"e", 4, b"5")])],
+                     log=[(5, [(b"c", b"3"), (b"f", b"6")])])
+        entries = self.read()
+        self.assertEqual(entries, [(b"a", b"1"), (b"b", b"2"), (b"c", b"3"), (b"d", b"4"),
+                                   (b"e", b"5"), (b"f", b"6")])
+        self.assert_plyvel_agrees(entries)
+
+    def test_newest_version_wins(self):
+        # The newer table has the lower file number: sequence numbers decide, not file order.
+        self.make_db(tables=[(5, [(b"k", 10, b"table-new"), (b"only-old", 11, b"x")]),
+                             (6, [(b"k", 1, b"table-old"), (b"only-old", 2, b"y")])],
+                     log=[(20, [(b"k", b"log-1")]), (21, [(b"k", b"log-2")])])
+        entries = self.read()
+        self.assertEqual(entries, [(b"k", b"log-2"), (b"only-old", b"x")])
+        self.assert_plyvel_agrees(entries)
+
+    def test_deletions_hide_older_values(self):
+        self.make_db(tables=[(5, [(b"a", 1, b"1"), (b"b", 2, b"2"), (b"c", 3, b"3")]),
+                             (6, [(b"a", 4, None)])],
+                     log=[(10, [(b"b", None), (b"c", None)]), (12, [(b"c", b"again")])])
+        entries = self.read()
+        self.assertEqual(entries, [(b"c", b"again")])
+        self.assert_plyvel_agrees(entries)
+
+    def test_log_records_spanning_blocks(self):
+        large = bytes(range(256)) * 300  # 76800 bytes: FIRST, MIDDLE and LAST fragments
+        # A first record that leaves 3 bytes of its block, too few for a header, so the
+        # next record starts after the zero padding.
+        overhead = cw.LEVELDB_LOG_HEADER.size + len(leveldb_batch(1, [(b"fill", b"")])) + 2
+        fill = b"f" * (cw.LEVELDB_LOG_BLOCK_SIZE - 3 - overhead)
+        self.assertEqual(cw.LEVELDB_LOG_HEADER.size + len(leveldb_batch(1, [(b"fill", fill)])),
+                         cw.LEVELDB_LOG_BLOCK_SIZE - 3)
+        self.make_db(log=[(1, [(b"fill", fill)]), (2, [(b"large", large)]), (3, [(b"small", b"s")])])
+        self.assertGreater(os.path.getsize(os.path.join(self.path, "000003.log")), 3 * cw.LEVELDB_LOG_BLOCK_SIZE)
+        entries = self.read()
+        self.assertEqual(entries, [(b"fill", fill), (b"large", large), (b"small", b"s")])
+        self.assert_plyvel_agrees(entries)
+
+    def test_seeks_across_data_blocks(self):
+        keys = [b"key%04d" % i for i in range(2000)]
+        self.make_db(tables=[(5, [(key, i + 1, b"v" * 50) for i, key in enumerate(keys)])],
+                     log=[(3000, [(b"key1000", None)])], block_size=512)
+        with cw.LevelDBReader(self.path) as db:
+            self.assertGreater(len(db.tables[0].index), 100)
+            self.assertEqual(next(db.iterator())[0], b"key0000")
+            # The entry at the start key was deleted in the log, so the seek must skip it.
+            self.assertEqual(next(db.iterator(start=b"key1000"))[0], b"key1001")
+            self.assertEqual(next(db.iterator(start=b"key1500x"))[0], b"key1501")
+            self.assertEqual([key for key, _ in db.iterator(prefix=b"key199")],
+                             [b"key199%d" % i for i in range(10)])
+            self.assertEqual(list(db.iterator(start=b"zzz")), [])
+
+    def test_manifest_decides_which_files_are_live(self):
+        self.make_db(tables=[(5, [(b"compacted", 1, b"old")]), (7, [(b"live", 2, b"new")])],
+                     deleted=[(0, 5)], log_number=9, log=[(3, [(b"in-log", b"x")])])
+        # An older log that compaction has already folded into the tables.
+        write_leveldb_log(os.path.join(self.path, "000004.log"), [leveldb_batch(1, [(b"stale", b"x")])])
+        entries = self.read()
+        self.assertEqual(entries, [(b"in-log", b"x"), (b"live", b"new")])
+        self.assert_plyvel_agrees(entries)
+
+    def test_snapshot_ignores_later_log_writes(self):
+        self.make_db(log=[(1, [(b"a", b"1")])])
+        db = cw.LevelDBReader(self.path).snapshot()
+        write_leveldb_log(os.path.join(self.path, "000003.log"),
+                          [leveldb_batch(1, [(b"a", b"1")]), leveldb_batch(2, [(b"b", b"2")])])
+        with db:
+            self.assertEqual(list(db.iterator()), [(b"a", b"1")])
+
+    def test_bad_table_raises(self):
+        self.make_db(tables=[(5, [(b"a", 1, b"1")])])
+        with open(os.path.join(self.path, "000005.ldb"), 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b"\x00")
+        with self.assertRaises(ValueError):
+            cw.LevelDBReader(self.path)
+
+
+class ChromeLocalStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "leveldb")
+        make_chrome_local_storage(self.path, origins=30, keys_per_origin=4, value_size=300)
+
+    def test_reads_every_origin(self):
+        storage = cw.get_chrome_local_storage(self.path)
+        origins = {origin for origin in storage if origin != "unknown"}
+        self.assertEqual(len(origins), 30)
+        site0 = storage["https://site0.example0.com"]
+        self.assertEqual(site0["key0"], "updated:0")  # rewritten in the log
+        self.assertNotIn("key1", site0)  # deleted in the log
+        self.assertEqual(site0["key2"], ("0:2:" + "abcdefghij" * 31)[:300])
+        self.assertEqual(len(storage["https://site29.example1.com"]), 4)  # only in the log
+
+    def test_reads_only_selected_origins(self):
+        selected = ["https://site3.example3.com", "https://site28.example0.com"]
+        storage = cw.get_chrome_local_storage(self.path, origins=selected)
+        self.assertEqual(sorted(storage), sorted(selected))
+        self.assertEqual(storage, {origin: cw.get_chrome_local_storage(self.path)[origin] for origin in selected})
+
+    @unittest.skipIf(plyvel is None, "plyvel is not installed")
+    def test_matches_plyvel(self):
+        copy = os.path.join(self.tmp.name, "copy")
+        shutil.copytree(self.path, copy)
+        db = plyvel.DB(copy, create_if_missing=False)
+        try:
+            expected = list(db.iterator())
+        finally:
+            db.close()
+        with cw.LevelDBReader(self.path) as reader:
+            self.assertEqual(list(reader.iterator()), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+Tests for sharded exports (--sharded): the manifest checksums, reading only the
+shards a domain filter or origin list selects, and replacing an earlier export.
+
+    python -m pytest tests
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import CookieWrangler as cw
+
+
+def firefox_cookie(name, host, base_domain):
+    return {"name": name, "value": f"value-{name}", "host": host, "path": "/", "expiry": 2000000000,
+            "isSecure": 1, "isHttpOnly": 0, "sameSite": 0, "baseDomain": base_domain}
+
+COOKIES = [firefox_cookie("a", ".a.example.com", "example.com"),
+           firefox_cookie("b", "www.b.example.org", "example.org"),
+           firefox_cookie("a2", "login.a.example.com", "example.com")]
+LOCAL_STORAGE = [("https://a.example.com", {"k": "v"}), ("https://www.b.example.org", {"x": "1", "y": "2"}),
+                 ("https://c.example.net", {"z": "3"})]
+
+
+class ShardedExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = os.path.join(self.tmp.name, "export")
+
+    def export(self, cookies=COOKIES, local_storage=LOCAL_STORAGE, format="json"):
+        with contextlib.redirect_stdout(io.StringIO()), cw.open_sharded_export(self.dir, format) as writer:
+            writer.write_cookies(cookies)
+            writer.write_local_storage(local_storage)
+
+    def manifest(self):
+        return cw.read_shard_manifest(self.dir)
+
+    def shard_path(self, shard):
+        return os.path.join(self.dir, *shard["file"].split("/"))
+
+    def read(self, **kwargs):
+        with cw.open_import_events(self.dir, **kwargs) as events:
+            return [(event[0], dict(event[1])) if event[0] == "cookie" else event for event in events]
+
+    def test_round_trip(self):
+        for format in ("json", "binary"):
+            with self.subTest(format):
+                self.export(format=format)
+                manifest = self.manifest()
+                self.assertEqual([shard["base_domain"] for shard in manifest["cookies"]],
+                                 ["example.com", "example.org"])
+                self.assertEqual(manifest["cookies"][0]["hosts"], [".a.example.com", "login.a.example.com"])
+                self.assertEqual([shard["count"] for shard in manifest["local_storage"]], [1, 2, 1])
+                events = self.read()
+                self.assertEqual([event[1]["name"] for event in events if event[0] == "cookie"], ["a", "a2", "b"])
+                self.assertEqual([event[1:] for event in events if event[0] == "local_storage"],
+                                 [("https://a.example.com", "k", "v"), ("https://www.b.example.org", "x", "1"),
+                                  ("https://www.b.example.org", "y", "2"), ("https://c.example.net", "z", "3")])
+                self.assertEqual(self.read(workers=4), events)
+
+    def test_manifest_checksums(self):
+        self.export()
+        shard = self.manifest()["local_storage"][1]
+        with open(self.shard_path(shard), 'rb') as f:
+            data = f.read()
+        self.assertEqual(cw._file_digest(self.shard_path(shard)), (shard["bytes"], shard["sha256"]))
+        # The same size with one byte changed, then one byte more.
+        for changed in (data.replace(b'"1"', b'"9"'), data + b" "):
+            with self.subTest(size=len(changed)):
+                with open(self.shard_path(shard), 'wb') as f:
+                    f.write(changed)
+                with self.assertRaisesRegex(ValueError, "does not match the checksum"):
+                    self.read()
+
+    def test_rejects_paths_outside_the_export(self):
+        self.export()
+        manifest = self.manifest()
+        manifest["cookies"][0]["file"] = "../outside.json"
+        with open(os.path.join(self.dir, cw.MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        with self.assertRaisesRegex(ValueError, "Invalid shard path"):
+            self.read()
+
+    def test_reads_only_selected_shards(self):
+        self.export()
+        # Corrupting the shards of example.org shows they are never opened.
+        for shard in self.manifest()["cookies"] + self.manifest()["local_storage"]:
+            if "example.org" in shard["file"]:
+                with open(self.shard_path(shard), 'ab') as f:
+                    f.write(b"corrupt")
+        domain_filter = cw.DomainFilter(["login.a.example.com", "c.example.net"])
+        self.assertEqual([shard["file"] for shard in cw.select_shards(self.manifest(), domain_filter)],
+                         ["cookies/example.com.json", "local_storage/https_c.example.net.json"])
+        # Whole shards are read; the records in them are filtered by the import.
+        events = self.read(domain_filter=domain_filter, origins={"https://c.example.net"})
+        self.assertEqual([event[1]["name"] if event[0] == "cookie" else event[1] for event in events],
+                         ["a", "a2", "https://c.example.net"])
+        with self.assertRaises(ValueError):
+            self.read()
+
+    def test_hostless_cookie_shard_is_always_selected(self):
+        self.export(cookies=COOKIES + [{"name": "nohost", "value": "1", "path": "/"}], local_storage=[])
+        selected = cw.select_shards(self.manifest(), cw.DomainFilter(["nothing.example"]))
+        self.assertEqual([shard["hosts"] for shard in selected], [[""]])
+
+    def test_reexport_removes_stale_shards(self):
+        self.export()
+        with open(os.path.join(self.dir, "notes.txt"), 'w') as f:
+            f.write("kept")
+        old = {shard["file"] for shard in self.manifest()["local_storage"]}
+        self.export(cookies=COOKIES[:1], local_storage=LOCAL_STORAGE[:1])
+        manifest = self.manifest()
+        self.assertEqual([shard["file"] for shard in manifest["local_storage"]],
+                         ["local_storage/https_a.example.com.json"])
+        for path in old - {"local_storage/https_a.example.com.json"}:
+            self.assertFalse(os.path.exists(os.path.join(self.dir, path)), path)
+        self.assertEqual(os.listdir(os.path.join(self.dir, "cookies")), ["example.com.json"])
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "notes.txt")))
+        self.assertEqual(len(self.read()), 2)
+        # No temporary directory is left next to the export.
+        self.assertEqual(os.listdir(self.tmp.name), ["export"])
+
+    def test_refuses_a_directory_that_is_not_an_export(self):
+        os.makedirs(self.dir)
+        with open(os.path.join(self.dir, "unrelated.txt"), 'w') as f:
+            f.write("data")
+        with self.assertRaisesRegex(ValueError, "not a sharded export"):
+            self.export()
+        self.assertEqual(os.listdir(self.dir), ["unrelated.txt"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Tests for the pure-Python Snappy codec (snappy_compress/snappy_decompress) used for
+Firefox local storage values and Chrome's LevelDB blocks. If python-snappy is
+installed, the output is also checked against the C library.
+
+    python -m pytest tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import CookieWrangler as cw
+
+try:
+    import snappy
+except ImportError:
+    snappy = None
+
+
+def samples():
+    rng = random.Random(0)
+    text = b"The quick brown fox jumps over the lazy dog. " * 200
+    yield b""
+    yield b"a"
+    yield b"abc"
+    yield b"a" * 1000  # overlapping copies
+    yield b"ab" * 500
+    yield text
+    yield bytes(rng.getrandbits(8) for _ in range(5000))  # incompressible
+    # Literal lengths around the 1-byte, 2-byte and 3-byte length encodings.
+    for size in (59, 60, 61, 255, 256, 257, 65535, 65536, 65537):
+        yield bytes(rng.getrandbits(8) for _ in range(size))
+    # A repeat further back than the 64 KB offset limit, and one just within it.
+    block = bytes(rng.getrandbits(8) for _ in range(100))
+    yield block + bytes(rng.getrandbits(8) for _ in range(70000)) + block
+    yield block + bytes(rng.getrandbits(8) for _ in range(65000)) + block
+    yield "värde 値 🍪".encode("utf-8") * 50
+
+
+class SnappyTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for data in samples():
+            with self.subTest(size=len(data)):
+                self.assertEqual(cw.snappy_decompress(cw.snappy_compress(data)), data)
+
+    def test_repetitive_data_gets_smaller(self):
+        self.assertLess(len(cw.snappy_compress(b"a" * 1000)), 60)
+        self.assertLess(len(cw.snappy_compress(b"The quick brown fox. " * 100)), 150)
+
+    def test_decodes_every_element_type(self):
+        # Length 13: literal "abcd", 1-byte-offset copy (4 bytes from 4 back), 2-byte-offset
+        # copy (3 bytes from 8 back), 4-byte-offset copy (the last 2 bytes again).
+        data = (b"\x0d" + b"\x0c" + b"abcd" + bytes([1 | (0 << 2), 4])
+                + bytes([2 | (2 << 2)]) + (8).to_bytes(2, 'little')
+                + bytes([3 | (1 << 2)]) + (2).to_bytes(4, 'little'))
+        self.assertEqual(cw.snappy_decompress(data), b"abcdabcdabcbc")
+
+    def test_decodes_long_literal_lengths(self):
+        payload = bytes(range(256)) * 2
+        data = cw._varint(len(payload)) + bytes([61 << 2]) + (len(payload) - 1).to_bytes(2, 'little') + payload
+        self.assertEqual(cw.snappy_decompress(data), payload)
+
+    def test_overlapping_copies(self):
+        # Copies whose offset is shorter than their length repeat the last `offset` bytes.
+        self.assertEqual(cw.snappy_decompress(b"\x0a\x00a" + bytes([1 | (5 << 2), 1])), b"a" * 10)
+        self.assertEqual(cw.snappy_decompress(b"\x0b\x08abc" + bytes([1 | (4 << 2), 3])), b"abcabcabcab")
+        self.assertEqual(cw.snappy_decompress(b"\x46\x00x" + bytes([2 | (63 << 2)]) + b"\x01\x00"
+                                              + bytes([1 | (1 << 2), 1])), b"x" * 70)
+
+    def test_corrupt_input_raises(self):
+        cases = {
+            "zero offset": b"\x08\x00a" + bytes([1 | (3 << 2), 0]),
+            "offset before the start": b"\x08\x00a" + bytes([1 | (3 << 2), 2]),
+            "too short": b"\x05\x00a",
+            "too long": b"\x01\x04ab",
+            "empty": b"",
+            "unterminated length": b"\x80\x80",
+        }
+        for name, data in cases.items():
+            with self.subTest(name), self.assertRaises(ValueError):
+                cw.snappy_decompress(data)
+
+    def test_truncated_input_raises(self):
+        rng = random.Random(1)
+        data = b"".join(rng.choice([b"cookie", b"value", b"storage", bytes([rng.getrandbits(8)])])
+                        for _ in range(3000))
+        compressed = cw.snappy_compress(data)
+        for end in range(len(compressed)):
+            with self.subTest(end=end), self.assertRaises(ValueError):
+                cw.snappy_decompress(compressed[:end])
+
+    def test_truncated_copy_offset_raises(self):
+        valid = b"\x06\x04ab" + bytes([3 | (3 << 2)]) + (2).to_bytes(4, 'little')
+        self.assertEqual(cw.snappy_decompress(valid), b"ababab")
+        for end in range(len(valid) - 3, len(valid)):
+            with self.subTest(end=end), self.assertRaises(ValueError):
+                cw.snappy_decompress(valid[:end])
+
+    @unittest.skipIf(snappy is None, "python-snappy is not installed")
+    def test_matches_the_c_library(self):
+        for data in samples():
+            with self.subTest(size=len(data)):
+                self.assertEqual(snappy.uncompress(cw.snappy_compress(data)), data)
+                self.assertEqual(cw.snappy_decompress(snappy.compress(data)), data)
+
+    def test_local_storage_values(self):
+        value = "x" * 500 + "ä"
+        blob, conversion, compression = cw.encode_ls_value(value, compress=True)
+        self.assertEqual(compression, cw.LS_COMPRESSION_SNAPPY)
+        self.assertEqual(cw.decode_ls_value(blob, conversion, compression), value)
+        self.assertEqual(cw.encode_ls_value("short", compress=True)[2], cw.LS_COMPRESSION_NONE)
+        # A corrupt value is returned as hex rather than failing the export.
+        self.assertEqual(cw.decode_ls_value(b"\x05\x00a", conversion, compression), "050061")
+
+
+if __name__ == '__main__':
+    unittest.main()